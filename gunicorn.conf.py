@@ -0,0 +1,71 @@
+"""
+Gunicorn settings for the voice and WhatsApp service:
+
+    gunicorn -c gunicorn.conf.py
+
+The app is imported once in the master (preload_app) and warmed up there: the
+LangChain/OpenAI/Pinecone SDKs and the product catalog are loaded before the
+workers fork. Workers then start without importing anything and share those
+pages copy-on-write. No network clients are created before the fork; each
+worker opens its own OpenAI, Pinecone and SQLite connections on first use.
+
+One worker is the default. Call and WhatsApp state lives in each worker's memory
+unless SESSION_STORE_BACKEND=sqlite is set, so the server refuses to start more
+than one worker without it: a call's turns and its /voice-webhook/poll requests
+could otherwise land in workers that don't share the call's history.
+
+Even with the sqlite store, WhatsApp replies are queued (reply_queue.PerUserQueue)
+and bursts are merged (debouncer.MessageDebouncer) inside one worker. Their per-user
+ordering and merging only hold when every message from a sender reaches the same
+worker, so run more than one worker only behind a proxy that routes requests
+stickily by the sender's number (the From form field), or scale with threads instead.
+"""
+import gc
+import os
+
+wsgi_app = "voice_agent_service.clients.sonmez.twilio_flow.llm_webhook:app"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5009")
+workers = int(os.getenv("GUNICORN_WORKERS", "1"))
+# Turns mostly wait on OpenAI, Pinecone and ElevenLabs, so each worker serves several at once.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+preload_app = True
+# Import the SDKs in the master too; set to false to keep them lazy (e.g. for a quick start locally).
+VOICE_PRELOAD_SDKS = os.getenv("VOICE_PRELOAD_SDKS", "true").lower() in ("1", "true", "yes")
+
+# Python's GC writes to every object it scans, which copies shared pages into the worker
+# that touched them. The master runs without GC and freezes what it loaded before the
+# fork, so collections in the workers leave those objects (and their pages) alone.
+gc.disable()
+
+
+def on_starting(server):
+    # server.cfg.workers also reflects -w on the command line.
+    backend = os.getenv("SESSION_STORE_BACKEND", "memory").lower()
+    if server.cfg.workers > 1 and backend != "sqlite":
+        raise RuntimeError(
+            f"{server.cfg.workers} workers need SESSION_STORE_BACKEND=sqlite (it is '{backend}'), "
+            "otherwise each worker keeps its own call and WhatsApp history. Use one worker with more threads, "
+            "or set SESSION_STORE_BACKEND=sqlite and route WhatsApp senders stickily."
+        )
+
+
+def when_ready(server):
+    # Runs in the master once the preloaded app is imported and before any worker forks.
+    from voice_agent_service.clients.sonmez.data.catalog import get_catalog
+    from voice_agent_service.clients.sonmez.llm_logic.assistant_handler import preload_sdks
+
+    if VOICE_PRELOAD_SDKS:
+        try:
+            preload_sdks()
+        except ImportError as e:
+            server.log.warning(f"SDK preload skipped, workers will import on first use: {e}")
+    get_catalog().index()
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"Warmed up; {gc.get_freeze_count()} objects frozen for copy-on-write sharing.")
+
+
+def post_fork(server, worker):
+    gc.enable()
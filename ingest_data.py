@@ -3,8 +3,8 @@ import json
 from dotenv import load_dotenv
 from langchain_core.documents import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
+from voice_agent_service.clients.sonmez.llm_logic.llm_client import get_llm_client
 import logging
 
 # --- Setup basic logging ---
@@ -87,9 +87,10 @@ def main():
     # Use from_documents to create or update the index
     PineconeVectorStore.from_documents(
         documents=chunked_documents,
-        embedding=OpenAIEmbeddings(model="text-embedding-3-small"),
+        embedding=get_llm_client().langchain_embeddings("ingest_data", model="text-embedding-3-small"),
         index_name=pinecone_index_name
     )
+    get_llm_client().log_summary()
 
     logging.info(f"✅ Ingestion complete! Knowledge base '{pinecone_index_name}' is updated.")
 
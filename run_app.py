@@ -1,8 +1,93 @@
-# This line imports the 'app' object we defined in our webhook file.
-from voice_agent_service.clients.sonmez.twilio_flow.llm_webhook import app
+import os
+import sys
+import argparse
+import subprocess
+
+APP_MODULE = "voice_agent_service.clients.sonmez.twilio_flow.llm_webhook"
+# SDKs the app only imports when the first question needs them (see assistant_handler.HEAVY_MODULES).
+DEFERRED_IMPORT = "from voice_agent_service.clients.sonmez.llm_logic.assistant_handler import preload_sdks; preload_sdks()"
+
+
+def measure_imports(code):
+    """
+    Runs `code` in a fresh interpreter with -X importtime. Returns (rows, error) where
+    rows are (module, self_us, cumulative_us, depth) in import order.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    rows, other = [], []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            other.append(line)
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        # Nested imports are indented two spaces per level after the separator's space.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    error = "\n".join(other[-5:]) if result.returncode != 0 else None
+    return rows, error
+
+
+def report_imports(title, rows, top):
+    total_us = sum(cumulative for _, _, cumulative, depth in rows if depth == 0)
+    print(f"\n=== {title}: {total_us / 1000:.0f} ms in {len(rows)} modules ===")
+
+    print(f"\nSlowest {top} modules (cumulative, includes what they import):")
+    for name, _, cumulative, depth in sorted(rows, key=lambda row: -row[2])[:top]:
+        print(f"  {cumulative / 1000:9.1f} ms  {'  ' * min(depth, 6)}{name}")
+
+    # Self time summed per top-level package is what each dependency really costs.
+    packages = {}
+    for name, self_us, _, _ in rows:
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + self_us
+    print(f"\nSlowest {top} packages (self time of all their modules):")
+    for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {self_us / 1000:9.1f} ms  {package}")
+
+
+def profile_startup(top):
+    """Reports what importing the app costs per module, and what the lazily imported SDKs add later."""
+    rows, error = measure_imports(f"import {APP_MODULE}")
+    if error:
+        print(f"❌ Importing the app failed:\n{error}")
+        return 1
+    report_imports("App import (worker cold start)", rows, top)
+
+    # The same interpreter state as a worker: the app is imported, then the first question
+    # pulls in the SDKs. Only the SDK part is reported.
+    app_modules = {name for name, _, _, _ in rows}
+    rows, error = measure_imports(f"import {APP_MODULE}; {DEFERRED_IMPORT}")
+    if error:
+        print(f"\nℹ️ The deferred SDKs could not be imported here:\n{error}")
+        return 0
+    report_imports("Deferred SDK imports (first question, or gunicorn preload)",
+                   [row for row in rows if row[0] not in app_modules], top)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the voice and WhatsApp service locally.")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="report the import cost of the app per module instead of running it")
+    parser.add_argument("--top", type=int, default=15, help="rows per table in --profile-startup")
+    args = parser.parse_args()
+
+    if args.profile_startup:
+        sys.exit(profile_startup(args.top))
+
+    # This line imports the 'app' object we defined in our webhook file.
+    from voice_agent_service.clients.sonmez.twilio_flow.llm_webhook import app
 
-if __name__ == "__main__":
     # host='0.0.0.0' makes the app accessible on our local network,
     # which is useful for testing with services like Twilio.
     # debug=True will provide helpful error messages while you're developing.
-    app.run(host='0.0.0.0', port=5009, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5009, debug=True)
+
+
+if __name__ == "__main__":
+    main()
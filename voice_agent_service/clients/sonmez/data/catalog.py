@@ -0,0 +1,239 @@
+import os
+import re
+import json
+import bisect
+import threading
+import time
+import unicodedata
+
+# Absolute path of the directory this script is in.
+script_dir = os.path.dirname(__file__)
+
+TENTS_FILE = os.path.join(script_dir, "structured_tent_products.json")
+ACCESSORIES_FILE = os.path.join(script_dir, "scraped_accessories.json")
+
+
+def normalize_name(text):
+    """Lowercases, strips accents and punctuation, and collapses whitespace ("SÖNMEZ  Tent!" -> "sonmez tent")."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+class ColorVariant:
+    __slots__ = ("color", "price", "sku")
+
+    def __init__(self, color, price, sku):
+        self.color = color
+        self.price = price
+        self.sku = sku
+
+    def to_dict(self):
+        return {"color": self.color, "price": self.price, "sku": self.sku}
+
+    def __repr__(self):
+        return f"ColorVariant({self.color!r}, {self.price!r}, {self.sku!r})"
+
+
+class TentProduct:
+    """One tent from structured_tent_products.json. Color variants are kept as a tuple of ColorVariant."""
+
+    FIELDS = (
+        "name", "url", "colors", "key_features", "benefits", "included_accessories", "capacity",
+        "dimensions", "floor_space", "internal_area", "weight", "doors", "windows",
+        "inflation_time", "material_details", "manufacturing_country",
+    )
+    __slots__ = FIELDS
+    category = "tent"
+
+    @classmethod
+    def from_dict(cls, data):
+        product = cls()
+        for field in cls.FIELDS:
+            setattr(product, field, data.get(field))
+        product.colors = tuple(
+            ColorVariant(c.get("color"), c.get("price"), c.get("sku")) for c in (data.get("colors") or [])
+        )
+        return product
+
+    def to_dict(self):
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data["colors"] = [variant.to_dict() for variant in self.colors]
+        return data
+
+    def prices(self):
+        return [variant.price for variant in self.colors if variant.price is not None]
+
+    def __repr__(self):
+        return f"TentProduct({self.name!r})"
+
+
+class Accessory:
+    """One accessory from scraped_accessories.json."""
+
+    FIELDS = ("name", "url", "price", "sku", "category", "description", "image_url")
+    __slots__ = FIELDS
+
+    @classmethod
+    def from_dict(cls, data):
+        accessory = cls()
+        for field in cls.FIELDS:
+            setattr(accessory, field, data.get(field))
+        return accessory
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
+    def prices(self):
+        return [self.price] if self.price is not None else []
+
+    def __repr__(self):
+        return f"Accessory({self.name!r})"
+
+
+class CatalogIndex:
+    """
+    An immutable snapshot of the catalog with all lookup tables built. A reload builds a
+    whole new CatalogIndex and swaps it in, so readers never see a half-built index.
+    """
+
+    def __init__(self, tents, accessories, mtimes):
+        self.tents = tuple(tents)
+        self.accessories = tuple(accessories)
+        self.mtimes = mtimes
+        self.by_name = {}
+        self.by_sku = {}
+        self.by_color = {}
+        self.by_category = {}
+        prices = []
+
+        for record in self.tents + self.accessories:
+            self.by_name.setdefault(normalize_name(record.name), record)
+            self.by_category.setdefault(normalize_name(record.category), []).append(record)
+            for price in set(record.prices()):
+                prices.append((price, record))
+
+        for tent in self.tents:
+            for variant in tent.colors:
+                if variant.sku:
+                    self.by_sku.setdefault(variant.sku.lower(), []).append((tent, variant))
+                color_key = normalize_name(variant.color)
+                if color_key and tent not in self.by_color.get(color_key, []):
+                    self.by_color.setdefault(color_key, []).append(tent)
+        for accessory in self.accessories:
+            if accessory.sku:
+                self.by_sku.setdefault(accessory.sku.lower(), []).append((accessory, None))
+
+        prices.sort(key=lambda item: item[0])
+        self.price_keys = [price for price, _ in prices]
+        self.price_records = [record for _, record in prices]
+        # Longest product name in words, which bounds the n-gram scan in find_in_text.
+        self.max_name_words = max((len(key.split()) for key in self.by_name), default=0)
+
+
+class Catalog:
+    """
+    Product catalog loaded once from the JSON files and indexed by normalized name, SKU,
+    color, category and price. The files' mtimes are checked at most every
+    check_interval seconds and the index is rebuilt atomically when they change.
+    """
+
+    def __init__(self, tents_path=TENTS_FILE, accessories_path=ACCESSORIES_FILE, check_interval=2.0):
+        self.tents_path = tents_path
+        self.accessories_path = accessories_path
+        self.check_interval = check_interval
+        self._index = None
+        self._checked_at = 0.0
+        self._reload_lock = threading.Lock()
+
+    def _mtimes(self):
+        return tuple(os.path.getmtime(path) if os.path.exists(path) else None
+                     for path in (self.tents_path, self.accessories_path))
+
+    def _load(self, path, record_cls):
+        if not os.path.exists(path):
+            return []
+        with open(path, "r") as f:
+            return [record_cls.from_dict(item) for item in json.load(f)]
+
+    def index(self):
+        """Returns the current CatalogIndex, reloading it first if a source file changed."""
+        index = self._index
+        now = time.monotonic()
+        if index is not None and now - self._checked_at < self.check_interval:
+            return index
+
+        with self._reload_lock:
+            self._checked_at = now
+            mtimes = self._mtimes()
+            if self._index is None or self._index.mtimes != mtimes:
+                tents = self._load(self.tents_path, TentProduct)
+                accessories = self._load(self.accessories_path, Accessory)
+                self._index = CatalogIndex(tents, accessories, mtimes)
+            return self._index
+
+    @property
+    def tents(self):
+        return self.index().tents
+
+    @property
+    def accessories(self):
+        return self.index().accessories
+
+    def find_by_name(self, name):
+        return self.index().by_name.get(normalize_name(name))
+
+    def find_by_sku(self, sku):
+        """Returns (record, ColorVariant or None) pairs; several tent colors can share one SKU."""
+        return list(self.index().by_sku.get((sku or "").lower(), []))
+
+    def products_in_color(self, color):
+        return list(self.index().by_color.get(normalize_name(color), []))
+
+    def in_category(self, category):
+        return list(self.index().by_category.get(normalize_name(category), []))
+
+    def in_price_range(self, low=None, high=None):
+        """Products with at least one price in [low, high], cheapest first, without duplicates."""
+        index = self.index()
+        start = 0 if low is None else bisect.bisect_left(index.price_keys, low)
+        end = len(index.price_keys) if high is None else bisect.bisect_right(index.price_keys, high)
+        seen, records = set(), []
+        for record in index.price_records[start:end]:
+            if id(record) not in seen:
+                seen.add(id(record))
+                records.append(record)
+        return records
+
+    def find_in_text(self, text):
+        """
+        Returns every product whose full name appears in the text, in order of appearance.
+        Each word n-gram of the text is one dict lookup, so the cost doesn't grow with
+        the size of the catalog.
+        """
+        index = self.index()
+        words = normalize_name(text).split()
+        found = []
+        for start in range(len(words)):
+            for length in range(min(index.max_name_words, len(words) - start), 0, -1):
+                record = index.by_name.get(" ".join(words[start:start + length]))
+                if record is not None and record not in found:
+                    found.append(record)
+                    break
+        return found
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """Returns the shared Catalog for this client's data folder."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = Catalog()
+    return _catalog
@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+
+from voice_agent_service.clients.sonmez.data.catalog import normalize_name
+
+# Absolute path of the directory this script is in.
+script_dir = os.path.dirname(__file__)
+
+# fetch_orders writes here and the assistant reads from here, so both default to the
+# same file next to the catalog.
+ORDER_DB_PATH = os.getenv("ORDER_DB_PATH", os.path.join(script_dir, "orders.db"))
+# Numbers are matched on their last digits, so "+90 532 123 45 67" and "0532 123 4567" agree.
+PHONE_KEY_DIGITS = 10
+MAX_MATCHES = 5
+
+ORDER_FIELDS = ("id", "customer", "phone", "email", "address", "date", "total_price", "tents", "colors", "extras")
+
+
+def phone_key(phone):
+    """The last PHONE_KEY_DIGITS digits of a phone number, or None when it has too few to be one."""
+    digits = re.sub(r"\D", "", phone or "")
+    if len(digits) < 7:
+        return None
+    return digits[-PHONE_KEY_DIGITS:]
+
+
+def customer_key(name):
+    """Normalized customer name; the Turkish dotless ı doesn't decompose, so it is mapped to i first."""
+    return normalize_name((name or "").replace("ı", "i")) or None
+
+
+def _known(value):
+    return None if value in (None, "", "N/A") else value
+
+
+class OrderStore:
+    """
+    Parsed WooCommerce orders in a SQLite file, indexed by order id, customer name and
+    phone number so the assistant can answer order-status questions with one indexed
+    lookup. Orders are upserted by id; a later email for the same order replaces it.
+    """
+
+    def __init__(self, path=ORDER_DB_PATH):
+        self.path = path
+        # Developer's Note: Like the session store, each thread (and each forked worker)
+        # opens its own connection on first use.
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS orders (
+                    order_id TEXT PRIMARY KEY,
+                    customer TEXT,
+                    customer_key TEXT,
+                    phone TEXT,
+                    phone_key TEXT,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS orders_customer_key ON orders (customer_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS orders_phone_key ON orders (phone_key)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def upsert(self, orders):
+        """Saves parsed order dicts (as returned by parse_order_email). Returns how many were saved."""
+        rows = []
+        now = time.time()
+        for order in orders:
+            order_id = str(order.get("id") or "").strip()
+            if not order_id:
+                continue
+            data = {field: order.get(field) for field in ORDER_FIELDS}
+            data["id"] = order_id
+            customer = _known(order.get("customer"))
+            phone = _known(order.get("phone"))
+            rows.append((order_id, customer, customer_key(customer), phone, phone_key(phone),
+                         json.dumps(data), now))
+        conn = self._conn()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany(
+                """
+                INSERT INTO orders (order_id, customer, customer_key, phone, phone_key, data, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (order_id) DO UPDATE SET
+                    customer = excluded.customer, customer_key = excluded.customer_key, phone = excluded.phone,
+                    phone_key = excluded.phone_key, data = excluded.data, updated_at = excluded.updated_at
+                """,
+                rows,
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(rows)
+
+    def _select(self, where, params, limit=MAX_MATCHES):
+        rows = self._conn().execute(
+            f"SELECT data FROM orders WHERE {where} ORDER BY updated_at DESC, order_id DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def get(self, order_id):
+        """The order with this id, or None."""
+        matches = self._select("order_id = ?", (str(order_id).strip().lstrip("#"),), limit=1)
+        return matches[0] if matches else None
+
+    def find_by_customer(self, name):
+        """Orders placed under this customer name (case, accents and punctuation ignored), newest first."""
+        key = customer_key(name)
+        return self._select("customer_key = ?", (key,)) if key else []
+
+    def find_by_phone(self, phone):
+        """Orders placed with this phone number, newest first."""
+        key = phone_key(phone)
+        return self._select("phone_key = ?", (key,)) if key else []
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+
+_order_store = None
+_order_store_lock = threading.Lock()
+
+
+def get_order_store():
+    """Returns the shared OrderStore at ORDER_DB_PATH."""
+    global _order_store
+    if _order_store is None:
+        with _order_store_lock:
+            if _order_store is None:
+                _order_store = OrderStore()
+    return _order_store
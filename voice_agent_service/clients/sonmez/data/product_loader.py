@@ -1,17 +1,11 @@
-import json
-import os
+from voice_agent_service.clients.sonmez.data.catalog import get_catalog
 
-# Absolute path of the directory this script is in.
-script_dir = os.path.dirname(__file__)
+# Developer's Note: These loaders used to re-open and json.load the files on every call.
+# They now read from the shared catalog, which loads the files once, keeps them indexed
+# and reloads them when they change. New code should use get_catalog() directly.
 
 def load_tent_products():
-    # Solution: Join the script's directory with the filename to create a full, reliable path.
-    file_path = os.path.join(script_dir, "structured_tent_products.json")
-    with open(file_path, "r") as f:
-        return json.load(f)
+    return [product.to_dict() for product in get_catalog().tents]
 
 def load_accessories():
-    # ApplIED the same fix here.
-    file_path = os.path.join(script_dir, "scraped_accessories.json")
-    with open(file_path, "r") as f:
-        return json.load(f)
\ No newline at end of file
+    return [accessory.to_dict() for accessory in get_catalog().accessories]
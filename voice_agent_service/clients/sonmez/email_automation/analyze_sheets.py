@@ -1,8 +1,13 @@
 import pandas as pd
 import openai
 import os
-import time
+import json
 from dotenv import load_dotenv
+from country_inference import CountryCache, infer_countries
+from contact_pipeline import ContactPipeline
+
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from voice_agent_service.clients.sonmez.llm_logic.llm_client import get_llm_client
 
 # --- Load Environment Variables for the API Key ---
 load_dotenv()
@@ -14,92 +19,121 @@ except Exception as e:
     print(f"❌ Error setting up OpenAI: {e}")
     exit()
 
+# Country answers from earlier runs, keyed by company and email domain.
+COUNTRY_CACHE_FILE = os.getenv("COUNTRY_CACHE_FILE", "country_cache.json")
+# Companies per AI request for the rows the rules could not resolve.
+AI_BATCH_SIZE = int(os.getenv("COUNTRY_AI_BATCH_SIZE", "25"))
+
+llm_client = get_llm_client()
+
 
-def get_country_with_ai(company_info_text):
-    """Uses AI to infer the country of origin from company details."""
-    if not company_info_text:
-        return "Unknown"
+def get_countries_with_ai(rows):
+    """
+    Uses AI to infer the country of origin for a batch of companies in one request.
+    `rows` maps an id to the company information; returns {id: country}.
+    """
+    if not rows:
+        return {}
 
+    companies = "\n".join(f"{row_id}: {info}" for row_id, info in rows.items())
     prompt = f"""
-    You are a geopolitical and business analyst. Based on the following information about a company, infer its most likely country of origin.
-    Consider the company name, top-level domain of the email (.com, .vn, .qa), address details, and any other clues.
-    Provide ONLY the country name as a single string (e.g., "United States", "Qatar", "Vietnam"). If you absolutely cannot determine the country, return "Unknown".
+    You are a geopolitical and business analyst. Based on the following information about each company, infer its most likely country of origin.
+    Consider the company name, top-level domain of the email (.com, .vn, .qa), phone number, address details, and any other clues.
+    Answer with a JSON object mapping each id to ONLY the country name (e.g., "United States", "Qatar", "Vietnam"). If you absolutely cannot determine the country, use "Unknown".
 
-    Company Information:
+    Companies:
     ---
-    {company_info_text}
+    {companies}
     ---
-    Country:
+    JSON Output:
     """
 
     try:
-        print(f"🤖 Analyzing for country: {company_info_text.splitlines()[0]}")
-        client = openai.OpenAI()
-        response = client.chat.completions.create(
+        print(f"🤖 Analyzing {len(rows)} companies for country...")
+        content = llm_client.chat(
+            "analyze_sheets.country",
             model="gpt-4o",
             messages=[
-                {"role": "system", "content": "You are an expert business analyst who only responds with a single country name."},
+                {"role": "system", "content": "You are an expert business analyst who only responds with valid JSON."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.0,
-            max_tokens=20
+            max_tokens=20 * len(rows) + 50,
+            response_format={"type": "json_object"}
         )
-        country = response.choices[0].message.content.strip()
-        return country
+        answers = json.loads(content)
+        return {row_id: str(answers.get(row_id, "Unknown")).strip() or "Unknown" for row_id in rows}
     except Exception as e:
         print(f"❌ Error during AI country detection: {e}")
-        return "Error"
+        return {}
+
+# --- Country Enrichment ---
+def add_countries(df, cache, stats):
+    """Fills the 'Country' column of one chunk: rules first, the AI only for leftovers."""
+    # Rules first, over the whole chunk: existing values, cached answers, email
+    # domain/ccTLD and phone calling code.
+    countries, sources, keys = infer_countries(df, cache)
+    for source, count in sources.value_counts().items():
+        stats[source] = stats.get(source, 0) + int(count)
+
+    # Only the rows the rules could not resolve go to the AI, one request per batch of
+    # distinct companies. Rows with the same company and domain share one answer.
+    missing = countries.isna()
+    unresolved = df[missing].assign(Key=keys[missing]).drop_duplicates('Key')
+    info = ("Company: " + unresolved['Company'].astype(str) + " | Contact: " + unresolved['Contact_Name'].astype(str)
+            + " | Email: " + unresolved['Email'].astype(str) + " | Phone: " + unresolved['Phone'].astype(str))
+    pending = dict(zip(unresolved['Key'], info))
+    pending_keys = list(pending)
+    for start in range(0, len(pending_keys), AI_BATCH_SIZE):
+        batch_keys = pending_keys[start:start + AI_BATCH_SIZE]
+        rows = {str(i): pending[key] for i, key in enumerate(batch_keys)}
+        answers = get_countries_with_ai(rows)
+        stats['ai requests'] = stats.get('ai requests', 0) + 1
+        # Failed batches are not cached, so the next run asks again.
+        cache.update({key: answers[str(i)] for i, key in enumerate(batch_keys) if str(i) in answers})
+    if pending_keys:
+        cache.save()
+
+    resolved_by_ai = keys[missing].map(cache.entries)
+    stats['ai'] = stats.get('ai', 0) + int(resolved_by_ai.notna().sum())
+    df['Country'] = countries.fillna(resolved_by_ai).fillna("Error")
+    return df
 
 # --- Main Analysis Function ---
 def main():
-    """Main function to load, enrich, sort, and save the data."""
+    """Main function to load, deduplicate, enrich, sort, and save the data."""
     input_filename = 'dealership_data.csv'
-    output_filename = 'sorted_and_enriched_dealers.xlsx'
+    output_base = 'sorted_and_enriched_dealers'
 
-    try:
-        df = pd.read_csv(input_filename)
-
-        print("--- DEBUGGING INFO ---")
-        print(f"Pandas loaded {len(df.columns)} columns.")
-        print("----------------------")
-        # Rename columns to be more script-friendly (remove spaces, etc.)
-        df.columns = ['Company', 'Contact_Name', 'Position', 'Email', 'Experience', 'Phone']
-    except FileNotFoundError:
+    if not os.path.exists(input_filename):
         print(f"❌ Error: '{input_filename}' not found. Make sure you downloaded it to the correct folder.")
         return
 
-    # --- 1. Add 'Country' column if it doesn't exist ---
-    if 'Country' not in df.columns:
-        df['Country'] = None # Initialize with empty values
-
-    # --- 2. Clean up the 'Experience' Column ---
-    df['Experience'] = df['Experience'].astype(str)
-    df['Experience_Years'] = df['Experience'].str.extract(r'(\d+)').astype(float)
-    df['Experience_Years'] = df['Experience_Years'].fillna(0)
-
-    # --- 3. Identify Country for each row if not already done ---
-    for index, row in df.iterrows():
-        # Only process rows where the country is not yet filled in
-        if pd.isna(row['Country']) or row['Country'] is None:
-            # Combine info to give the AI context
-            info_text = f"Company: {row['Company']}\nContact: {row['Contact_Name']}\nEmail: {row['Email']}"
-            
-            country = get_country_with_ai(info_text)
-            df.loc[index, 'Country'] = country
-            time.sleep(5) # Pause between AI calls to avoid rate limits
+    cache = CountryCache(COUNTRY_CACHE_FILE)
+    stats = {}
 
-    print("\n✅ Country analysis complete.")
+    def enrich(df):
+        # --- 1. Clean up the 'Experience' Column ---
+        df['Experience_Years'] = df['Experience'].astype(str).str.extract(r'(\d+)', expand=False).astype(float).fillna(0)
+        # --- 2. Identify Country for each row if not already done ---
+        return add_countries(df, cache, stats)
 
-    # --- 4. Sort by Experience (Descending) ---
-    print("Sorting data by experience...")
-    sorted_df = df.sort_values(by='Experience_Years', ascending=False)
-    
-    # --- 5. Save the final report to an Excel file ---
+    # --- 3. Deduplicate, enrich and sort by Experience (Descending), chunk by chunk ---
     # We select the columns we want in the final report
     final_columns = ['Company', 'Contact_Name', 'Position', 'Email', 'Country', 'Experience_Years', 'Phone']
-    sorted_df[final_columns].to_excel(output_filename, index=False)
-
-    print(f"\n🎉 Success! Your sorted and enriched data has been saved to '{output_filename}'")
+    pipeline = ContactPipeline(final_columns, sort_by=[('Experience_Years', False)], enrich=enrich,
+                               numeric_columns={'Experience_Years'})
+    # --- 4. Save the final report to Excel, CSV and Parquet ---
+    paths = pipeline.run([input_filename], output_base)
+
+    print(f"📋 {pipeline.rows_read} rows read, {pipeline.duplicates} duplicates dropped, {pipeline.rows_written} written.")
+    for source in ('sheet', 'cache', 'company domain', 'email domain', 'phone code'):
+        if stats.get(source):
+            print(f"🌍 {stats[source]} rows resolved from {source}.")
+    print(f"🤖 {stats.get('ai', 0)} rows resolved by the AI in {stats.get('ai requests', 0)} requests.")
+    llm_client.log_summary()
+    print("\n✅ Country analysis complete.")
+    print(f"\n🎉 Success! Your sorted and enriched data has been saved to {', '.join(repr(p) for p in paths)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
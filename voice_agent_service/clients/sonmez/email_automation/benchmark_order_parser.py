@@ -0,0 +1,226 @@
+"""
+Checks the order parser against the original BeautifulSoup implementation on the
+anonymized order emails in order_corpus/, then measures throughput.
+
+Run from this folder:
+    python benchmark_order_parser.py
+    python benchmark_order_parser.py --corpus /path/to/exported/emails --repeat 20
+
+Exits with status 1 if any backend's output differs from the original parser.
+"""
+import re
+import sys
+import time
+import argparse
+import traceback
+from pathlib import Path
+
+import dateparser
+from bs4 import BeautifulSoup
+
+from order_parser import TENT_KEYWORDS, COLOR_KEYWORDS, EXTRA_KEYWORDS, OrderParser, etree
+from voice_agent_service.clients.sonmez.data.catalog import get_catalog
+
+CORPUS_DIR = Path(__file__).resolve().parent / "order_corpus"
+
+
+# The original parser from fetch_orders.py, kept as the reference output. Only the catalog
+# products and the billing phone/email fields were added since, in the same style.
+def legacy_parse_order_email(body_html, tent_keywords, color_keywords, extra_keywords):
+    soup = BeautifulSoup(body_html, 'html.parser')
+    order_details = {}
+
+    # Pre-emptively remove all script and style elements
+    for element in soup(["script", "style"]):
+        element.decompose()
+
+    try:
+        # --- Universal Order ID and Date Extraction ---
+        order_id_match = re.search(r'(?:Order\s#|Yeni sipariş:\s|New order\s#)(\d+)', body_html, re.IGNORECASE)
+        date_match = re.search(r'\((\d{1,2}\s\w+\s\d{4})\)', body_html, re.IGNORECASE)
+        order_details['id'] = order_id_match.group(1) if order_id_match else 'N/A'
+        raw_date = date_match.group(1) if date_match else None
+        order_details['date'] = dateparser.parse(raw_date).strftime('%Y-%m-%d') if raw_date else 'N/A'
+        if order_details['id'] == 'N/A': return None
+
+        # --- Full Customer Name and Address Parsing Logic ---
+        customer_name, customer_address, total_price = 'N/A', 'N/A', 'N/A'
+        customer_phone, customer_email = 'N/A', 'N/A'
+        try:
+            billing_address_text_node = soup.find(string=re.compile(r'^\s*(Billing address|Fatura adresi)\s*$', re.IGNORECASE))
+            if billing_address_text_node:
+                address_element = billing_address_text_node.find_parent().find_next_sibling()
+                if address_element:
+                    address_lines = list(address_element.stripped_strings)
+                    if address_lines:
+                        customer_name = address_lines[0]
+                        physical_address_parts = [line for line in address_lines[1:] if '@' not in line and not re.match(r'^\+?\d[\d\s-]{7,}\d$', line)]
+                        customer_address = "\n".join(physical_address_parts)
+                        # The phone and email lines the address filter drops, kept for the order store.
+                        customer_phone = next((line for line in address_lines[1:] if re.match(r'^\+?\d[\d\s-]{7,}\d$', line)), 'N/A')
+                        customer_email = next((line for line in address_lines[1:] if '@' in line), 'N/A')
+        except: pass
+        try:
+            total_text_node = soup.find(string=re.compile(r'^\s*(Total|Toplam):\s*$', re.IGNORECASE))
+            if total_text_node:
+                total_price = total_text_node.find_parent().find_next_sibling().get_text(strip=True)
+        except: pass
+        order_details.update({'customer': customer_name, 'address': customer_address, 'total_price': total_price,
+                              'phone': customer_phone, 'email': customer_email})
+
+        # --- Product Parsing Logic ---
+        all_ordered_items = []
+        # Primary Method: Formal "Product" table
+        product_header = soup.find('th', string=re.compile(r'^Product$', re.IGNORECASE))
+        if product_header:
+            product_table_body = product_header.find_parent('thead').find_next_sibling('tbody')
+            if product_table_body:
+                product_rows = product_table_body.find_all('tr')
+                for row in product_rows:
+                    product_cell = row.find('td')
+                    if product_cell:
+                        all_ordered_items.extend(list(product_cell.stripped_strings))
+        
+        # --- FIX: Re-instated the robust fallback parser ---
+        # This will run if the primary method fails to find any items.
+        if not all_ordered_items:
+            # We combine all keyword lists to find any potential product line
+            all_keywords = tent_keywords + color_keywords + extra_keywords
+            # Create a pattern to find any of these words
+            pattern = re.compile(r'\b(' + '|'.join(re.escape(k) for k in all_keywords) + r')\b', re.IGNORECASE)
+            
+            # Find all text nodes in the email that contain a product keyword
+            found_strings = soup.find_all(string=pattern)
+            cleaned_items = set()
+            for text_node in found_strings:
+                # Find the parent element to get the full product line, not just the keyword
+                parent = text_node.find_parent(['p', 'div', 'span', 'strong', 'td', 'li'])
+                if parent:
+                    full_text = parent.get_text(strip=True).replace('\n', ' ')
+                    # Heuristic to avoid grabbing long, non-product paragraphs
+                    if len(full_text) < 150:
+                         # Exclude summary lines
+                        if not any(summary_word in full_text for summary_word in ['Subtotal', 'Shipping', 'Total', 'Payment']):
+                            cleaned_items.add(full_text)
+            all_ordered_items.extend(list(cleaned_items))
+
+
+        # --- Categorization Logic ---
+        tents, raw_colors, extras = [], [], []
+        EXTENDED_COLOR_NAMES = color_keywords + ["GRAY"] 
+        color_name_pattern = re.compile('|'.join(re.escape(name) for name in EXTENDED_COLOR_NAMES), re.IGNORECASE)
+        
+        for item in all_ordered_items:
+            item = item.strip().lstrip('•').strip()
+            if not item: continue
+            item_upper = item.upper()
+
+            if '$' in item or any(keyword in item_upper for keyword in extra_keywords):
+                extras.append(item)
+                continue
+
+            if any(keyword in item_upper for keyword in tent_keywords):
+                tents.append(item)
+                color_matches_in_tent = color_name_pattern.findall(item)
+                if color_matches_in_tent:
+                    raw_colors.extend(color_matches_in_tent)
+                continue
+
+            color_tag_match = re.match(r'Colou?r:\s*(.*)', item, re.IGNORECASE)
+            if color_tag_match:
+                color_name = color_tag_match.group(1).strip()
+                if color_name:
+                    raw_colors.append(color_name)
+                continue
+
+            if item_upper.startswith("SMZ") or re.fullmatch(color_name_pattern, item):
+                raw_colors.append(item)
+                continue
+            
+            extras.append(item)
+
+        # --- Post-processing and Normalization ---
+        normalized_colors = []
+        for color in raw_colors:
+            if color.upper().startswith("SMZ"):
+                normalized_colors.append(re.sub(r'\s+', '', color).upper())
+            else:
+                normalized_colors.append(color.title())
+        
+        final_tents = sorted(list(set(t for t in tents if t and t.strip() != ':')))
+        final_colors = sorted(list(set(c for c in normalized_colors if c and c.strip() != ':')))
+        final_extras = sorted(list(set(e for e in extras if e and e.strip() != ':')))
+        
+        order_details['tents'] = final_tents
+        order_details['colors'] = final_colors
+        order_details['extras'] = final_extras
+
+        # Resolve the order lines to catalog product names (dict lookups, not a catalog scan).
+        catalog = get_catalog()
+        order_details['products'] = sorted({product.name for line in final_tents + final_extras
+                                            for product in catalog.find_in_text(line)})
+
+        return order_details
+
+    except Exception:
+        traceback.print_exc()
+        return None
+
+
+def load_corpus(folder):
+    """Returns [(file name, body)] for every .html and .txt file in the folder."""
+    paths = sorted(p for p in Path(folder).iterdir() if p.suffix in (".html", ".htm", ".txt"))
+    return [(path.name, path.read_text(encoding="utf-8")) for path in paths]
+
+
+def emails_per_second(parse, corpus, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, body in corpus:
+            parse(body)
+    return repeat * len(corpus) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare and benchmark the order email parsers.")
+    parser.add_argument("--corpus", default=str(CORPUS_DIR), help="folder of .html/.txt order email bodies")
+    parser.add_argument("--repeat", type=int, default=50, help="passes over the corpus when timing")
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print(f"❌ No .html or .txt files in {args.corpus}")
+        return 1
+    print(f"📂 {len(corpus)} emails from {args.corpus}")
+
+    backends = ["bs4"] + (["lxml"] if etree is not None else [])
+    parsers = {name: OrderParser(TENT_KEYWORDS, COLOR_KEYWORDS, EXTRA_KEYWORDS, backend=name) for name in backends}
+    legacy = lambda body: legacy_parse_order_email(body, TENT_KEYWORDS, COLOR_KEYWORDS, EXTRA_KEYWORDS)
+
+    # --- Equivalence ---
+    mismatches = 0
+    for name, body in corpus:
+        expected = legacy(body)
+        for backend, order_parser in parsers.items():
+            actual = order_parser.parse(body)
+            if actual != expected:
+                mismatches += 1
+                print(f"❌ {name} [{backend}]\n   expected: {expected}\n   actual:   {actual}")
+    if mismatches:
+        print(f"❌ {mismatches} mismatches.")
+    else:
+        print(f"✅ All backends ({', '.join(backends)}) match the original parser on every email.")
+
+    # --- Throughput ---
+    baseline = emails_per_second(legacy, corpus, args.repeat)
+    print(f"\n{'parser':>10} {'emails/s':>10} {'speedup':>8}")
+    print(f"{'original':>10} {baseline:>10.0f} {1.0:>7.1f}x")
+    for backend, order_parser in parsers.items():
+        rate = emails_per_second(order_parser.parse, corpus, args.repeat)
+        print(f"{backend:>10} {rate:>10.0f} {rate / baseline:>7.1f}x")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+import os
+import csv
+import heapq
+import pickle
+import tempfile
+from functools import total_ordering
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet output is skipped without pyarrow.
+    pa = pq = None
+
+# Rows per chunk read from the CSV; memory scales with this, not with the file.
+CHUNK_ROWS = int(os.getenv("CONTACT_CHUNK_ROWS", "50000"))
+# Rows per block in the sorted run files, i.e. per run held in memory while merging.
+RUN_BLOCK_ROWS = 1000
+EXCEL_MAX_ROWS = 1048576
+
+# Export headers -> the script-friendly names the scripts use.
+COLUMN_NAMES = {
+    'Company': 'Company', 'Contact Name': 'Contact_Name', 'Position': 'Position', 'Contact Email': 'Email',
+    'Country': 'Country', 'Experience': 'Experience', 'Contact Phone': 'Phone',
+}
+EXPORT_HEADERS = {name: header for header, name in COLUMN_NAMES.items()}
+# Sheets written by sheet_importer before the Country column existed have no header row.
+LEGACY_COLUMNS = ['Company', 'Contact_Name', 'Position', 'Email', 'Experience', 'Phone']
+
+
+def normalize_columns(df):
+    """
+    Renames export headers to the script-friendly names; header-less 6-column files map
+    by position. Anything else raises KeyError naming the headers that aren't known.
+    """
+    headers = [str(column).strip() for column in df.columns]
+    unknown = [header for header in headers if header not in COLUMN_NAMES]
+    if not unknown:
+        df.columns = [COLUMN_NAMES[header] for header in headers]
+    elif len(headers) == len(LEGACY_COLUMNS):
+        df.columns = LEGACY_COLUMNS
+    else:
+        raise KeyError(f"unknown headers {unknown}; expected {list(COLUMN_NAMES)} "
+                       f"or {len(LEGACY_COLUMNS)} columns without a header row")
+    if 'Country' not in df.columns:
+        df['Country'] = None
+    return df
+
+
+def dedupe_keys(df):
+    """
+    64-bit hash per row of the normalized (email, company) pair. Rows with neither
+    an email nor a company get a hash of 0, which is never treated as a duplicate.
+    """
+    email = df['Email'].astype("string").fillna("").str.strip().str.lower()
+    company = (df['Company'].astype("string").fillna("").str.casefold()
+               .str.replace(r'\s+', ' ', regex=True).str.strip())
+    hashes = pd.util.hash_pandas_object(email + "\x1f" + company, index=False)
+    return hashes.where((email != "") | (company != ""), 0)
+
+
+@total_ordering
+class _Descending:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return self.value > other.value
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value) or value is pd.NA
+
+
+class ContactPipeline:
+    """
+    Streams contact CSVs through dedupe -> enrich -> sort -> write with bounded memory:
+
+    1. Files are read CHUNK_ROWS rows at a time.
+    2. Rows whose normalized (email, company) was seen before are dropped. The index
+       keeps one 64-bit hash per distinct contact, not the rows.
+    3. `enrich(chunk)` adds or fills columns on each chunk (e.g. country inference).
+    4. Each chunk is sorted and spilled to a temporary run file; the runs are then
+       merged with heapq.merge, reading RUN_BLOCK_ROWS rows of each run at a time.
+    5. The merged rows stream into CSV, XLSX (openpyxl write-only mode) and Parquet
+       (when pyarrow is installed).
+
+    `sort_by` is a list of (column, ascending) pairs; missing values sort last,
+    like pandas' na_position="last".
+    """
+
+    def __init__(self, columns, sort_by, enrich=None, headers=None, numeric_columns=(), chunk_rows=None):
+        self.columns = list(columns)
+        self.sort_by = list(sort_by)
+        self.enrich = enrich
+        self.headers = [(headers or {}).get(column, column) for column in self.columns]
+        self.numeric_columns = set(numeric_columns)
+        self.chunk_rows = chunk_rows or CHUNK_ROWS
+        self.seen = set()
+        self.rows_read = 0
+        self.duplicates = 0
+        self.rows_written = 0
+        self.runs = 0
+
+    def chunks(self, paths):
+        """Deduplicated, normalized chunks from the input CSVs, in file order."""
+        for path in paths:
+            # dtype=str keeps phone numbers like 38269190190 from turning into floats.
+            for chunk in pd.read_csv(path, chunksize=self.chunk_rows, dtype=str):
+                self.rows_read += len(chunk)
+                chunk = normalize_columns(chunk)
+                hashes = dedupe_keys(chunk)
+                duplicate = hashes.duplicated() | hashes.isin(self.seen)
+                duplicate &= hashes != 0
+                self.seen.update(hashes[~duplicate & (hashes != 0)].tolist())
+                self.duplicates += int(duplicate.sum())
+                yield chunk[~duplicate.to_numpy()].reset_index(drop=True)
+
+    def _sort_key(self):
+        positions = [(self.columns.index(column), ascending) for column, ascending in self.sort_by]
+
+        def key(row):
+            parts = []
+            for position, ascending in positions:
+                value = row[position]
+                if _is_missing(value):
+                    parts.append((1, None))
+                else:
+                    parts.append((0, value if ascending else _Descending(value)))
+            return parts
+        return key
+
+    def _write_run(self, directory, chunk):
+        chunk = chunk.sort_values(
+            by=[column for column, _ in self.sort_by],
+            ascending=[ascending for _, ascending in self.sort_by],
+            na_position="last", kind="stable",
+        )
+        rows = list(chunk[self.columns].astype(object).itertuples(index=False, name=None))
+        path = os.path.join(directory, f"run_{self.runs:05d}.pkl")
+        with open(path, "wb") as f:
+            for start in range(0, len(rows), RUN_BLOCK_ROWS):
+                pickle.dump(rows[start:start + RUN_BLOCK_ROWS], f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.runs += 1
+        return path
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, "rb") as f:
+            while True:
+                try:
+                    block = pickle.load(f)
+                except EOFError:
+                    return
+                yield from block
+
+    def run(self, input_paths, output_base, formats=("csv", "xlsx", "parquet")):
+        """Processes the inputs and writes `output_base`.<format> files. Returns the paths written."""
+        with tempfile.TemporaryDirectory(prefix="contacts_") as directory:
+            run_paths = []
+            for chunk in self.chunks(input_paths):
+                if self.enrich:
+                    chunk = self.enrich(chunk)
+                if len(chunk):
+                    run_paths.append(self._write_run(directory, chunk))
+            rows = heapq.merge(*(self._read_run(path) for path in run_paths), key=self._sort_key())
+            return self._write_outputs(rows, output_base, formats)
+
+    def _write_outputs(self, rows, output_base, formats):
+        writers, paths = [], []
+        if "csv" in formats:
+            paths.append(f"{output_base}.csv")
+            writers.append(_CsvWriter(paths[-1], self.headers))
+        if "xlsx" in formats:
+            paths.append(f"{output_base}.xlsx")
+            writers.append(_XlsxWriter(paths[-1], self.headers))
+        if "parquet" in formats:
+            if pq is None:
+                print("ℹ️ pyarrow is not installed; skipping the Parquet output.")
+            else:
+                paths.append(f"{output_base}.parquet")
+                writers.append(_ParquetWriter(paths[-1], self.columns, self.headers, self.numeric_columns))
+
+        block = []
+        for row in rows:
+            block.append([None if _is_missing(value) else value for value in row])
+            if len(block) >= RUN_BLOCK_ROWS:
+                for writer in writers:
+                    writer.write(block)
+                self.rows_written += len(block)
+                block = []
+        if block:
+            for writer in writers:
+                writer.write(block)
+            self.rows_written += len(block)
+        for writer in writers:
+            writer.close()
+        return paths
+
+
+class _CsvWriter:
+    def __init__(self, path, headers):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(headers)
+
+    def write(self, block):
+        self.writer.writerows(block)
+
+    def close(self):
+        self.file.close()
+
+
+class _XlsxWriter:
+    def __init__(self, path, headers):
+        from openpyxl import Workbook
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet()
+        self.sheet.append(headers)
+        self.rows = 1
+        self.truncated = False
+
+    def write(self, block):
+        room = EXCEL_MAX_ROWS - self.rows
+        if len(block) > room and not self.truncated:
+            self.truncated = True
+            print(f"⚠️ More rows than an Excel sheet holds; '{self.path}' stops at {EXCEL_MAX_ROWS} rows.")
+        for row in block[:max(room, 0)]:
+            self.sheet.append(row)
+        self.rows += min(len(block), max(room, 0))
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class _ParquetWriter:
+    def __init__(self, path, columns, headers, numeric_columns):
+        self.columns = columns
+        self.numeric = [column in numeric_columns for column in columns]
+        self.schema = pa.schema([
+            (header, pa.float64() if numeric else pa.string()) for header, numeric in zip(headers, self.numeric)
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, block):
+        arrays = []
+        for i, numeric in enumerate(self.numeric):
+            values = [row[i] for row in block]
+            if not numeric:
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(values)
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,180 @@
+import json
+import os
+
+import pandas as pd
+
+# Country-code top-level domains. Generic TLDs (.com, .net, .org, .info, ...) say
+# nothing about the country and are left for the other rules.
+CCTLD_COUNTRIES = {
+    "ae": "United Arab Emirates", "al": "Albania", "am": "Armenia", "ar": "Argentina", "at": "Austria",
+    "au": "Australia", "az": "Azerbaijan", "ba": "Bosnia and Herzegovina", "bd": "Bangladesh", "be": "Belgium",
+    "bg": "Bulgaria", "bh": "Bahrain", "br": "Brazil", "by": "Belarus", "ca": "Canada", "ch": "Switzerland",
+    "cl": "Chile", "cn": "China", "cy": "Cyprus", "cz": "Czech Republic", "de": "Germany", "dk": "Denmark",
+    "dz": "Algeria", "ee": "Estonia", "eg": "Egypt", "es": "Spain", "fi": "Finland", "fr": "France",
+    "ge": "Georgia", "gr": "Greece", "hk": "Hong Kong", "hr": "Croatia", "hu": "Hungary", "id": "Indonesia",
+    "ie": "Ireland", "il": "Israel", "in": "India", "iq": "Iraq", "ir": "Iran", "is": "Iceland", "it": "Italy",
+    "jo": "Jordan", "jp": "Japan", "ke": "Kenya", "kg": "Kyrgyzstan", "kr": "South Korea", "kw": "Kuwait",
+    "kz": "Kazakhstan", "lb": "Lebanon", "lt": "Lithuania", "lu": "Luxembourg", "lv": "Latvia", "ma": "Morocco",
+    "md": "Moldova", "mk": "North Macedonia", "mn": "Mongolia", "mt": "Malta", "mx": "Mexico",
+    "my": "Malaysia", "ng": "Nigeria", "nl": "Netherlands", "no": "Norway", "nz": "New Zealand", "om": "Oman",
+    "pe": "Peru", "ph": "Philippines", "pk": "Pakistan", "pl": "Poland", "pt": "Portugal", "qa": "Qatar",
+    "ro": "Romania", "rs": "Serbia", "ru": "Russia", "sa": "Saudi Arabia", "se": "Sweden", "sg": "Singapore",
+    "si": "Slovenia", "sk": "Slovakia", "th": "Thailand", "tn": "Tunisia", "tr": "Turkey", "tw": "Taiwan",
+    "ua": "Ukraine", "uk": "United Kingdom", "us": "United States", "uz": "Uzbekistan", "vn": "Vietnam",
+    "za": "South Africa",
+}
+
+# Country codes sold as generic names (proton.me, startup.io, brand.co, ...); they say
+# nothing about where the sender is.
+VANITY_TLDS = {"ac", "ai", "cc", "co", "fm", "gg", "io", "ly", "me", "sh", "to", "tv", "ws"}
+
+# Free-mail and ISP domains that are tied to one country.
+KNOWN_DOMAIN_COUNTRIES = {
+    "comcast.net": "United States", "verizon.net": "United States", "att.net": "United States",
+    "sbcglobal.net": "United States", "bellsouth.net": "United States", "charter.net": "United States",
+    "cox.net": "United States", "shaw.ca": "Canada", "rogers.com": "Canada", "sympatico.ca": "Canada",
+    "btinternet.com": "United Kingdom", "sky.com": "United Kingdom", "bigpond.com": "Australia",
+    "yandex.ru": "Russia", "mail.ru": "Russia", "rambler.ru": "Russia", "ukr.net": "Ukraine",
+    "web.de": "Germany", "gmx.de": "Germany", "t-online.de": "Germany", "orange.fr": "France",
+    "wanadoo.fr": "France", "free.fr": "France", "libero.it": "Italy", "virgilio.it": "Italy",
+    "seznam.cz": "Czech Republic", "wp.pl": "Poland", "onet.pl": "Poland", "o2.pl": "Poland",
+    "naver.com": "South Korea", "qq.com": "China", "163.com": "China", "126.com": "China",
+    "rediffmail.com": "India", "yahoo.co.jp": "Japan",
+}
+
+# Domains shared by people everywhere; a company-domain mapping learned from them would be wrong.
+FREE_MAIL_DOMAINS = {
+    "gmail.com", "googlemail.com", "yahoo.com", "hotmail.com", "outlook.com", "live.com", "msn.com",
+    "icloud.com", "me.com", "aol.com", "protonmail.com", "proton.me", "gmx.com", "mail.com", "zoho.com",
+    "yandex.com",
+}
+
+# International calling codes. Lookup tries 3, then 2, then 1 digits, so longer codes win.
+PHONE_COUNTRY_CODES = {
+    "1": "United States", "7": "Russia", "20": "Egypt", "27": "South Africa", "30": "Greece",
+    "31": "Netherlands", "32": "Belgium", "33": "France", "34": "Spain", "36": "Hungary", "39": "Italy",
+    "40": "Romania", "41": "Switzerland", "43": "Austria", "44": "United Kingdom", "45": "Denmark",
+    "46": "Sweden", "47": "Norway", "48": "Poland", "49": "Germany", "51": "Peru", "52": "Mexico",
+    "54": "Argentina", "55": "Brazil", "56": "Chile", "57": "Colombia", "60": "Malaysia", "61": "Australia",
+    "62": "Indonesia", "63": "Philippines", "64": "New Zealand", "65": "Singapore", "66": "Thailand",
+    "81": "Japan", "82": "South Korea", "84": "Vietnam", "86": "China", "90": "Turkey", "91": "India",
+    "92": "Pakistan", "98": "Iran", "212": "Morocco", "213": "Algeria", "216": "Tunisia", "234": "Nigeria",
+    "254": "Kenya", "351": "Portugal", "352": "Luxembourg", "353": "Ireland", "354": "Iceland",
+    "356": "Malta", "357": "Cyprus", "358": "Finland", "359": "Bulgaria", "370": "Lithuania",
+    "371": "Latvia", "372": "Estonia", "373": "Moldova", "374": "Armenia", "375": "Belarus",
+    "380": "Ukraine", "381": "Serbia", "382": "Montenegro", "385": "Croatia", "386": "Slovenia",
+    "387": "Bosnia and Herzegovina", "389": "North Macedonia", "420": "Czech Republic", "421": "Slovakia",
+    "852": "Hong Kong", "880": "Bangladesh", "886": "Taiwan", "961": "Lebanon", "962": "Jordan",
+    "964": "Iraq", "965": "Kuwait", "966": "Saudi Arabia", "968": "Oman", "971": "United Arab Emirates",
+    "972": "Israel", "973": "Bahrain", "974": "Qatar", "994": "Azerbaijan", "995": "Georgia",
+    "996": "Kyrgyzstan", "998": "Uzbekistan",
+}
+# +1 is shared by the US and Canada; Canadian area codes tell them apart.
+CANADA_AREA_CODES = {
+    "204", "226", "236", "249", "250", "263", "289", "306", "343", "354", "365", "367", "368", "382",
+    "387", "403", "416", "418", "428", "431", "437", "438", "450", "468", "474", "506", "514", "519",
+    "548", "579", "581", "584", "587", "604", "613", "639", "647", "672", "683", "705", "709", "742",
+    "753", "778", "780", "782", "807", "819", "825", "867", "873", "879", "902", "905",
+}
+
+# Values in an existing Country column that mean "not resolved yet".
+MISSING_COUNTRY_VALUES = {"", "n/a", "nan", "none", "error"}
+
+
+def cache_key(company, domain):
+    return f"{' '.join(str(company or '').lower().split())}|{domain or ''}"
+
+
+def email_domains(emails):
+    """Lower-cased domain of each address, NaN where there is none."""
+    return emails.astype("string").str.strip().str.lower().str.extract(r'@([\w.-]+\w)$', expand=False)
+
+
+def countries_from_domains(domains):
+    """
+    Country per row from the known-domain table, then from the ccTLD. Free-mail
+    domains and vanity ccTLDs are not read as a country.
+    """
+    known = domains.map(KNOWN_DOMAIN_COUNTRIES)
+    tld = domains.str.rsplit(".", n=1).str[-1]
+    tld = tld.where(~domains.isin(FREE_MAIL_DOMAINS) & ~tld.isin(VANITY_TLDS))
+    return known.fillna(tld.map(CCTLD_COUNTRIES))
+
+
+def countries_from_phones(phones):
+    """
+    Country per row from the phone's calling code. Only numbers written with + or 00
+    are read this way: a bare 11-digit number is as likely a domestic Chinese or
+    Brazilian mobile as a calling code without its +.
+    """
+    raw = phones.astype("string").fillna("").str.strip()
+    digits = raw.str.replace(r'\D', '', regex=True)
+    explicit = raw.str.startswith("+") | digits.str.startswith("00")
+    digits = digits.where(~digits.str.startswith("00"), digits.str[2:])
+    digits = digits.where(explicit & (digits.str.len() >= 8))
+
+    result = pd.Series(pd.NA, index=phones.index, dtype="object")
+    for length in (3, 2, 1):
+        result = result.fillna(digits.str[:length].map(PHONE_COUNTRY_CODES))
+    canada = digits.str.startswith("1") & digits.str[1:4].isin(CANADA_AREA_CODES)
+    result[canada.fillna(False).astype(bool)] = "Canada"
+    return result
+
+
+class CountryCache:
+    """
+    LLM answers keyed by company and email domain, kept in a JSON file across runs.
+    Answers for company domains also become domain mappings, so another contact at
+    the same company resolves without the LLM.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def domain_countries(self):
+        mapping = {}
+        for key, country in self.entries.items():
+            domain = key.rpartition("|")[2]
+            if domain and domain not in FREE_MAIL_DOMAINS and country != "Unknown":
+                mapping.setdefault(domain, country)
+        return mapping
+
+    def update(self, answers):
+        self.entries.update(answers)
+
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, ensure_ascii=False, sort_keys=True)
+
+
+def infer_countries(df, cache):
+    """
+    Fills what the rules can resolve, for the whole frame at once. Returns
+    (countries, sources, keys): the country per row (NaN where unresolved), which
+    rule answered, and each row's cache key for the LLM fallback.
+    """
+    domains = email_domains(df["Email"])
+    keys = pd.Series([cache_key(c, d if isinstance(d, str) else "") for c, d in zip(df["Company"], domains)],
+                     index=df.index)
+
+    existing = df["Country"].astype("string").str.strip()
+    existing = existing.where(~existing.str.lower().isin(MISSING_COUNTRY_VALUES)).astype("object")
+
+    stages = [
+        ("sheet", existing),
+        ("cache", keys.map(cache.entries)),
+        ("company domain", domains.map(cache.domain_countries())),
+        ("email domain", countries_from_domains(domains)),
+        ("phone code", countries_from_phones(df["Phone"])),
+    ]
+    countries = pd.Series(pd.NA, index=df.index, dtype="object")
+    sources = pd.Series(pd.NA, index=df.index, dtype="object")
+    for name, found in stages:
+        fill = countries.isna() & found.notna()
+        countries[fill] = found[fill]
+        sources[fill] = name
+    return countries, sources, keys
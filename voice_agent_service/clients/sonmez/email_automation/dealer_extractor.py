@@ -0,0 +1,219 @@
+import re
+import threading
+from datetime import date
+
+# The fields the dealership sheet needs, in column order.
+FIELDS = ("CompanyName", "ContactName", "Position", "ContactEmail", "Experience", "ContactPhone")
+
+# "Label: value" lines, as web forms and careful writers produce them.
+LABELS = {
+    "CompanyName": ("company name", "company", "business name", "business", "firm", "firma", "şirket", "store name", "shop name"),
+    "ContactName": ("contact name", "full name", "name", "your name", "ad soyad", "isim"),
+    "Position": ("position", "job title", "title", "role", "pozisyon", "görev", "ünvan"),
+    "ContactEmail": ("email", "e-mail", "email address", "e-posta", "mail"),
+    "Experience": ("experience", "years of experience", "years in business", "deneyim", "tecrübe"),
+    "ContactPhone": ("phone", "phone number", "telephone", "tel", "mobile", "cell", "gsm", "whatsapp", "telefon"),
+}
+LABEL_LINE_RE = re.compile(r'^\s*[-*•]?\s*([A-Za-zÇĞİÖŞÜçğıöşü][\w .\-/çğıöşüÇĞİÖŞÜ]{0,30}?)\s*[:：]\s*(.+?)\s*$')
+_LABEL_TO_FIELD = {label: field for field, labels in LABELS.items() for label in labels}
+
+EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+(?:\.[\w-]+)+')
+# Addresses that never belong to the applicant.
+IGNORED_EMAIL_RE = re.compile(r'^(?:no-?reply|mailer-daemon|wordpress|postmaster|notifications?)@', re.IGNORECASE)
+PHONE_RE = re.compile(r'(?<![\w.])(?:\+|00)?\(?\d[\d\s().\-]{6,18}\d(?!\w|\.\d)')
+# Dates and decimals have the right digit count but are not phone numbers.
+DATE_LIKE_RE = re.compile(r'^\d{1,4}[.\-/]\d{1,2}[.\-/]\d{1,4}$|^\d+\.\d+$')
+
+EXPERIENCE_CONTEXT_RE = re.compile(
+    r'experience|business|industry|market|trade|trading|sell|selling|retail|operat|dealer|distribut|deneyim|tecrübe|sektör',
+    re.IGNORECASE)
+YEARS_RE = re.compile(r'\b(\d{1,2})(\+?)\s*(?:years?|yrs?|yıl|yıldır)\b', re.IGNORECASE)
+SINCE_RE = re.compile(r'\b(?:since|established in|founded in|est\.?)\s+((?:19|20)\d{2})\b', re.IGNORECASE)
+PLAIN_NUMBER_RE = re.compile(r'^(\d{1,2})(\+?)$')
+
+SIGN_OFF_RE = re.compile(
+    r'^\s*(?:best regards|kind regards|warm regards|regards|best wishes|best|sincerely|yours sincerely|'
+    r'yours faithfully|thanks|thank you|many thanks|cheers|saygılarımla|saygılarımızla|iyi çalışmalar)[,.!]?\s*$',
+    re.IGNORECASE)
+NAME_RE = re.compile(r"^[A-ZÇĞİÖŞÜ][a-zçğıöşü'\-]+(?:\s+[A-ZÇĞİÖŞÜ][a-zçğıöşü'\-]+){1,3}$")
+MY_NAME_RE = re.compile(r"\bmy name is ([A-ZÇĞİÖŞÜ][a-zçğıöşü'\-]+(?:\s+[A-ZÇĞİÖŞÜ][a-zçğıöşü'\-]+){0,3})")
+POSITION_WORDS_RE = re.compile(
+    r'\b(?:owner|co-owner|founder|co-founder|ceo|cfo|coo|managing director|director|general manager|manager|'
+    r'president|partner|buyer|purchasing|procurement|sales|head of|sahibi|müdür|müdürü|kurucu)\b',
+    re.IGNORECASE)
+POSITION_SPLIT_RE = re.compile(r'\s*[|,–—]\s*|\s+-\s+|\s+at\s+')
+COMPANY_SUFFIX_RE = re.compile(
+    r'\b(?:ltd|limited|llc|inc|gmbh|s\.?l\.?|b\.?v\.?|ab|oy|a\.?ş\.?|pty|co\.|corp|sarl|srl|s\.?a\.?|plc|ug|kft|ltd\. şti\.?|şti)(?:\.|\b)',
+    re.IGNORECASE)
+
+
+def _clean(value):
+    return " ".join(value.split()).strip(" ,;.")
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value)
+
+
+def _looks_like_phone(candidate, labeled=False):
+    digits = _digits(candidate)
+    if not 8 <= len(digits) <= 15 or DATE_LIKE_RE.match(candidate.strip()):
+        return False
+    # Unlabeled numbers need an international prefix or enough digits to rule out
+    # order numbers, prices and postcodes.
+    return labeled or candidate.startswith(("+", "00")) or len(digits) >= 10
+
+
+def _experience_from_value(value):
+    match = PLAIN_NUMBER_RE.match(value.strip())
+    if match:
+        return f"{match.group(1)}{match.group(2)} years"
+    match = YEARS_RE.search(value)
+    if match:
+        return f"{match.group(1)}{match.group(2)} years"
+    return None
+
+
+class DealerExtractor:
+    """
+    Rule-based first pass over a dealership application. Returns only the fields it is
+    confident about; whatever is left is for the LLM.
+
+    - Labeled lines ("Phone: ...", "Company name: ...") fill any field.
+    - ContactEmail is the first address that isn't ours or a no-reply sender.
+    - ContactPhone needs a label, an international prefix or at least 10 digits.
+    - Experience comes from "N years" in a sentence about the business, or from
+      "since/established in YYYY".
+    - ContactName, Position and a company with a legal suffix are read from the
+      signature block after a sign-off ("Best regards," ...), or from "My name is ...".
+    """
+
+    def __init__(self, exclude_domains=()):
+        self.exclude_domains = tuple(domain.lower() for domain in exclude_domains if domain)
+
+    def extract(self, body):
+        fields = {}
+        if not body:
+            return fields
+        lines = [line.strip() for line in body.splitlines()]
+
+        self._labeled_fields(lines, fields)
+        if "ContactEmail" not in fields:
+            email = self._email(body)
+            if email:
+                fields["ContactEmail"] = email
+        if "ContactPhone" not in fields:
+            for match in PHONE_RE.finditer(body):
+                if _looks_like_phone(match.group(0)):
+                    fields["ContactPhone"] = _clean(match.group(0))
+                    break
+        if "Experience" not in fields:
+            experience = self._experience(body)
+            if experience:
+                fields["Experience"] = experience
+        self._signature(lines, fields)
+        if "ContactName" not in fields:
+            match = MY_NAME_RE.search(body)
+            if match:
+                fields["ContactName"] = match.group(1)
+        return fields
+
+    def _usable_email(self, address):
+        address = address.strip(".").lower()
+        domain = address.rsplit("@", 1)[-1]
+        if IGNORED_EMAIL_RE.match(address) or any(domain == d or domain.endswith("." + d) for d in self.exclude_domains):
+            return None
+        return address
+
+    def _email(self, text):
+        for match in EMAIL_RE.finditer(text):
+            address = self._usable_email(match.group(0))
+            if address:
+                return address
+        return None
+
+    def _labeled_fields(self, lines, fields):
+        for line in lines:
+            match = LABEL_LINE_RE.match(line)
+            if not match:
+                continue
+            field = _LABEL_TO_FIELD.get(match.group(1).strip().lower())
+            value = _clean(match.group(2))
+            if not field or field in fields or not value or value.lower() in ("n/a", "-", "none"):
+                continue
+            if field == "ContactEmail":
+                value = self._email(value)
+            elif field == "ContactPhone":
+                value = value if _looks_like_phone(value, labeled=True) else None
+            elif field == "Experience":
+                value = _experience_from_value(value)
+            if value:
+                fields[field] = value
+
+    def _experience(self, body):
+        for sentence in re.split(r'(?<=[.!?])\s+|\n', body):
+            if not EXPERIENCE_CONTEXT_RE.search(sentence):
+                continue
+            match = YEARS_RE.search(sentence)
+            if match:
+                return f"{match.group(1)}{match.group(2)} years"
+            match = SINCE_RE.search(sentence)
+            if match:
+                years = date.today().year - int(match.group(1))
+                if 0 < years < 100:
+                    return f"{years} years"
+        return None
+
+    def _signature(self, lines, fields):
+        # The last sign-off line starts the signature block.
+        start = None
+        for i, line in enumerate(lines):
+            if SIGN_OFF_RE.match(line):
+                start = i + 1
+        if start is None:
+            return
+        block = [line for line in lines[start:start + 6] if line]
+        for line in block:
+            if EMAIL_RE.search(line) or sum(ch.isdigit() for ch in line) >= 6:
+                continue
+            # "Example Outdoor Ltd" is capitalized like a name too; the suffix makes it the company.
+            if ("ContactName" not in fields and NAME_RE.match(line) and not POSITION_WORDS_RE.search(line)
+                    and not COMPANY_SUFFIX_RE.search(line)):
+                fields["ContactName"] = line
+            elif "Position" not in fields and POSITION_WORDS_RE.search(line) and len(line) <= 60:
+                # "Owner | Example Outdoor Ltd" -> position and company in one line.
+                parts = POSITION_SPLIT_RE.split(line, maxsplit=1)
+                fields["Position"] = _clean(parts[0])
+                if len(parts) > 1 and "CompanyName" not in fields and COMPANY_SUFFIX_RE.search(parts[1]):
+                    fields["CompanyName"] = _clean(parts[1])
+            elif "CompanyName" not in fields and COMPANY_SUFFIX_RE.search(line) and len(line) <= 80:
+                fields["CompanyName"] = _clean(line)
+
+
+class ExtractionStats:
+    """Counts how much of the extraction the rules handled, across worker threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.emails = 0
+        self.fields_by_rules = 0
+        self.fields_by_llm = 0
+        self.llm_calls = 0
+        self.llm_calls_avoided = 0
+
+    def record(self, rule_fields, llm_fields, called_llm):
+        with self.lock:
+            self.emails += 1
+            self.fields_by_rules += rule_fields
+            self.fields_by_llm += llm_fields
+            if called_llm:
+                self.llm_calls += 1
+            else:
+                self.llm_calls_avoided += 1
+
+    def summary(self):
+        with self.lock:
+            total = self.fields_by_rules + self.fields_by_llm
+            share = self.fields_by_rules / total * 100 if total else 0.0
+            return (f"{self.emails} emails: {self.fields_by_rules} fields by rules, {self.fields_by_llm} left to the AI "
+                    f"({share:.0f}% without the LLM); {self.llm_calls} AI calls, {self.llm_calls_avoided} avoided.")
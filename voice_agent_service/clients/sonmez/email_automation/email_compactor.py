@@ -0,0 +1,240 @@
+import re
+import hashlib
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken missing, or its encoding file can't be downloaded
+    _ENCODING = None
+
+# A line that starts the quoted copy of an earlier message; everything from it on is dropped.
+QUOTE_START_RE = re.compile(
+    r'^(?:'
+    r'On .{0,200}wrote:\s*$'                                  # Gmail / Apple Mail
+    r'|-{2,}\s*Original Message\s*-{2,}'                      # Outlook plain text
+    r'|_{10,}\s*$'                                            # Outlook separator above "From: ... Sent: ..."
+    r'|From:\s.+\s+(?:Sent|Date):\s'                          # Outlook header on one line
+    r'|-{2,}\s*Forwarded message\s*-{2,}'
+    r'|.{0,200}tarihinde .{0,200}yazdı:\s*$'                  # Turkish Gmail
+    r'|\d{1,2}[./]\d{1,2}[./]\d{2,4}.{0,100}(?:wrote|yazdı|написал)\S*:\s*$'
+    r')',
+    re.IGNORECASE)
+# Outlook's reply header when "From:" and "Sent:" are on separate lines.
+REPLY_HEADER_RE = re.compile(r'^From:\s.+\n(?:.*\n){0,2}?(?:Sent|Date):\s', re.IGNORECASE | re.MULTILINE)
+SIGNATURE_START_RE = re.compile(
+    r'^(?:--\s*$|Sent from my |Get Outlook for |Sent from Mail for |Yahoo Mail.* gönderildi|iPhone\'umdan gönderildi)',
+    re.IGNORECASE)
+SIGN_OFF_RE = re.compile(
+    r'^(?:best regards|kind regards|warm regards|regards|best wishes|best|sincerely|thanks|thank you|many thanks|'
+    r'cheers|saygılarımla|saygılarımızla|iyi çalışmalar)[,.!]?\s*$',
+    re.IGNORECASE)
+# Disclaimer and footer sentences. They are only removed from the end of a message, so
+# correspondence that happens to say "confidential" or "sent to" is kept.
+BOILERPLATE_RE = re.compile(
+    r'\b(?:is|are|may be|contains?) (?:strictly |privileged and |legally privileged and )?confidential'
+    r'|confidentiality notice|not the intended recipient'
+    r'|intended (?:solely |only )?for the (?:use of the )?(?:addressee|named|intended|individual)'
+    r'|unsubscribe|privacy policy|all rights reserved|do not reply to this'
+    r'|this (?:e-?mail|message) and any attachments|this (?:e-?mail|message) was sent to (?:\S+@\S+|you\b)'
+    r'|you(?:\'re| are)? receiv\w* this (?:e-?mail|message|because)'
+    r'|manage your preferences|view (?:it|this email) in your browser|bu e-posta .{0,40}gizli|yasal uyarı',
+    re.IGNORECASE)
+SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s+')
+NOISE_RE = re.compile(r'<mailto:[^>]*>|\[(?:cid|image|undefined)[^\]]*\]|<https?://[^>]*>', re.IGNORECASE)
+SUBJECT_PREFIX_RE = re.compile(r'^(?:\s*(?:re|fw|fwd|ynt|ilt|aw|wg)\s*(?:\[\d+\])?\s*:\s*)+', re.IGNORECASE)
+MESSAGE_ID_RE = re.compile(r'<[^<>\s]+>')
+# Lines kept after a sign-off (the sender's name); the rest of the signature is dropped.
+SIGN_OFF_KEEP_LINES = 1
+# A sign-off only starts the signature when at most this many short lines follow it.
+SIGNATURE_MAX_LINES = 6
+SIGNATURE_LINE_MAX_CHARS = 60
+# Paragraphs shorter than this ("Hi,", "Yes, please ship it.") are never dropped as
+# repeats: a customer may well write the same short line twice in one thread.
+MIN_DEDUPE_CHARS = 80
+
+def count_tokens(text):
+    """Prompt tokens for the OpenAI models, or ~4 characters per token without tiktoken."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text, disallowed_special=()))
+    return len(text) // 4
+
+
+def normalize_subject(subject):
+    return SUBJECT_PREFIX_RE.sub("", subject or "").strip()
+
+
+def strip_quoted(text):
+    """Drops the quoted earlier messages of a reply and any "> " lines."""
+    match = REPLY_HEADER_RE.search(text)
+    if match:
+        text = text[:match.start()]
+    kept = []
+    for line in text.splitlines():
+        if QUOTE_START_RE.match(line.strip()):
+            break
+        if line.lstrip().startswith(">"):
+            continue
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def _looks_like_signature(lines):
+    """Name, title, company and contact lines: few, short, and not sentences."""
+    if len(lines) > SIGNATURE_MAX_LINES:
+        return False
+    for line in lines:
+        line = line.strip()
+        if len(line) > SIGNATURE_LINE_MAX_CHARS or line.endswith(("?", "!")):
+            return False
+        # "Example Outdoor Ltd." ends with a period too; a sentence has more words.
+        if line.endswith(".") and len(line.split()) > 4:
+            return False
+    return True
+
+
+def strip_signature(text):
+    """
+    Cuts the signature: at "-- " or "Sent from my ...", or after a sign-off near the end
+    of the message and the name under it. A "Thanks!" that opens the message, or one
+    followed by more text, is left alone.
+    """
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if SIGNATURE_START_RE.match(line.strip()):
+            lines = lines[:i]
+            break
+    for i in range(len(lines) - 1, -1, -1):
+        if SIGN_OFF_RE.match(lines[i].strip()):
+            rest = [line for line in lines[i + 1:] if line.strip()]
+            has_body = any(line.strip() for line in lines[:i])
+            if has_body and _looks_like_signature(rest):
+                lines = lines[:i] + rest[:SIGN_OFF_KEEP_LINES]
+            break
+    return "\n".join(lines)
+
+
+def strip_boilerplate(paragraphs):
+    """Drops disclaimer and footer sentences from the end of a message, stopping at the first real one."""
+    paragraphs = list(paragraphs)
+    while paragraphs:
+        sentences = SENTENCE_END_RE.split(paragraphs[-1])
+        kept = len(sentences)
+        while kept and BOILERPLATE_RE.search(sentences[kept - 1]):
+            kept -= 1
+        if kept == 0:
+            paragraphs.pop()
+            continue
+        if kept < len(sentences):
+            paragraphs[-1] = " ".join(sentences[:kept])
+        break
+    return paragraphs
+
+
+def _paragraphs(text):
+    return [p.strip() for p in re.split(r'\n\s*\n', text) if p.strip()]
+
+
+def _fingerprint(paragraph):
+    return hashlib.sha1(" ".join(paragraph.lower().split()).encode("utf-8")).digest()
+
+
+def compact_body(text, seen=None):
+    """
+    The new text of one message: quotes, signature, trailing disclaimers and link
+    noise removed. `seen` is a set of paragraph fingerprints shared across a thread,
+    so text quoted without any reply marker is still only sent once; paragraphs under
+    MIN_DEDUPE_CHARS are always kept.
+    """
+    text = NOISE_RE.sub("", (text or "").replace("\r\n", "\n"))
+    # Disclaimers go first, so a sign-off above one is still seen as the end of the message.
+    text = strip_signature("\n\n".join(strip_boilerplate(_paragraphs(strip_quoted(text)))))
+    kept = []
+    for paragraph in _paragraphs(text):
+        if seen is not None and len(paragraph) >= MIN_DEDUPE_CHARS:
+            fingerprint = _fingerprint(paragraph)
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+        kept.append(re.sub(r'[ \t]+', ' ', paragraph))
+    return "\n\n".join(kept)
+
+
+class _Threads:
+    """Union-find over Message-IDs: a message joins the thread of every ID it references."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, key):
+        self.parent.setdefault(key, key)
+        while self.parent[key] != key:
+            self.parent[key] = self.parent[self.parent[key]]
+            key = self.parent[key]
+        return key
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+
+def group_threads(messages):
+    """
+    Groups MessageHeaders into threads using References and In-Reply-To, oldest
+    message first in each thread. Returns a list of lists, ordered by each
+    thread's first message.
+    """
+    threads = _Threads()
+    keys = {}
+    for message in messages:
+        own = (message.message_id or f"uid:{message.uid}").strip().lower()
+        keys[message.uid] = own
+        threads.find(own)
+        linked = " ".join(filter(None, [message.get("References"), message.get("In-Reply-To")]))
+        for referenced in MESSAGE_ID_RE.findall(linked):
+            threads.union(referenced.lower(), own)
+
+    grouped = {}
+    ordered = sorted(messages, key=lambda m: (m.date.timestamp() if m.date else 0, m.uid))
+    for message in ordered:
+        grouped.setdefault(threads.find(keys[message.uid]), []).append(message)
+    return list(grouped.values())
+
+
+class EmailCompactor:
+    """
+    Turns fetched messages into the text worth sending to the model: thread by
+    thread, oldest first, each message reduced to what it adds to the thread.
+    Tracks token counts before (`truncate(body)` per message, what the reporter
+    used to send) and after compaction.
+    """
+
+    def __init__(self, truncate=None):
+        self.truncate = truncate or (lambda body: body)
+        self.tokens_before = 0
+        self.tokens_after = 0
+        # uid -> (tokens before, tokens after), for per-day figures.
+        self.counts = {}
+
+    def compact(self, messages, bodies):
+        """`bodies` maps uid -> plain text. Returns {uid: new text}."""
+        compacted = {}
+        for thread in group_threads(messages):
+            seen = set()
+            for message in thread:
+                body = bodies.get(message.uid, "")
+                new_text = self.truncate(compact_body(body, seen))
+                compacted[message.uid] = new_text
+                before, after = count_tokens(self.truncate(body)), count_tokens(new_text)
+                self.counts[message.uid] = (before, after)
+                self.tokens_before += before
+                self.tokens_after += after
+        return compacted
+
+    def summary(self):
+        saved = self.tokens_before - self.tokens_after
+        share = saved / self.tokens_before * 100 if self.tokens_before else 0.0
+        method = "tiktoken" if _ENCODING is not None else "~4 chars/token"
+        return f"{self.tokens_before} -> {self.tokens_after} prompt tokens ({share:.0f}% saved, {method})"
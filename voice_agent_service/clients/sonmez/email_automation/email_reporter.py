@@ -1,14 +1,19 @@
 import os
 import imaplib
-import email
 import re
-from email.header import decode_header
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 from datetime import datetime, date, timedelta
 import collections
-import time
+import sys
 import openai 
+from concurrent.futures import ThreadPoolExecutor
+from mail_fetcher import MailFetcher
+from extraction_store import ExtractionStore, body_hash
+from email_compactor import EmailCompactor, group_threads, normalize_subject
+
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from voice_agent_service.clients.sonmez.llm_logic.llm_client import get_llm_client
 
 # --- Load Environment Variables ---
 load_dotenv()
@@ -23,6 +28,15 @@ except Exception as e:
     print(f"❌ Error setting up OpenAI: {e}")
     exit()
 
+# Per-email summaries by Message-ID, so overlapping or repeated report runs reuse them.
+SUMMARY_DB = os.getenv("EMAIL_SUMMARY_DB", "email_summaries.db")
+# Worker threads for the map and reduce steps; the shared LLM client paces them to the quota.
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "4"))
+# Bodies this short are their own summary; no API call needed.
+SHORT_EMAIL_CHARS = 200
+
+llm_client = get_llm_client()
+
 def prepare_email_for_prompt(body, max_chars=1500):
     """Truncates the email body to a max character length to save tokens."""
     if len(body) > max_chars:
@@ -51,50 +65,57 @@ def clean_html_to_text(html_text):
     soup = BeautifulSoup(html_text, 'html.parser')
     return re.sub(r'\s+', ' ', soup.get_text()).strip()
 
-def decode_header_text(header):
-    """Decodes email headers to a readable string."""
-    if not header:
-        return ""
-    decoded_parts = decode_header(header)
-    header_parts = []
-    for part, encoding in decoded_parts:
-        try:
-            if isinstance(part, bytes):
-                header_parts.append(part.decode(encoding or 'utf-8', errors='ignore'))
-            else:
-                header_parts.append(part)
-        except (UnicodeDecodeError, LookupError):
-            header_parts.append(str(part))
-    return "".join(header_parts)
-
-def get_email_body(msg):
-    """Extracts the plain text or cleaned HTML body from an email message."""
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_type = part.get_content_type()
-            content_disposition = str(part.get("Content-Disposition"))
-            if content_type == 'text/plain' and 'attachment' not in content_disposition:
-                try:
-                    return part.get_payload(decode=True).decode(errors='ignore')
-                except Exception:
-                    continue
-    else:
-        if msg.get_content_type() == 'text/plain':
-            return msg.get_payload(decode=True).decode(errors='ignore')
-
-    if msg.is_multipart():
-        for part in msg.walk():
-            if part.get_content_type() == 'text/html':
-                return clean_html_to_text(part.get_payload(decode=True).decode(errors='ignore'))
-    elif msg.get_content_type() == 'text/html':
-         return clean_html_to_text(msg.get_payload(decode=True).decode(errors='ignore'))
+def get_email_body(parts):
+    """
+    Picks the plain text body, or the cleaned HTML body as a fallback, from the
+    {content_type: text} parts returned by MailFetcher.fetch_text_parts.
+    """
+    if parts.get('text/plain'):
+        return parts['text/plain']
+    if parts.get('text/html'):
+        return clean_html_to_text(parts['text/html'])
     return ""
 
-# --- NEW: AI-Powered Summarization Logic ---
+# --- AI-Powered Summarization Logic (map: one summary per email, reduce: one per day) ---
+
+def ask_ai(caller, prompt, system, max_tokens, temperature):
+    """One chat completion through the shared LLM client. Raises on API errors."""
+    return llm_client.chat(
+        caller,
+        model="gpt-3.5-turbo", # "gpt-3.5-turbo" for a faster, cheaper option, gpt-4o-mini for a more powerful option
+        messages=[
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens
+    ).strip()
+
+def get_ai_summary_for_email(sender, subject, body):
+    """Map step: a one or two sentence summary of a single email."""
+    if len(body) <= SHORT_EMAIL_CHARS:
+        return " ".join(body.split()) or "(empty email)"
+
+    prompt = f"""
+    Summarize this email in one or two sentences. Name the people and companies involved and any request, problem, meeting, or outcome.
+
+    From: {sender}
+    Subject: {subject}
+    ---
+    {prepare_email_for_prompt(body)}
+    ---
+    Summary:
+    """
+    try:
+        return ask_ai("email_reporter.email_summary", prompt, "You are a helpful executive assistant.", max_tokens=80, temperature=0.2)
+    except Exception as e:
+        print(f"❌ Error summarizing '{subject}': {e}")
+        return None
 
 def get_ai_summary_for_day(day_email_content):
     """
-    Sends all email content for a day to the OpenAI API for reasoning and summarization.
+    Reduce step: sends the per-email summaries of a day to the OpenAI API for
+    reasoning and summarization.
     """
     if not day_email_content:
         return "No emails to analyze for this day."
@@ -102,7 +123,7 @@ def get_ai_summary_for_day(day_email_content):
     # This prompt is the key to getting the output you want.
     # It instructs the AI to reason about the emails, not just summarize them.
     prompt = f"""
-    You are an intelligent executive assistant. Your task is to analyze the following email data from a single day and provide a concise, insightful summary.
+    You are an intelligent executive assistant. Your task is to analyze the following email summaries from a single day and provide a concise, insightful summary.
 
     - Identify the main topics, conversations, and outcomes.
     - Mention the key people and companies involved (e.g., Olicia from PayPal, Vera from Wonderchat).
@@ -110,7 +131,7 @@ def get_ai_summary_for_day(day_email_content):
     - Summarize any customer problems and whether they were resolved.
     - Synthesize all information into a brief, narrative paragraph for the day. Do not just list the emails.
 
-    Here is the combined email data for the day:
+    Here is one summary per email for the day:
     ---
     {day_email_content}
     ---
@@ -119,17 +140,7 @@ def get_ai_summary_for_day(day_email_content):
 
     try:
         print("🤖 Sending data to AI for analysis...")
-        client = openai.OpenAI()
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo", # "gpt-3.5-turbo" for a faster, cheaper option, gpt-4o-mini for a more powerful option
-            messages=[
-                {"role": "system", "content": "You are a helpful executive assistant."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.5, # A little creativity
-            max_tokens=250   # Control the length of the output
-        )
-        summary = response.choices[0].message.content.strip()
+        summary = ask_ai("email_reporter.day_summary", prompt, "You are a helpful executive assistant.", max_tokens=250, temperature=0.5)
         print("✅ AI analysis complete.")
         return summary
     except Exception as e:
@@ -151,81 +162,122 @@ def generate_daily_report(start_date, end_date):
     
     # Search for emails within the specified date range
     search_criteria = f'(SINCE "{start_date_str}" BEFORE "{end_date_str}")'
-    status, messages = mail.search(None, search_criteria)
+    fetcher = MailFetcher(mail)
+    email_uids = fetcher.search_uids(search_criteria)
 
-    if status != "OK" or not messages[0]:
+    if not email_uids:
         print(f'ℹ️ No emails found between {start_date_str} and {end_date_str}.')
         mail.logout()
         return
 
-    email_ids = messages[0].split()
-    print(f"📨 Found {len(email_ids)} emails from the specified period. Analyzing...")
+    print(f"📨 Found {len(email_uids)} emails from the specified period. Analyzing...")
 
-    # Use defaultdict to store concatenated email bodies for each day
-    daily_email_data = collections.defaultdict(str)
     date_range = [start_date + timedelta(days=x) for x in range((end_date-start_date).days)]
 
-    for mail_id in reversed(email_ids): # Process newest first
-        status, msg_data = mail.fetch(mail_id, "(RFC822)")
-        if status != 'OK': continue
-            
-        msg = email.message_from_bytes(msg_data[0][1])
-        
-        try:
-            email_dt = email.utils.parsedate_to_datetime(msg["Date"])
-            email_date_obj = email_dt.date()
-        except:
+    # Headers first, so the date check runs before any body is downloaded.
+    in_range = []
+    for message in reversed(fetcher.fetch_headers(email_uids)): # Process newest first
+        email_dt = message.date
+        if email_dt is None:
             continue # Skip emails with invalid date format
-
         # Check if the email is within our target date range
-        if start_date <= email_date_obj < end_date:
-            day_str = email_date_obj.strftime("%A, %Y-%m-%d") # e.g., "Monday, 2025-07-14"
-            
-    
-    subject = decode_header_text(msg["Subject"])
-    sender = decode_header_text(msg["From"])
-    body = get_email_body(msg)
+        if start_date <= email_dt.date() < end_date:
+            in_range.append(message)
+
+    # Summaries from earlier runs are reused by Message-ID; only new emails are downloaded.
+    store = ExtractionStore(SUMMARY_DB)
+    summaries, to_fetch = {}, []
+    for message in in_range:
+        record = store.get(message.message_id) if message.message_id else None
+        if record is not None:
+            summaries[message.uid] = record["data"]["summary"]
+        else:
+            to_fetch.append(message)
+    print(f"♻️ {len(summaries)} email summaries reused, {len(to_fetch)} to summarize.")
+
+    parts = fetcher.fetch_text_parts([message.uid for message in to_fetch])
+    bodies = {message.uid: get_email_body(parts.get(message.uid, {})) for message in to_fetch}
+
+    # Only the new text of each message goes to the AI: threads are compacted oldest
+    # first, dropping quoted replies, signatures and boilerplate.
+    compactor = EmailCompactor(truncate=prepare_email_for_prompt)
+    new_texts = compactor.compact(to_fetch, bodies)
+    print(f"🗜️ Compaction: {compactor.summary()}")
+
+    def summarize(message):
+        body = bodies[message.uid]
+        return message, body, get_ai_summary_for_email(message.sender, message.subject, new_texts[message.uid])
+
+    # --- Map: every email is summarized concurrently, under the rate limits ---
+    with ThreadPoolExecutor(max_workers=OPENAI_CONCURRENCY) as executor:
+        for message, body, summary in executor.map(summarize, to_fetch):
+            if summary is None:
+                continue # Failed summaries are not cached, so the next run retries them
+            summaries[message.uid] = summary
+            hash_value = body_hash(body)
+            store.save(store.key_for(message.message_id, hash_value), hash_value, message.subject, {"summary": summary})
+    store.close()
+
+    # Group the summaries by day and, within a day, by thread, keeping every email in the range
+    daily_threads = collections.defaultdict(lambda: collections.defaultdict(list))
+    day_tokens = collections.defaultdict(lambda: [0, 0])
+    for thread in group_threads(in_range):
+        thread_subject = normalize_subject(thread[0].subject) or "(no subject)"
+        for message in thread:
+            day_str = message.date.date().strftime("%A, %Y-%m-%d") # e.g., "Monday, 2025-07-14"
+            summary = summaries.get(message.uid, "(summary unavailable)")
+            daily_threads[day_str][thread_subject].append(f"Email from '{message.sender}': {summary}")
+            before, after = compactor.counts.get(message.uid, (0, 0))
+            day_tokens[day_str][0] += before
+            day_tokens[day_str][1] += after
 
-    # Prepare and truncate the body to save tokens
-    prepared_body = prepare_email_for_prompt(body) # <-- ADD THIS LINE
+    daily_email_data = collections.defaultdict(str)
+    for day_str, threads in daily_threads.items():
+        for thread_subject, lines in threads.items():
+            daily_email_data[day_str] += f"Thread '{thread_subject}':\n" + "".join(f"  {line}\n" for line in lines)
 
-    # Append the structured content for the AI to analyze
-    daily_email_data[day_str] += f"Email from '{sender}' with subject '{subject}':\n{prepared_body}\n\n---\n\n"
+    # --- Reduce: one summary per day, all days in parallel ---
+    day_strs = [day.strftime("%A, %Y-%m-%d") for day in date_range]
+    with ThreadPoolExecutor(max_workers=OPENAI_CONCURRENCY) as executor:
+        day_summaries = list(executor.map(get_ai_summary_for_day, [daily_email_data[day_str] for day_str in day_strs]))
 
     # --- Generate the Final Report ---
     report = f"Email Activity Report ({start_date_str} to {end_date_str})\n"
     report += "="*50 + "\n\n"
 
     # Iterate through the dates to ensure every day in the range is in the report
-    for day in date_range:
-        day_str = day.strftime("%A, %Y-%m-%d")
+    for day_str, ai_summary in zip(day_strs, day_summaries):
+        if day_str in day_tokens:
+            before, after = day_tokens[day_str]
+            print(f"🗜️ {day_str}: {before} -> {after} email tokens after compaction.")
         report += f"## {day_str.upper()}\n\n"
-        
-        day_content = daily_email_data[day_str]
-        ai_summary = get_ai_summary_for_day(day_content)
         report += f"{ai_summary}\n\n"
         report += "-"*50 + "\n\n"
 
-        # Add a delay to respect rate limits between days
-        print("⏳ Pausing for 20 seconds to respect API rate limits...")
-        time.sleep(20) 
-
-
     output_filename = "daily_ai_report_Wed.txt"
     with open(output_filename, "w", encoding="utf-8") as f:
         f.write(report)
         
     print(f"\n✅ Report has been generated! Check the file: '{output_filename}'")
+    llm_client.log_summary()
+    print(f"📡 IMAP: {fetcher.round_trips} round trips, {fetcher.bytes_received / 1024:.0f} KiB received.")
     mail.logout()
 
 if __name__ == "__main__":
-    # --- Analyze ONE specific day ---
+    # --- Analyze ONE specific day, or a range: python email_reporter.py 2025-07-14 2025-07-21 ---
     
     # Set the single day I want to analyze
     start_date = date(2025, 7, 16)  # Change this to the desired date
+    if len(sys.argv) > 1:
+        start_date = date.fromisoformat(sys.argv[1])
     
     # The end date is the next day, because the search is not inclusive
     end_date = start_date + timedelta(days=1)
+    if len(sys.argv) > 2:
+        end_date = date.fromisoformat(sys.argv[2])
 
-    print(f"🔎 Analyzing emails for the single day: {start_date.strftime('%Y-%m-%d')}...")
+    if (end_date - start_date).days == 1:
+        print(f"🔎 Analyzing emails for the single day: {start_date.strftime('%Y-%m-%d')}...")
+    else:
+        print(f"🔎 Analyzing emails from {start_date} up to {end_date}...")
     generate_daily_report(start_date=start_date, end_date=end_date)
\ No newline at end of file
@@ -0,0 +1,98 @@
+import json
+import time
+import sqlite3
+import hashlib
+
+DEFAULT_DB_PATH = "dealership_extractions.db"
+
+
+def body_hash(body):
+    """Hash of the email body with whitespace normalized, so re-sent copies of the same text match."""
+    return hashlib.sha256(" ".join((body or "").split()).encode("utf-8")).hexdigest()
+
+
+class ExtractionStore:
+    """
+    Remembers, per email, what the LLM extracted and whether the row reached the sheet.
+
+    Records are keyed by Message-ID, with the body hash as a second key: a message
+    seen before (e.g. because the 2-day scan windows overlap) is answered from its
+    Message-ID without downloading the body, and the same application sent twice
+    under different Message-IDs is recognised by its body and reuses the first
+    extraction. Emails without a Message-ID are keyed by their body hash.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS extractions (
+                message_id TEXT PRIMARY KEY,
+                body_hash TEXT NOT NULL,
+                subject TEXT,
+                data TEXT NOT NULL,
+                extracted_at REAL NOT NULL,
+                written_at REAL
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS extractions_body_hash ON extractions (body_hash)")
+
+    @staticmethod
+    def key_for(message_id, hash_value=None):
+        return message_id or f"sha256:{hash_value}"
+
+    def _record(self, row):
+        if row is None:
+            return None
+        message_id, hash_value, subject, data, extracted_at, written_at = row
+        return {
+            "message_id": message_id, "body_hash": hash_value, "subject": subject,
+            "data": json.loads(data), "extracted_at": extracted_at, "written": written_at is not None,
+        }
+
+    def get(self, message_id):
+        row = self.conn.execute(
+            "SELECT message_id, body_hash, subject, data, extracted_at, written_at FROM extractions WHERE message_id = ?",
+            (message_id,),
+        ).fetchone()
+        return self._record(row)
+
+    def find_by_body(self, hash_value):
+        """The earliest record with this body, preferring one that was already written."""
+        row = self.conn.execute(
+            """
+            SELECT message_id, body_hash, subject, data, extracted_at, written_at FROM extractions
+            WHERE body_hash = ? ORDER BY written_at IS NULL, extracted_at LIMIT 1
+            """,
+            (hash_value,),
+        ).fetchone()
+        return self._record(row)
+
+    def save(self, key, hash_value, subject, data, written=False):
+        self.conn.execute(
+            """
+            INSERT INTO extractions (message_id, body_hash, subject, data, extracted_at, written_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (message_id) DO UPDATE SET
+                body_hash = excluded.body_hash, subject = excluded.subject, data = excluded.data,
+                extracted_at = excluded.extracted_at, written_at = COALESCE(extractions.written_at, excluded.written_at)
+            """,
+            (key, hash_value, subject, json.dumps(data), time.time(), time.time() if written else None),
+        )
+
+    def mark_written(self, keys):
+        now = time.time()
+        self.conn.executemany(
+            "UPDATE extractions SET written_at = ? WHERE message_id = ? AND written_at IS NULL",
+            [(now, key) for key in keys],
+        )
+
+    def stats(self):
+        total, written = self.conn.execute(
+            "SELECT COUNT(*), COUNT(written_at) FROM extractions"
+        ).fetchone()
+        return {"extracted": total, "written": written}
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,300 @@
+"""
+A local IMAP stand-in for running the email scripts and the ingestion daemon
+without a Yandex account:
+
+    from fake_imap_server import FakeIMAPServer
+    server = FakeIMAPServer()
+    host, port = server.start()
+    server.mailbox.add(raw_message_bytes)   # wakes IDLE clients with "* N EXISTS"
+    server.disconnect_all()                 # drops every connection, to exercise reconnects
+
+or from a shell, `python fake_imap_server.py 1143`, then point the daemon at it
+with IMAP_HOST=127.0.0.1 IMAP_PORT=1143 IMAP_SSL=0.
+
+It accepts any login and implements what the scripts use: SELECT (with
+UIDVALIDITY/UIDNEXT), NOOP, IDLE/DONE, UID SEARCH (UID ranges, SINCE/BEFORE and
+the OR SUBJECT/BODY order search), UID FETCH (UID, RFC822.SIZE, BODYSTRUCTURE,
+RFC822/BODY[] and BODY.PEEK[...] sections) and UID STORE. Every command line
+received is recorded in `server.commands`.
+"""
+import re
+import sys
+import time
+import email
+import select
+import socket
+import socketserver
+import threading
+import email.utils
+from datetime import datetime
+
+
+class Mailbox:
+    """Messages of the single mailbox, shared by every connection."""
+
+    def __init__(self, uidvalidity=1):
+        self.uidvalidity = uidvalidity
+        self.messages = []  # (uid, raw bytes, flags)
+        self.next_uid = 1
+        self.lock = threading.Condition()
+
+    def add(self, raw):
+        with self.lock:
+            uid = self.next_uid
+            self.next_uid += 1
+            self.messages.append([uid, raw, set()])
+            self.lock.notify_all()
+            return uid
+
+
+def _quote(value):
+    if value is None:
+        return b"NIL"
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return ('"' + value + '"').encode()
+
+
+def bodystructure(msg):
+    if msg.is_multipart():
+        children = b"".join(bodystructure(part) for part in msg.get_payload())
+        return b"(" + children + b" " + _quote(msg.get_content_subtype()) + b")"
+    main, sub = msg.get_content_maintype(), msg.get_content_subtype()
+    params = msg.get_params()[1:] if msg.get_params() else []
+    params_bytes = b"(" + b" ".join(_quote(k) + b" " + _quote(v) for k, v in params) + b")" if params else b"NIL"
+    payload = msg.get_payload(decode=False)
+    payload = payload.encode() if isinstance(payload, str) else (payload or b"")
+    encoding = (msg.get("Content-Transfer-Encoding") or "7bit").lower()
+    parts = [_quote(main), _quote(sub), params_bytes, b"NIL", b"NIL", _quote(encoding), str(len(payload)).encode()]
+    if main == "text":
+        parts.append(str(payload.count(b"\n")).encode())
+        disposition = msg.get("Content-Disposition")
+        parts.append(b"NIL")
+        if disposition:
+            parts.append(b"(" + _quote(disposition.split(";")[0].strip()) + b" NIL)")
+        else:
+            parts.append(b"NIL")
+    return b"(" + b" ".join(parts) + b")"
+
+
+def section_bytes(raw, msg, section):
+    if section == "TEXT":
+        return raw.split(b"\r\n\r\n", 1)[-1] if b"\r\n\r\n" in raw else raw.split(b"\n\n", 1)[-1]
+    part = msg
+    for number in section.split("."):
+        if part.is_multipart():
+            part = part.get_payload()[int(number) - 1]
+    payload = part.get_payload(decode=False)
+    return payload.encode() if isinstance(payload, str) else payload
+
+
+class Handler(socketserver.StreamRequestHandler):
+    def send(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else data.encode())
+        self.wfile.flush()
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections.add(self.connection)
+
+    def finish(self):
+        with self.server.lock:
+            self.server.connections.discard(self.connection)
+        try:
+            super().finish()
+        except OSError:
+            pass
+
+    def handle(self):
+        try:
+            self.serve()
+        except OSError:
+            return  # The client went away, or disconnect_all() closed the socket.
+
+    def serve(self):
+        box = self.server.mailbox
+        self.send(b"* OK fake IMAP ready\r\n")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            line = line.rstrip(b"\r\n").decode()
+            parts = line.split(" ", 2)
+            tag, cmd = parts[0], parts[1].upper()
+            rest = parts[2] if len(parts) > 2 else ""
+            self.server.commands.append(line)
+            if cmd == "CAPABILITY":
+                self.send(b"* CAPABILITY IMAP4rev1 IDLE\r\n" + f"{tag} OK done\r\n".encode())
+            elif cmd == "LOGIN":
+                self.send(f"{tag} OK logged in\r\n")
+            elif cmd in ("SELECT", "EXAMINE"):
+                with box.lock:
+                    n = len(box.messages)
+                self.send(f"* {n} EXISTS\r\n* OK [UIDVALIDITY {box.uidvalidity}] ok\r\n* OK [UIDNEXT {box.next_uid}] ok\r\n{tag} OK [READ-WRITE] done\r\n")
+            elif cmd == "NOOP":
+                self.send(f"{tag} OK done\r\n")
+            elif cmd == "LOGOUT":
+                self.send(f"* BYE\r\n{tag} OK bye\r\n")
+                return
+            elif cmd == "IDLE":
+                self.idle(tag)
+            elif cmd == "UID":
+                sub, _, args = rest.partition(" ")
+                sub = sub.upper()
+                if sub == "SEARCH":
+                    uids = self.search(args)
+                    self.send(("* SEARCH " + " ".join(map(str, uids))).rstrip() + f"\r\n{tag} OK done\r\n")
+                elif sub == "FETCH":
+                    self.fetch(tag, args)
+                elif sub == "STORE":
+                    self.send(f"{tag} OK done\r\n")
+                else:
+                    self.send(f"{tag} BAD unknown\r\n")
+            else:
+                self.send(f"{tag} BAD unknown command\r\n")
+
+    def idle(self, tag):
+        box = self.server.mailbox
+        with box.lock:
+            seen = len(box.messages)
+        self.send(b"+ idling\r\n")
+        while True:
+            with box.lock:
+                box.lock.wait(0.05)
+                count = len(box.messages)
+            if count != seen:
+                seen = count
+                self.send(f"* {count} EXISTS\r\n")
+            # select() instead of a socket timeout: a timed-out makefile() can't be read again.
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            if not readable:
+                continue
+            line = self.rfile.readline()
+            if not line:
+                return
+            if line.strip().upper() == b"DONE":
+                break
+        self.send(f"{tag} OK idle done\r\n")
+
+    def parse_set(self, spec, max_uid):
+        uids = set()
+        for piece in spec.split(","):
+            if ":" in piece:
+                lo, hi = piece.split(":")
+                lo = int(lo)
+                hi = max_uid if hi == "*" else int(hi)
+                if lo > hi:
+                    lo, hi = hi, lo
+                uids.update(range(lo, hi + 1))
+            else:
+                uids.add(max_uid if piece == "*" else int(piece))
+        return uids
+
+    def search(self, criteria):
+        box = self.server.mailbox
+        with box.lock:
+            messages = list(box.messages)
+        max_uid = messages[-1][0] if messages else 0
+        result = []
+        for uid, raw, _ in messages:
+            msg = email.message_from_bytes(raw)
+            if self.matches(criteria, uid, msg, raw, max_uid):
+                result.append(uid)
+        return result
+
+    def matches(self, criteria, uid, msg, raw, max_uid):
+        ok = True
+        m = re.search(r'UID (\d+:\S+|\d+)', criteria)
+        if m:
+            spec = m.group(1).rstrip(")")
+            ok &= uid in self.parse_set(spec, max_uid)
+        subj = str(msg["Subject"] or "").lower()
+        body = raw.decode(errors="ignore").lower()
+        ors = re.search(r'\(OR \(SUBJECT "([^"]+)"\) \(BODY "([^"]+)"\)\)', criteria)
+        if ors:
+            ok &= ors.group(1).lower() in subj or ors.group(2).lower() in body
+        for key, value in re.findall(r'(SINCE|BEFORE) "([^"]+)"', criteria):
+            d = email.utils.parsedate_to_datetime(msg["Date"]).date()
+            ref = datetime.strptime(value, "%d-%b-%Y").date()
+            ok &= d >= ref if key == "SINCE" else d < ref
+        return ok
+
+    def fetch(self, tag, args):
+        box = self.server.mailbox
+        spec, _, items = args.partition(" ")
+        items = items.strip()
+        if items.startswith("(") and items.endswith(")"):
+            items = items[1:-1]
+        with box.lock:
+            messages = list(box.messages)
+        max_uid = messages[-1][0] if messages else 0
+        wanted = self.parse_set(spec, max_uid)
+        tokens = re.findall(r'BODY\.PEEK\[[^\]]*\]|BODY\[[^\]]*\]|\S+', items)
+        for seq, (uid, raw, _) in enumerate(messages, 1):
+            if uid not in wanted:
+                continue
+            msg = email.message_from_bytes(raw)
+            out = [f"* {seq} FETCH (".encode()]
+            pieces = []
+            for token in tokens:
+                upper = token.upper()
+                if upper == "UID":
+                    pieces.append(f"UID {uid}".encode())
+                elif upper == "RFC822.SIZE":
+                    pieces.append(f"RFC822.SIZE {len(raw)}".encode())
+                elif upper == "BODYSTRUCTURE":
+                    pieces.append(b"BODYSTRUCTURE " + bodystructure(msg))
+                elif upper in ("RFC822", "BODY[]", "BODY.PEEK[]"):
+                    pieces.append(b"RFC822 {%d}\r\n" % len(raw) + raw)
+                elif upper.startswith("BODY"):
+                    section = token[token.index("[") + 1:-1]
+                    if section.upper().startswith("HEADER.FIELDS"):
+                        names = section[section.index("(") + 1:section.index(")")].split()
+                        data = b"".join(f"{n.title()}: {msg[n]}\r\n".encode() for n in names if msg[n] is not None) + b"\r\n"
+                    else:
+                        data = section_bytes(raw, msg, section)
+                    pieces.append(f"BODY[{section}] {{{len(data)}}}\r\n".encode() + data)
+            body = b""
+            for i, piece in enumerate(pieces):
+                body += (b" " if i else b"") + piece
+            self.send(out[0] + body + b")\r\n")
+        self.send(f"{tag} OK done\r\n")
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, mailbox=None, port=0):
+        super().__init__(("127.0.0.1", port), Handler)
+        self.mailbox = mailbox or Mailbox()
+        self.commands = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Serves in a background thread and returns (host, port)."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.server_address
+
+    def disconnect_all(self):
+        """Closes every client connection, like a server restart or a dropped network."""
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+
+if __name__ == "__main__":
+    server = FakeIMAPServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else 1143)
+    host, port = server.start()
+    print(f"📭 Fake IMAP server listening on {host}:{port}. Press Ctrl+C to stop.")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
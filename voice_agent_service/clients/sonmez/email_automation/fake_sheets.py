@@ -0,0 +1,155 @@
+"""
+An in-memory stand-in for the Google Sheets values API, for running the sheet
+writers locally without credentials:
+
+    from fake_sheets import FakeSheetsService
+    service = FakeSheetsService()
+    SheetSync(service, "local", header).sync(rows)
+    service.rows("Sheet1"), service.requests
+
+It implements the calls the scripts make (values().get, update, append, clear and
+batchUpdate, each followed by .execute()) with A1 ranges, and mimics the real API
+in trimming trailing empty rows and cells from get responses.
+"""
+import re
+
+from sheet_sync import column_letter
+
+
+def _column_number(letters):
+    number = 0
+    for ch in letters.upper():
+        number = number * 26 + (ord(ch) - 64)
+    return number
+
+
+def parse_a1(a1_range):
+    """"Sheet1!B2:D9" -> ("Sheet1", row, col, end_row, end_col); open ends are None, indexes are 0-based."""
+    sheet, _, cells = a1_range.partition("!")
+    if not cells:
+        return sheet, 0, 0, None, None
+    start, _, end = cells.partition(":")
+
+    def split(ref):
+        match = re.fullmatch(r'([A-Za-z]*)(\d*)', ref)
+        letters, digits = match.groups()
+        return (int(digits) - 1 if digits else None), (_column_number(letters) - 1 if letters else None)
+
+    row, col = split(start)
+    if not end:
+        return sheet, row or 0, col or 0, row, col
+    end_row, end_col = split(end)
+    return sheet, row or 0, col or 0, end_row, end_col
+
+
+class _Request:
+    def __init__(self, fn):
+        self.fn = fn
+
+    def execute(self):
+        return self.fn()
+
+
+class FakeValues:
+    def __init__(self, service):
+        self.service = service
+
+    def _log(self, method, **kwargs):
+        self.service.requests.append((method, kwargs))
+
+    def get(self, spreadsheetId, range, **kwargs):
+        self._log("get", range=range)
+
+        def run():
+            sheet, row, col, end_row, end_col = parse_a1(range)
+            rows = self.service.rows(sheet)
+            end_row = len(rows) - 1 if end_row is None else end_row
+            values = []
+            for cells in rows[row:end_row + 1]:
+                stop = len(cells) if end_col is None else end_col + 1
+                picked = list(cells[col:stop])
+                while picked and picked[-1] in ("", None):
+                    picked.pop()
+                values.append(picked)
+            while values and not values[-1]:
+                values.pop()
+            result = {"range": range, "majorDimension": "ROWS"}
+            if values:
+                result["values"] = values
+            return result
+        return _Request(run)
+
+    def update(self, spreadsheetId, range, valueInputOption, body, **kwargs):
+        self._log("update", range=range, rows=len(body.get("values", [])))
+        return _Request(lambda: self.service.write(range, body.get("values", [])))
+
+    def batchUpdate(self, spreadsheetId, body, **kwargs):
+        self._log("batchUpdate", ranges=[item["range"] for item in body.get("data", [])])
+
+        def run():
+            responses = [self.service.write(item["range"], item["values"]) for item in body.get("data", [])]
+            return {"totalUpdatedRows": sum(r["updatedRows"] for r in responses), "responses": responses}
+        return _Request(run)
+
+    def append(self, spreadsheetId, range, valueInputOption, body, insertDataOption=None, **kwargs):
+        self._log("append", range=range, rows=len(body.get("values", [])))
+
+        def run():
+            sheet = parse_a1(range)[0]
+            rows = self.service.rows(sheet)
+            # Appends go below the last non-empty row of the table.
+            last = len(rows)
+            while last and not any(cell not in ("", None) for cell in rows[last - 1]):
+                last -= 1
+            values = body.get("values", [])
+            result = self.service.write(f"{sheet}!A{last + 1}", values)
+            return {"spreadsheetId": spreadsheetId, "updates": result}
+        return _Request(run)
+
+    def clear(self, spreadsheetId, range, body=None, **kwargs):
+        self._log("clear", range=range)
+
+        def run():
+            sheet, row, col, end_row, end_col = parse_a1(range)
+            rows = self.service.rows(sheet)
+            end_row = len(rows) - 1 if end_row is None else end_row
+            for cells in rows[row:end_row + 1]:
+                stop = len(cells) if end_col is None else min(end_col + 1, len(cells))
+                for i in range(col, stop):
+                    cells[i] = ""
+            return {"clearedRange": range}
+        return _Request(run)
+
+
+class FakeSheetsService:
+    """service.spreadsheets().values() returns the fake values API; sheets are plain lists of rows."""
+
+    def __init__(self, sheets=None):
+        self.sheets = {name: [list(row) for row in rows] for name, rows in (sheets or {}).items()}
+        self.requests = []
+        self._values = FakeValues(self)
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self._values
+
+    def rows(self, sheet):
+        return self.sheets.setdefault(sheet, [])
+
+    def write(self, a1_range, values):
+        sheet, row, col, _, _ = parse_a1(a1_range)
+        rows = self.rows(sheet)
+        for offset, new_cells in enumerate(values):
+            while len(rows) <= row + offset:
+                rows.append([])
+            cells = rows[row + offset]
+            while len(cells) < col + len(new_cells):
+                cells.append("")
+            cells[col:col + len(new_cells)] = [str(value) if value is not None else "" for value in new_cells]
+        last_col = col + max((len(cells) for cells in values), default=1)
+        from_cell = f"{column_letter(col + 1)}{row + 1}"
+        to_cell = f"{column_letter(last_col)}{row + len(values)}"
+        return {"updatedRange": f"{sheet}!{from_cell}:{to_cell}", "updatedRows": len(values)}
+
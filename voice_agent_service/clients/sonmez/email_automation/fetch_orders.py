@@ -1,14 +1,17 @@
 import os
 import imaplib
-import email
 import re
-from email.header import decode_header
+import json
+import argparse
 from dotenv import load_dotenv
 from googleapiclient.discovery import build
 from google.oauth2.service_account import Credentials
-from bs4 import BeautifulSoup
-import traceback
-import dateparser
+from mail_fetcher import MailFetcher, uid_set
+from order_pipeline import OrderPipeline
+from sheet_sync import SheetSync
+
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from voice_agent_service.clients.sonmez.data.order_store import get_order_store
 
 # Load environment variables
 load_dotenv()
@@ -18,46 +21,20 @@ YANDEX_PASSWORD = os.getenv("YANDEX_PASSWORD")
 GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID")
 SERVICE_ACCOUNT_FILE = "credentials.json"
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
-
-# --- KNOWLEDGE BASE FOR PRODUCT CATEGORIZATION ---
-# --- KNOWLEDGE BASE FOR PRODUCT CATEGORIZATION ---
-
-TENT_KEYWORDS = [
-    "LONDON", "BUSHCRAFT", "CAPSULE", "MAXIA", "DISCOVER",
-    "AQUILA", "PRESTIGE", "BUNGALOW", "CABIN", "FLOATING", "FAMILY"
-]
-
-COLOR_KEYWORDS = [
-    # Common color names
-    "ORANGE", "YELLOW", "DESERT", "GREY", "GRAY", "RED", "GREEN", "DESERT CAMO", "STANDARD",
-
-    # SMZ fabric codes (with and without leading zero)
-    "SMZ11", "SMZ12", "SMZ13", "SMZ14", "SMZ15", "SMZ16", "SMZ17", "SMZ18", "SMZ19", "SMZ20",
-    "SMZ011", "SMZ012", "SMZ013", "SMZ014", "SMZ015", "SMZ016", "SMZ017", "SMZ018", "SMZ019", "SMZ020"
-]
-
-EXTRA_KEYWORDS = [
-    # Tent accessories
-    "FLOOR MAT", "HAND PUMP", "Sönmez Outdoor Rechargeable Digital Air Pump", "Bravo GE BTP-2 12V Inflation Pump", "TENT BAG", "INFLATION VALVE", "FIXING STAKES",
-    "AWNING POLE", "CARRY BAG", "REPAIR KIT", "ORGANIZER", "LOCK DOOR",
-    "CINEMA SCREEN", "TENSION LANYARD", "GUYLINES", "METAL TENT PEGS",
-
-    # Stove & heater accessories
-    "STOVE", "FIREPROOF MAT", "DIESEL HEATER", "FIRE GUARD", "PIPE", "WATER TANK",
-    "PIZZA OVEN", "CHIMNEY PROTECTOR", "PERCOLOATOR", "GRILL", "HEAT-RESISTANT GLOVES",
-    "SCRUBBING SPONGE", "CAMP TABLE", "WOODLANDER", "NOMAD", "WINNERWELL",
-
-    # Inflatable screen
-    "CINEVISION", "MOVIE SCREEN", "INFLATABLE SCREEN"
-]
-
+MAILBOX = "inbox"
+# Remembers UIDVALIDITY and the highest processed UID per mailbox between runs.
+SYNC_STATE_FILE = "fetch_orders_state.json"
+ORDER_SEARCH = '(OR (SUBJECT "New Order") (BODY "WooCommerce"))'
+SHEET_HEADER = ["Order ID", "Customer Name", "Address", "Date of Order", "Total Price", "Tent", "Color", "Extras"]
+# Order ID -> row number (and row hash) in the sheet, so reruns only touch rows that changed.
+SHEET_INDEX_FILE = "fetch_orders_sheet_index.json"
 
 def connect_to_yandex():
     """Connects to the Yandex IMAP server and logs in."""
     try:
         mail = imaplib.IMAP4_SSL("imap.yandex.com")
         mail.login(YANDEX_EMAIL, YANDEX_PASSWORD)
-        mail.select("inbox")
+        mail.select(MAILBOX)
         print("✅ Successfully connected to Yandex Mail.")
         return mail
     except Exception as e:
@@ -75,252 +52,164 @@ def setup_google_sheets():
         print(f"❌ Error setting up Google Sheets API: {e}")
         return None
 
-def parse_order_email(body_html, tent_keywords, color_keywords, extra_keywords):
-    soup = BeautifulSoup(body_html, 'html.parser')
-    order_details = {}
-
-    # Pre-emptively remove all script and style elements
-    for element in soup(["script", "style"]):
-        element.decompose()
-
+def load_sync_state():
+    """Loads the per-mailbox sync checkpoints ({mailbox: {"uidvalidity", "last_uid"}})."""
     try:
-        # --- Universal Order ID and Date Extraction ---
-        order_id_match = re.search(r'(?:Order\s#|Yeni sipariş:\s|New order\s#)(\d+)', body_html, re.IGNORECASE)
-        date_match = re.search(r'\((\d{1,2}\s\w+\s\d{4})\)', body_html, re.IGNORECASE)
-        order_details['id'] = order_id_match.group(1) if order_id_match else 'N/A'
-        raw_date = date_match.group(1) if date_match else None
-        order_details['date'] = dateparser.parse(raw_date).strftime('%Y-%m-%d') if raw_date else 'N/A'
-        if order_details['id'] == 'N/A': return None
-
-        # --- Full Customer Name and Address Parsing Logic ---
-        customer_name, customer_address, total_price = 'N/A', 'N/A', 'N/A'
-        try:
-            billing_address_text_node = soup.find(string=re.compile(r'^\s*(Billing address|Fatura adresi)\s*$', re.IGNORECASE))
-            if billing_address_text_node:
-                address_element = billing_address_text_node.find_parent().find_next_sibling()
-                if address_element:
-                    address_lines = list(address_element.stripped_strings)
-                    if address_lines:
-                        customer_name = address_lines[0]
-                        physical_address_parts = [line for line in address_lines[1:] if '@' not in line and not re.match(r'^\+?\d[\d\s-]{7,}\d$', line)]
-                        customer_address = "\n".join(physical_address_parts)
-        except: pass
-        try:
-            total_text_node = soup.find(string=re.compile(r'^\s*(Total|Toplam):\s*$', re.IGNORECASE))
-            if total_text_node:
-                total_price = total_text_node.find_parent().find_next_sibling().get_text(strip=True)
-        except: pass
-        order_details.update({'customer': customer_name, 'address': customer_address, 'total_price': total_price})
-
-        # --- Product Parsing Logic ---
-        all_ordered_items = []
-        # Primary Method: Formal "Product" table
-        product_header = soup.find('th', string=re.compile(r'^Product$', re.IGNORECASE))
-        if product_header:
-            product_table_body = product_header.find_parent('thead').find_next_sibling('tbody')
-            if product_table_body:
-                product_rows = product_table_body.find_all('tr')
-                for row in product_rows:
-                    product_cell = row.find('td')
-                    if product_cell:
-                        all_ordered_items.extend(list(product_cell.stripped_strings))
-        
-        # --- FIX: Re-instated the robust fallback parser ---
-        # This will run if the primary method fails to find any items.
-        if not all_ordered_items:
-            # We combine all keyword lists to find any potential product line
-            all_keywords = tent_keywords + color_keywords + extra_keywords
-            # Create a pattern to find any of these words
-            pattern = re.compile(r'\b(' + '|'.join(re.escape(k) for k in all_keywords) + r')\b', re.IGNORECASE)
-            
-            # Find all text nodes in the email that contain a product keyword
-            found_strings = soup.find_all(string=pattern)
-            cleaned_items = set()
-            for text_node in found_strings:
-                # Find the parent element to get the full product line, not just the keyword
-                parent = text_node.find_parent(['p', 'div', 'span', 'strong', 'td', 'li'])
-                if parent:
-                    full_text = parent.get_text(strip=True).replace('\n', ' ')
-                    # Heuristic to avoid grabbing long, non-product paragraphs
-                    if len(full_text) < 150:
-                         # Exclude summary lines
-                        if not any(summary_word in full_text for summary_word in ['Subtotal', 'Shipping', 'Total', 'Payment']):
-                            cleaned_items.add(full_text)
-            all_ordered_items.extend(list(cleaned_items))
-
-
-        # --- Categorization Logic ---
-        tents, raw_colors, extras = [], [], []
-        EXTENDED_COLOR_NAMES = color_keywords + ["GRAY"] 
-        color_name_pattern = re.compile('|'.join(re.escape(name) for name in EXTENDED_COLOR_NAMES), re.IGNORECASE)
-        
-        for item in all_ordered_items:
-            item = item.strip().lstrip('•').strip()
-            if not item: continue
-            item_upper = item.upper()
-
-            if '$' in item or any(keyword in item_upper for keyword in extra_keywords):
-                extras.append(item)
-                continue
-
-            if any(keyword in item_upper for keyword in tent_keywords):
-                tents.append(item)
-                color_matches_in_tent = color_name_pattern.findall(item)
-                if color_matches_in_tent:
-                    raw_colors.extend(color_matches_in_tent)
-                continue
-
-            color_tag_match = re.match(r'Colou?r:\s*(.*)', item, re.IGNORECASE)
-            if color_tag_match:
-                color_name = color_tag_match.group(1).strip()
-                if color_name:
-                    raw_colors.append(color_name)
-                continue
-
-            if item_upper.startswith("SMZ") or re.fullmatch(color_name_pattern, item):
-                raw_colors.append(item)
-                continue
-            
-            extras.append(item)
-
-        # --- Post-processing and Normalization ---
-        normalized_colors = []
-        for color in raw_colors:
-            if color.upper().startswith("SMZ"):
-                normalized_colors.append(re.sub(r'\s+', '', color).upper())
-            else:
-                normalized_colors.append(color.title())
-        
-        final_tents = sorted(list(set(t for t in tents if t and t.strip() != ':')))
-        final_colors = sorted(list(set(c for c in normalized_colors if c and c.strip() != ':')))
-        final_extras = sorted(list(set(e for e in extras if e and e.strip() != ':')))
-        
-        order_details['tents'] = final_tents
-        order_details['colors'] = final_colors
-        order_details['extras'] = final_extras
+        with open(SYNC_STATE_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_sync_state(state):
+    # Write to a temp file and rename, so an interrupted run can't leave a corrupt checkpoint.
+    tmp_path = SYNC_STATE_FILE + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, SYNC_STATE_FILE)
+
+def get_uidvalidity(mail):
+    """Returns the UIDVALIDITY of the selected mailbox, as reported by SELECT."""
+    _, data = mail.response("UIDVALIDITY")
+    if not data or data[0] is None:
+        _, data = mail.status(MAILBOX, "(UIDVALIDITY)")
+        match = re.search(rb'UIDVALIDITY (\d+)', data[0] or b"")
+        return int(match.group(1)) if match else None
+    return int(data[0])
+
+def search_order_uids(fetcher, checkpoint):
+    """
+    Returns the UIDs of candidate order emails, oldest first. With a checkpoint only
+    UIDs above its last_uid are requested, so the search and the fetches that follow
+    scale with new mail rather than with the size of the mailbox.
+    """
+    if checkpoint:
+        criteria = f'(UID {checkpoint["last_uid"] + 1}:* {ORDER_SEARCH})'
+    else:
+        criteria = ORDER_SEARCH
+    uids = fetcher.search_uids(criteria)
+    # "N:*" always matches the newest message, even when it is older than N.
+    if checkpoint:
+        uids = [uid for uid in uids if uid > checkpoint["last_uid"]]
+    return uids
+
+def order_row(order_data):
+    """The sheet row for a parsed order, in SHEET_HEADER order, or None for an order with no items."""
+    tents = order_data.get('tents', [])
+    extras = order_data.get('extras', [])
+    colors = order_data.get('colors', [])
+
+    if not tents and not extras and not colors:
+        return None
 
-        return order_details
+    tents_str = ", ".join(tents) if tents else "N/A"
+    colors_str = ", ".join(colors) if colors else "N/A"
+    extras_str = ", ".join(extras) if extras else "N/A"
+
+    return [
+        order_data.get('id', ''),
+        order_data.get('customer', 'N/A'),
+        order_data.get('address', 'N/A'),
+        order_data.get('date', 'N/A'),
+        order_data.get('total_price', 'N/A'),
+        tents_str,
+        colors_str,
+        extras_str,
+    ]
 
-    except Exception:
-        traceback.print_exc()
-        return None
-    
 def main():
+    parser = argparse.ArgumentParser(description="Log WooCommerce order emails to Google Sheets.")
+    parser.add_argument("--full", action="store_true", help="ignore the sync checkpoint and rescan the whole mailbox")
+    args = parser.parse_args()
+
     sheets_service = setup_google_sheets()
     mail = connect_to_yandex()
     if not sheets_service or not mail: return
 
-    search_query = '(OR (SUBJECT "New Order") (BODY "WooCommerce"))'
-    status, messages = mail.search(None, search_query)
-
-    if status != "OK" or not messages[0]:
-        print('❌ No emails found matching the search criteria.')
+    # --- Incremental sync: only look at UIDs we haven't processed yet ---
+    sync_state = load_sync_state()
+    uidvalidity = get_uidvalidity(mail)
+    checkpoint = sync_state.get(MAILBOX)
+    if args.full or not checkpoint or checkpoint.get("uidvalidity") != uidvalidity:
+        if checkpoint and checkpoint.get("uidvalidity") != uidvalidity:
+            print("🔄 UIDVALIDITY changed, UIDs are no longer comparable. Running a full resync.")
+        checkpoint = None
+    incremental = checkpoint is not None
+
+    fetcher = MailFetcher(mail)
+    email_uids = search_order_uids(fetcher, checkpoint)
+    if not email_uids:
+        print('ℹ️  No new emails matching the search criteria.' if incremental else '❌ No emails found matching the search criteria.')
+        mail.logout()
         return
 
-    email_ids = messages[0].split()
-    print(f"📨 Found {len(email_ids)} candidate emails. Filtering for actual orders...")
-
-    processed_orders = {}
-    order_email_count = 0
-
-    for mail_id_bytes in email_ids:
-        status, msg_data = mail.fetch(mail_id_bytes, "(RFC822)")
-        if status != "OK": continue
-
-        msg = email.message_from_bytes(msg_data[0][1])
-
-        subject_header = msg["Subject"]
-        try:
-            subject, encoding = decode_header(subject_header)[0]
-            if isinstance(subject, bytes):
-                subject = subject.decode(encoding if encoding else "utf-8", errors='ignore')
-        except Exception:
-            subject = str(subject_header)
+    mode = f"new since UID {checkpoint['last_uid']}" if incremental else "full scan"
+    print(f"📨 Found {len(email_uids)} candidate emails ({mode}). Filtering for actual orders...")
 
+    # --- Header pass: subjects for every candidate in a few bulk round trips ---
+    candidates = []
+    for message in fetcher.fetch_headers(email_uids):
+        subject = message.subject
         if "failed" in subject.lower() or "cancelled" in subject.lower():
             print(f"🚫 Skipping failed or cancelled version: {subject}")
             continue
+        candidates.append(message)
 
-        body_html = ""
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_type() == "text/html":
-                    body_html = part.get_payload(decode=True).decode(errors='ignore')
-                    break
-        else:
-            body_html = msg.get_payload(decode=True).decode(errors='ignore')
-
-        if not body_html or ("new order" not in subject.lower() and "order summary" not in body_html.lower()):
-            continue
-
-        order_email_count += 1
-        order_data = parse_order_email(body_html, TENT_KEYWORDS, COLOR_KEYWORDS, EXTRA_KEYWORDS)
+    # --- Body pass: concurrent fetches feed a pool of parser processes ---
+    pipeline = OrderPipeline(connect_to_yandex)
+    processed_orders = pipeline.run(candidates, mail=mail)
 
-        if not order_data or not order_data.get('id') or order_data.get('id') == 'N/A':
-            print(f"⚠️ Failed to parse a valid Order ID from subject: {subject}")
-            continue
-        
-        order_id = order_data['id']
-        
-        # --- FIX: Simplified and Corrected Duplicate Handling ---
-        # The script reads newest emails first. So, if we've already seen an order ID,
-        # we can safely skip the current (older) email.
-        if order_id in processed_orders:
-            print(f"⏭️ Skipping older email for already processed Order ID: {order_id}")
-            continue
-        else:
-            # First time seeing this order ID, store it and mark email as seen.
-            processed_orders[order_id] = order_data
-            mail.store(mail_id_bytes, '+FLAGS', '\\Seen')
+    # Mark the emails the orders were taken from as seen, in one round trip.
+    winning_uids = pipeline.winning_uids()
+    if winning_uids:
+        mail.uid("STORE", uid_set(winning_uids), '+FLAGS', '\\Seen')
 
-    # --- After the loop, process the curated list of orders ---
-    print(f"\nFound {order_email_count} actual order emails to process.")
+    # --- After the pipeline, process the curated list of orders ---
+    print(f"\nFound {pipeline.order_email_count} actual order emails to process.")
     print(f"Found {len(processed_orders)} unique, valid orders to log.")
+    if pipeline.failed_uids:
+        print(f"⚠️ {len(pipeline.failed_uids)} emails could not be fetched; they will be retried on the next run.")
 
-    all_order_rows = []
+    all_order_rows, stored_orders = [], []
     for order_id, order_data in processed_orders.items():
-        tents = order_data.get('tents', [])
-        extras = order_data.get('extras', [])
-        colors = order_data.get('colors', [])
-
-        if not tents and not extras and not colors:
+        row = order_row(order_data)
+        if row is None:
             print(f"⏭️ Skipping truly empty order: {order_id}")
             continue
-
         print(f"⚙️  Logging Order ID: {order_id}")
-        
-        tents_str = ", ".join(tents) if tents else "N/A"
-        colors_str = ", ".join(colors) if colors else "N/A"
-        extras_str = ", ".join(extras) if extras else "N/A"
+        all_order_rows.append(row)
+        stored_orders.append(order_data)
 
-        all_order_rows.append([
-            order_data.get('id', ''),
-            order_data.get('customer', 'N/A'),
-            order_data.get('address', 'N/A'),
-            order_data.get('date', 'N/A'),
-            order_data.get('total_price', 'N/A'),
-            tents_str,
-            colors_str,
-            extras_str,
-        ])
+    # The local store is what the voice and WhatsApp assistants answer order questions from.
+    if stored_orders:
+        saved = get_order_store().upsert(stored_orders)
+        print(f"🗄️ {saved} orders saved to the local order store.")
     
+    written = True
     if not all_order_rows:
         print("ℹ️  No new, unique orders to write to the sheet.")
     else:
-        print(f"\n✍️ Writing data for {len(all_order_rows)} unique orders to Google Sheets...")
-        header = ["Order ID", "Customer Name", "Address", "Date of Order", "Total Price", "Tent", "Color", "Extras"]
-        final_data = [header] + all_order_rows
+        # Upsert by Order ID: new orders are appended, changed ones rewritten in place,
+        # and the sheet is never cleared.
+        print(f"\n✍️ Syncing {len(all_order_rows)} orders to Google Sheets...")
         try:
-            sheets_service.spreadsheets().values().clear(spreadsheetId=GOOGLE_SHEET_ID, range="Sheet1").execute()
-            value_range_body = {'values': final_data}
-            sheets_service.spreadsheets().values().update(
-                spreadsheetId=GOOGLE_SHEET_ID, range="Sheet1!A1",
-                valueInputOption='USER_ENTERED', body=value_range_body
-            ).execute()
-            print("✅ Successfully wrote data to Google Sheet.")
+            sheet_sync = SheetSync(sheets_service, GOOGLE_SHEET_ID, SHEET_HEADER, index_file=SHEET_INDEX_FILE)
+            result = sheet_sync.sync(all_order_rows)
+            print(f"✅ Google Sheet updated: {result['appended']} appended, {result['updated']} updated, "
+                  f"{result['unchanged']} unchanged.")
         except Exception as e:
+            written = False
             print(f"❌ Error writing to Google Sheet: {e}")
 
+    # Emails that failed to download hold the checkpoint back so they are retried.
+    if written:
+        last_uid = min(pipeline.failed_uids) - 1 if pipeline.failed_uids else max(email_uids)
+        sync_state[MAILBOX] = {"uidvalidity": uidvalidity, "last_uid": last_uid}
+        save_sync_state(sync_state)
+        print(f"📌 Sync checkpoint saved at UID {last_uid}.")
+
+    round_trips = fetcher.round_trips + pipeline.round_trips
+    bytes_received = fetcher.bytes_received + pipeline.bytes_received
+    print(f"📡 IMAP: {round_trips} round trips, {bytes_received / 1024:.0f} KiB received.")
     mail.logout()
 
 if __name__ == "__main__":
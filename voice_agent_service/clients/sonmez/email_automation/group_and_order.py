@@ -1,38 +1,46 @@
 import pandas as pd
 import numpy as np
+from contact_pipeline import ContactPipeline, COLUMN_NAMES, EXPORT_HEADERS
 
 
-file_path = 'dealership_data.csv' 
+file_path = 'dealership_data.csv'
+output_base = 'sorted_contacts'
+# Rows of the sorted result printed to the terminal; the files have all of them.
+PREVIEW_ROWS = 50
 
-try:
-    # 2. Read the data from the CSV file into a DataFrame.
-    df = pd.read_csv(file_path)
-
-
-    # df.columns = ['Company', 'Contact Name', 'Position', 'Contact Email', 'Country', 'Experience', 'Contact Phone']
 
-    # 3. Replace 'Unknown' in the 'Country' column to handle sorting.
+def prepare(df):
+    # Replace 'Unknown' in the 'Country' column to handle sorting.
     # Using `.loc` is a robust way to avoid warnings.
     df.loc[df['Country'] == 'Unknown', 'Country'] = np.nan
+    # The CSV is read as text; sort experience as a number ("20 years" -> 20).
+    experience = df['Experience'].astype("string")
+    df['Experience'] = pd.to_numeric(experience, errors='coerce').fillna(
+        experience.str.extract(r'(\d+)', expand=False).astype(float))
+    return df
 
-    # 4. Group and sort the DataFrame.
-    # The logic remains the same: sort by country, then by experience (descending).
-    df_sorted = df.sort_values(
-        by=['Country', 'Experience'], 
-        ascending=[True, False],
-        na_position='last'
+
+try:
+    # 1. Read the CSV in chunks, dropping repeated (email, company) contacts.
+    # 2. Group and sort: by country, then by experience (descending), merged across chunks.
+    pipeline = ContactPipeline(
+        list(COLUMN_NAMES.values()),
+        sort_by=[('Country', True), ('Experience', False)],
+        enrich=prepare,
+        headers=EXPORT_HEADERS,
+        numeric_columns={'Experience'},
     )
+    paths = pipeline.run([file_path], output_base, formats=("csv", "parquet"))
 
-    # 5. Print the entire sorted DataFrame.
+    # 3. Print the start of the sorted data.
     print("--- Sorted Data ---")
-    print(df_sorted.to_string())
+    print(pd.read_csv(paths[0], nrows=PREVIEW_ROWS, dtype=str).to_string())
+    print(f"... {pipeline.rows_written} rows ({pipeline.duplicates} duplicates dropped)")
 
-    # Optional: Save the sorted data to a new CSV file 
-    df_sorted.to_csv('sorted_contacts.csv', index=False)
-    print("\nSorted data has been saved to sorted_contacts.csv")
+    print(f"\nSorted data has been saved to {', '.join(paths)}")
 
 
 except FileNotFoundError:
     print(f"Error: The file '{file_path}' was not found. Please check the file name and path.")
 except KeyError as e:
-    print(f"Error: A required column was not found in the file: {e}. Please check your CSV's column headers.")
\ No newline at end of file
+    print(f"Error: A required column was not found in the file: {e}. Please check your CSV's column headers.")
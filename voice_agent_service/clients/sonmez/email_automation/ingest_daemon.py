@@ -0,0 +1,393 @@
+"""
+Long-running ingestion: holds one IMAP connection, waits for new mail with IDLE
+and sends each new message to the order parser or the dealership extractor as
+soon as it arrives, instead of waiting for someone to run fetch_orders.py or
+sheet_importer.py.
+
+    python ingest_daemon.py                 # orders and dealership applications
+    python ingest_daemon.py --only orders
+
+Only mail that arrives after the first start is ingested; backfills stay with the
+batch scripts (fetch_orders.py --full). Both paths upsert by Order ID or skip by
+Message-ID, so running them side by side doesn't duplicate rows.
+
+For local runs, start `python fake_imap_server.py 1143` and set IMAP_HOST=127.0.0.1
+IMAP_PORT=1143 IMAP_SSL=0.
+"""
+import os
+import re
+import json
+import time
+import random
+import select
+import signal
+import imaplib
+import argparse
+import threading
+from dotenv import load_dotenv
+from mail_fetcher import MailFetcher, uid_set
+from extraction_store import ExtractionStore, body_hash
+from order_parser import parse_order_email
+from order_pipeline import is_order_email
+
+load_dotenv()
+
+YANDEX_EMAIL = os.getenv("YANDEX_EMAIL")
+YANDEX_PASSWORD = os.getenv("YANDEX_PASSWORD")
+IMAP_HOST = os.getenv("IMAP_HOST", "imap.yandex.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
+IMAP_SSL = os.getenv("IMAP_SSL", "1") != "0"
+MAILBOX = "inbox"
+# Timeout for ordinary commands; a silent connection is treated as dead after this.
+IMAP_TIMEOUT = 60
+# RFC 2177: re-issue IDLE at least every 29 minutes or the server may drop us.
+IDLE_SECONDS = int(os.getenv("INGEST_IDLE_SECONDS", str(25 * 60)))
+# Without IDLE support, or after a failed handler, check again this often.
+POLL_SECONDS = int(os.getenv("INGEST_POLL_SECONDS", "60"))
+RECONNECT_BASE_SECONDS = 1
+RECONNECT_MAX_SECONDS = 300
+STATE_FILE = os.getenv("INGEST_STATE_FILE", "ingest_daemon_state.json")
+
+EXISTS_RE = re.compile(rb'^\* \d+ EXISTS', re.IGNORECASE)
+
+
+def connect(host=None, port=None, use_ssl=None):
+    """Logs in and selects the inbox."""
+    host, port = host or IMAP_HOST, port or IMAP_PORT
+    use_ssl = IMAP_SSL if use_ssl is None else use_ssl
+    if use_ssl:
+        mail = imaplib.IMAP4_SSL(host, port, timeout=IMAP_TIMEOUT)
+    else:
+        mail = imaplib.IMAP4(host, port, timeout=IMAP_TIMEOUT)
+    mail.login(YANDEX_EMAIL or "", YANDEX_PASSWORD or "")
+    mail.select(MAILBOX)
+    return mail
+
+
+def _response_int(mail, name):
+    _, data = mail.response(name)
+    if data and data[0] is not None:
+        return int(data[0])
+    _, data = mail.status(MAILBOX, f"({name})")
+    match = re.search(rf'{name} (\d+)'.encode(), data[0] or b"")
+    return int(match.group(1)) if match else None
+
+
+class _LineReader:
+    """
+    Reads response lines straight from the socket with select(), so waiting can be
+    interrupted every second (for stop()) without putting imaplib's buffered file
+    into the unusable state a socket timeout leaves it in.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = b""
+
+    def readline(self, timeout):
+        deadline = time.monotonic() + timeout
+        while b"\n" not in self.buffer:
+            pending = getattr(self.sock, "pending", lambda: 0)()
+            if not pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                readable, _, _ = select.select([self.sock], [], [], remaining)
+                if not readable:
+                    return None
+            try:
+                data = self.sock.recv(4096)
+            except (BlockingIOError, InterruptedError):
+                continue
+            if not data:
+                raise ConnectionError("IMAP server closed the connection")
+            self.buffer += data
+        line, _, self.buffer = self.buffer.partition(b"\n")
+        return line.rstrip(b"\r")
+
+
+class OrderHandler:
+    """New WooCommerce order emails -> parsed orders -> upserted into the orders sheet."""
+
+    name = "orders"
+
+    def __init__(self, sheets_service, spreadsheet_id):
+        from sheet_sync import SheetSync
+        from fetch_orders import SHEET_HEADER, SHEET_INDEX_FILE
+        self.sheet_sync = SheetSync(sheets_service, spreadsheet_id, SHEET_HEADER, index_file=SHEET_INDEX_FILE)
+
+    def wants(self, message):
+        subject = message.subject.lower()
+        return "new order" in subject and "failed" not in subject and "cancelled" not in subject
+
+    def handle(self, messages, fetcher):
+        from fetch_orders import order_row
+        from voice_agent_service.clients.sonmez.data.order_store import get_order_store
+        parts = fetcher.fetch_text_parts([message.uid for message in messages])
+        orders = {}
+        for message in messages:  # oldest first, so the newest email wins per Order ID
+            body = parts.get(message.uid, {}).get("text/html") or parts.get(message.uid, {}).get("text/plain")
+            if not is_order_email(message.subject, body):
+                continue
+            order_data = parse_order_email(body)
+            if order_data.get("id"):
+                orders[order_data["id"]] = (message.uid, order_data)
+        with_items = [data for _, data in orders.values() if order_row(data)]
+        rows = [order_row(data) for data in with_items]
+        if with_items:
+            get_order_store().upsert(with_items)
+        if rows:
+            result = self.sheet_sync.sync(rows)
+            print(f"✅ Orders {', '.join(str(row[0]) for row in rows)}: {result['appended']} appended, "
+                  f"{result['updated']} updated.")
+        if orders:
+            fetcher.mail.uid("STORE", uid_set(uid for uid, _ in orders.values()), '+FLAGS', '\\Seen')
+        return len(rows)
+
+
+class DealershipHandler:
+    """Dealership applications -> rule/AI extraction -> appended to the dealership sheet."""
+
+    name = "dealerships"
+
+    def __init__(self, worksheet, store_path=None):
+        # sheet_importer sets up OpenAI on import, so it is only loaded when this handler is used.
+        import sheet_importer
+        self.importer = sheet_importer
+        self.worksheet = worksheet
+        self.store_path = store_path or sheet_importer.EXTRACTION_DB
+        self._store = None
+
+    @property
+    def store(self):
+        # Opened on first use, in the daemon's thread: SQLite connections stay in the thread that made them.
+        if self._store is None:
+            self._store = ExtractionStore(self.store_path)
+        return self._store
+
+    def wants(self, message):
+        return self.importer.is_dealership_email(message.subject)
+
+    def handle(self, messages, fetcher):
+        fresh = []
+        for message in messages:
+            record = self.store.get(message.message_id) if message.message_id else None
+            if record is None or not record["written"]:
+                fresh.append(message)
+        parts = fetcher.fetch_text_parts([message.uid for message in fresh])
+        rows, keys = [], []
+        for message in fresh:
+            body = self.importer.get_email_body(parts.get(message.uid, {}))
+            hash_value = body_hash(body)
+            key = self.store.key_for(message.message_id, hash_value)
+            earlier = self.store.find_by_body(hash_value)
+            if earlier is not None and earlier["written"]:
+                self.store.save(key, hash_value, message.subject, earlier["data"], written=True)
+                continue
+            data = self.importer.extract_info_with_ai(body)
+            if not data:
+                continue
+            self.store.save(key, hash_value, message.subject, data)
+            rows.append(self.importer.to_row(data))
+            keys.append(key)
+        if rows:
+            if not self.importer.append_rows(self.worksheet, rows):
+                raise RuntimeError("dealership rows could not be written")
+            self.store.mark_written(keys)
+        return len(rows)
+
+
+class IngestDaemon:
+    """
+    Keeps one authenticated connection and, in a loop:
+
+    1. searches for UIDs above the checkpoint and routes their headers to the first
+       handler that wants each message (handlers fetch only the bodies they need);
+    2. advances the checkpoint once every handler succeeded; a failing handler
+       leaves it in place and the batch is retried after POLL_SECONDS;
+    3. IDLEs until the server announces new mail (or re-IDLEs after IDLE_SECONDS),
+       falling back to NOOP polling when the server lacks IDLE.
+
+    Connection errors reconnect with exponential backoff and jitter. The
+    checkpoint (UIDVALIDITY and last UID) is persisted in STATE_FILE.
+    """
+
+    def __init__(self, handlers, connect=connect, state_file=STATE_FILE):
+        self.handlers = handlers
+        self.connect = connect
+        self.state_file = state_file
+        self.stopping = threading.Event()
+        self.checkpoint = self._load_state()
+        self.processed = 0
+        self.reconnects = 0
+        self.latencies = []
+        self._idle_tags = 0
+
+    # --- Checkpoint ---
+
+    def _load_state(self):
+        try:
+            with open(self.state_file) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self):
+        tmp_path = self.state_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.checkpoint, f, indent=2)
+        os.replace(tmp_path, self.state_file)
+
+    def _check_uidvalidity(self, mail):
+        uidvalidity = _response_int(mail, "UIDVALIDITY")
+        if self.checkpoint.get("uidvalidity") == uidvalidity:
+            return
+        if self.checkpoint:
+            print("🔄 UIDVALIDITY changed; continuing from the newest message. "
+                  "Run fetch_orders.py --full to backfill.")
+        uidnext = _response_int(mail, "UIDNEXT") or 1
+        self.checkpoint = {"uidvalidity": uidvalidity, "last_uid": uidnext - 1}
+        self._save_state()
+
+    # --- Processing ---
+
+    def sync(self, mail, woke_at=None):
+        """Processes messages above the checkpoint. Returns False if a handler failed."""
+        fetcher = MailFetcher(mail)
+        last_uid = self.checkpoint["last_uid"]
+        uids = [uid for uid in fetcher.search_uids(f"UID {last_uid + 1}:*") if uid > last_uid]
+        if not uids:
+            return True
+
+        routed = {handler: [] for handler in self.handlers}
+        for message in fetcher.fetch_headers(uids):
+            handler = next((h for h in self.handlers if h.wants(message)), None)
+            if handler is not None:
+                routed[handler].append(message)
+
+        ok = True
+        for handler, messages in routed.items():
+            if not messages:
+                continue
+            try:
+                count = handler.handle(messages, fetcher)
+            except (imaplib.IMAP4.abort, OSError):
+                raise  # connection trouble: reconnect and retry the batch
+            except Exception as e:
+                print(f"❌ {handler.name} handler failed, will retry: {e}")
+                ok = False
+                continue
+            self.processed += count
+            if woke_at is not None and count:
+                latency = time.monotonic() - woke_at
+                self.latencies.append(latency)
+                print(f"⚡ {count} {handler.name} ingested {latency:.1f}s after the new-mail notification.")
+
+        if ok:
+            self.checkpoint["last_uid"] = max(uids)
+            self._save_state()
+        return ok
+
+    # --- Waiting for mail ---
+
+    def idle(self, mail, seconds):
+        """IDLEs for up to `seconds`. Returns True when the server reported new mail."""
+        self._idle_tags += 1
+        tag = f"IDLE{self._idle_tags}".encode()
+        mail.send(tag + b" IDLE\r\n")
+        reader = _LineReader(mail.sock)
+        line = reader.readline(IMAP_TIMEOUT)
+        if line is None or not line.startswith(b"+"):
+            raise imaplib.IMAP4.abort(f"IDLE was not accepted: {line!r}")
+
+        woke = False
+        deadline = time.monotonic() + seconds
+        while not woke and not self.stopping.is_set() and time.monotonic() < deadline:
+            line = reader.readline(min(1.0, max(0.0, deadline - time.monotonic())))
+            if line is not None and EXISTS_RE.match(line):
+                woke = True
+
+        mail.send(b"DONE\r\n")
+        while True:
+            line = reader.readline(IMAP_TIMEOUT)
+            if line is None:
+                raise imaplib.IMAP4.abort("no reply to DONE")
+            if line.startswith(tag + b" "):
+                return woke
+            if EXISTS_RE.match(line):
+                woke = True
+
+    def wait_for_mail(self, mail, retry):
+        """Blocks until there may be new mail. Returns the time the notification arrived."""
+        seconds = POLL_SECONDS if retry else IDLE_SECONDS
+        if "IDLE" in mail.capabilities:
+            self.idle(mail, seconds)
+        else:
+            self.stopping.wait(min(seconds, POLL_SECONDS))
+            mail.noop()
+        return time.monotonic()
+
+    # --- Main loop ---
+
+    def run(self):
+        attempt = 0
+        while not self.stopping.is_set():
+            mail = None
+            try:
+                mail = self.connect()
+                attempt = 0
+                self._check_uidvalidity(mail)
+                print(f"✅ Connected; watching for mail above UID {self.checkpoint['last_uid']}.")
+                ok = self.sync(mail)
+                while not self.stopping.is_set():
+                    woke_at = self.wait_for_mail(mail, retry=not ok)
+                    if self.stopping.is_set():
+                        break
+                    ok = self.sync(mail, woke_at)
+            except (imaplib.IMAP4.error, OSError, ConnectionError) as e:
+                if self.stopping.is_set():
+                    break
+                delay = min(RECONNECT_MAX_SECONDS, RECONNECT_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+                attempt += 1
+                self.reconnects += 1
+                print(f"⚠️ IMAP connection lost ({e}); reconnecting in {delay:.1f}s...")
+                self.stopping.wait(delay)
+            finally:
+                if mail is not None:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+        print(f"👋 Stopped after ingesting {self.processed} messages ({self.reconnects} reconnects).")
+
+    def stop(self):
+        self.stopping.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest new order and dealership emails as they arrive.")
+    parser.add_argument("--only", choices=["orders", "dealerships"], help="run a single handler")
+    args = parser.parse_args()
+
+    handlers = []
+    if args.only in (None, "orders"):
+        from fetch_orders import setup_google_sheets, GOOGLE_SHEET_ID
+        service = setup_google_sheets()
+        if not service:
+            return
+        handlers.append(OrderHandler(service, GOOGLE_SHEET_ID))
+    if args.only in (None, "dealerships"):
+        from sheet_importer import connect_to_google_sheets
+        worksheet = connect_to_google_sheets()
+        if not worksheet:
+            return
+        handlers.append(DealershipHandler(worksheet))
+
+    daemon = IngestDaemon(handlers)
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+    signal.signal(signal.SIGINT, lambda *_: daemon.stop())
+    daemon.run()
+
+
+if __name__ == "__main__":
+    main()
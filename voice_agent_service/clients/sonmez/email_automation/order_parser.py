@@ -0,0 +1,453 @@
+import os
+import re
+import functools
+import traceback
+from datetime import date
+
+import dateparser
+from bs4 import BeautifulSoup, NavigableString
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from voice_agent_service.clients.sonmez.data.catalog import get_catalog
+
+# "auto" uses lxml when it is installed, "bs4" forces BeautifulSoup's html.parser.
+ORDER_PARSER_BACKEND = os.getenv("ORDER_PARSER_BACKEND", "auto")
+
+# --- KNOWLEDGE BASE FOR PRODUCT CATEGORIZATION ---
+
+TENT_KEYWORDS = [
+    "LONDON", "BUSHCRAFT", "CAPSULE", "MAXIA", "DISCOVER",
+    "AQUILA", "PRESTIGE", "BUNGALOW", "CABIN", "FLOATING", "FAMILY"
+]
+
+COLOR_KEYWORDS = [
+    # Common color names
+    "ORANGE", "YELLOW", "DESERT", "GREY", "GRAY", "RED", "GREEN", "DESERT CAMO", "STANDARD",
+
+    # SMZ fabric codes (with and without leading zero)
+    "SMZ11", "SMZ12", "SMZ13", "SMZ14", "SMZ15", "SMZ16", "SMZ17", "SMZ18", "SMZ19", "SMZ20",
+    "SMZ011", "SMZ012", "SMZ013", "SMZ014", "SMZ015", "SMZ016", "SMZ017", "SMZ018", "SMZ019", "SMZ020"
+]
+
+EXTRA_KEYWORDS = [
+    # Tent accessories
+    "FLOOR MAT", "HAND PUMP", "Sönmez Outdoor Rechargeable Digital Air Pump", "Bravo GE BTP-2 12V Inflation Pump", "TENT BAG", "INFLATION VALVE", "FIXING STAKES",
+    "AWNING POLE", "CARRY BAG", "REPAIR KIT", "ORGANIZER", "LOCK DOOR",
+    "CINEMA SCREEN", "TENSION LANYARD", "GUYLINES", "METAL TENT PEGS",
+
+    # Stove & heater accessories
+    "STOVE", "FIREPROOF MAT", "DIESEL HEATER", "FIRE GUARD", "PIPE", "WATER TANK",
+    "PIZZA OVEN", "CHIMNEY PROTECTOR", "PERCOLOATOR", "GRILL", "HEAT-RESISTANT GLOVES",
+    "SCRUBBING SPONGE", "CAMP TABLE", "WOODLANDER", "NOMAD", "WINNERWELL",
+
+    # Inflatable screen
+    "CINEVISION", "MOVIE SCREEN", "INFLATABLE SCREEN"
+]
+
+# --- Patterns, compiled once ---
+
+ORDER_ID_RE = re.compile(r'(?:Order\s#|Yeni sipariş:\s|New order\s#)(\d+)', re.IGNORECASE)
+ORDER_DATE_RE = re.compile(r'\((\d{1,2}\s\w+\s\d{4})\)', re.IGNORECASE)
+BILLING_LABEL_RE = re.compile(r'^\s*(Billing address|Fatura adresi)\s*$', re.IGNORECASE)
+TOTAL_LABEL_RE = re.compile(r'^\s*(Total|Toplam):\s*$', re.IGNORECASE)
+PRODUCT_HEADER_RE = re.compile(r'^Product$', re.IGNORECASE)
+PHONE_LINE_RE = re.compile(r'^\+?\d[\d\s-]{7,}\d$')
+COLOR_TAG_RE = re.compile(r'Colou?r:\s*(.*)', re.IGNORECASE)
+SUMMARY_WORDS_RE = re.compile(r'Subtotal|Shipping|Total|Payment')
+WHITESPACE_RE = re.compile(r'\s+')
+# Only real documents go to lxml. libxml2 wraps fragments and bare text in implied
+# <html>/<body>/<p> elements, which html.parser doesn't, and that changes which
+# element a product line belongs to.
+FULL_DOCUMENT_RE = re.compile(r'<(?:html|body)[\s>]', re.IGNORECASE)
+
+# Parents the keyword fallback takes a whole product line from.
+PRODUCT_LINE_TAGS = ('p', 'div', 'span', 'strong', 'td', 'li')
+
+# English and Turkish month names, so common order dates skip dateparser's language detection.
+# (dateparser also reads Turkish "Mart" as the MART timezone, so March orders need this table.)
+MONTHS = {
+    "january": 1, "jan": 1, "february": 2, "feb": 2, "march": 3, "mar": 3, "april": 4, "apr": 4,
+    "may": 5, "june": 6, "jun": 6, "july": 7, "jul": 7, "august": 8, "aug": 8,
+    "september": 9, "sep": 9, "sept": 9, "october": 10, "oct": 10, "november": 11, "nov": 11,
+    "december": 12, "dec": 12,
+    "ocak": 1, "şubat": 2, "mart": 3, "nisan": 4, "mayıs": 5, "haziran": 6, "temmuz": 7,
+    "ağustos": 8, "eylül": 9, "ekim": 10, "kasım": 11, "aralık": 12,
+}
+
+
+def _substring_pattern(words):
+    """A case-sensitive alternation equivalent to any(word in text for word in words)."""
+    if not words:
+        return re.compile(r'(?!)')
+    return re.compile('|'.join(re.escape(word) for word in words))
+
+
+@functools.lru_cache(maxsize=1024)
+def parse_order_date(raw_date):
+    """Turns "14 July 2025" or "14 Temmuz 2025" into "2025-07-14"; anything else goes through dateparser."""
+    day, month, year = raw_date.split()
+    month_number = MONTHS.get(month.lower())
+    if month_number:
+        try:
+            return date(int(year), month_number, int(day)).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    return dateparser.parse(raw_date).strftime('%Y-%m-%d')
+
+
+# --- HTML backends ---
+# Both walk the tree once and hand the parser a flat list of (text, handle) pairs for
+# every text node in document order, plus the <th> cells. The helpers below mirror the
+# BeautifulSoup calls the original parser made (find_parent, find_next_sibling,
+# stripped_strings, get_text, .string), so both backends return the same fields.
+
+class _SoupDocument:
+    """BeautifulSoup with html.parser, the reference behaviour."""
+
+    def __init__(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        # Pre-emptively remove all script and style elements
+        for element in soup(["script", "style"]):
+            element.decompose()
+
+        self.strings = []
+        self.header_cells = []
+        for node in soup.descendants:
+            if isinstance(node, NavigableString):
+                self.strings.append((str(node), node))
+            elif node.name == 'th':
+                self.header_cells.append(node)
+
+    def string_parent(self, handle):
+        return handle.find_parent()
+
+    def string_ancestor(self, handle, names):
+        return handle.find_parent(list(names))
+
+    def ancestor(self, element, name):
+        return element.find_parent(name)
+
+    def next_element(self, element, name=None):
+        return element.find_next_sibling(name) if name else element.find_next_sibling()
+
+    def descendants(self, element, name):
+        return element.find_all(name)
+
+    def first_descendant(self, element, name):
+        return element.find(name)
+
+    def stripped_strings(self, element):
+        return list(element.stripped_strings)
+
+    def text(self, element):
+        return element.get_text(strip=True)
+
+    def only_string(self, element):
+        return element.string
+
+
+_SKIPPED_TAGS = ('script', 'style')
+
+
+class _LxmlDocument:
+    """lxml's libxml2 HTML parser. A text node's handle is the element that contains it."""
+
+    parser = etree.HTMLParser() if etree is not None else None
+
+    def __init__(self, html):
+        root = etree.fromstring(html, self.parser)
+        if root is None:
+            raise ValueError("empty document")
+
+        self.strings = []
+        self.header_cells = []
+        skipping = None
+        for event, element in etree.iterwalk(root, events=("start", "end", "comment", "pi")):
+            if event in ("comment", "pi"):
+                if skipping is None:
+                    # BeautifulSoup's find(string=...) also looks at comments.
+                    if event == "comment" and element.text:
+                        self.strings.append((element.text, element.getparent()))
+                    if element.tail:
+                        self.strings.append((element.tail, element.getparent()))
+                continue
+            if event == "start":
+                if skipping is not None:
+                    continue
+                if element.tag in _SKIPPED_TAGS:
+                    skipping = element
+                    continue
+                if element.tag == 'th':
+                    self.header_cells.append(element)
+                if element.text:
+                    self.strings.append((element.text, element))
+            else:
+                if element is skipping:
+                    skipping = None
+                elif skipping is not None:
+                    continue
+                if element.tail and element is not root:
+                    self.strings.append((element.tail, element.getparent()))
+
+    @staticmethod
+    def _is_tag(element):
+        return isinstance(element.tag, str) and element.tag not in _SKIPPED_TAGS
+
+    def string_parent(self, handle):
+        return handle
+
+    def string_ancestor(self, handle, names):
+        element = handle
+        while element is not None and element.tag not in names:
+            element = element.getparent()
+        return element
+
+    def ancestor(self, element, name):
+        return self.string_ancestor(element.getparent(), (name,))
+
+    def next_element(self, element, name=None):
+        sibling = element.getnext()
+        while sibling is not None and not (self._is_tag(sibling) and (name is None or sibling.tag == name)):
+            sibling = sibling.getnext()
+        return sibling
+
+    def descendants(self, element, name):
+        return list(element.iterdescendants(name))
+
+    def first_descendant(self, element, name):
+        return next(element.iterdescendants(name), None)
+
+    def _strings(self, element):
+        if element.text:
+            yield element.text
+        for child in element:
+            if self._is_tag(child):
+                yield from self._strings(child)
+            if child.tail:
+                yield child.tail
+
+    def stripped_strings(self, element):
+        return [text.strip() for text in self._strings(element) if text.strip()]
+
+    def text(self, element):
+        return "".join(self.stripped_strings(element))
+
+    def only_string(self, element):
+        # BeautifulSoup's .string: the single child string, looking through single-child tags.
+        children = [element.text] if element.text else []
+        for child in element:
+            if isinstance(child.tag, str) and child.tag in _SKIPPED_TAGS:
+                pass
+            else:
+                children.append(child)
+            if child.tail:
+                children.append(child.tail)
+        if len(children) != 1:
+            return None
+        child = children[0]
+        if isinstance(child, str):
+            return child
+        if not isinstance(child.tag, str):
+            return child.text if child.tag is etree.Comment else None
+        return self.only_string(child)
+
+
+class OrderParser:
+    """
+    Turns a WooCommerce order email into the order_details dict fetch_orders logs.
+
+    All patterns, including the keyword alternations, are compiled once per parser,
+    and the HTML tree is walked a single time per email; the billing, total and
+    product lookups work on the flat list of text nodes that walk produces. lxml is
+    used for full documents when it is installed, BeautifulSoup's html.parser
+    otherwise, and both give the same output as the original implementation.
+    """
+
+    def __init__(self, tent_keywords=TENT_KEYWORDS, color_keywords=COLOR_KEYWORDS,
+                 extra_keywords=EXTRA_KEYWORDS, backend=None):
+        backend = backend or ORDER_PARSER_BACKEND
+        if backend not in ("auto", "lxml", "bs4"):
+            raise ValueError(f"Unknown order parser backend: {backend}")
+        if backend == "lxml" and etree is None:
+            raise ImportError("ORDER_PARSER_BACKEND=lxml but lxml is not installed")
+        self.use_lxml = backend != "bs4" and etree is not None
+        if backend == "auto" and etree is None:
+            print("ℹ️ lxml is not installed; order emails are parsed with the slower html.parser.")
+
+        self.tent_keywords = list(tent_keywords)
+        self.color_keywords = list(color_keywords)
+        self.extra_keywords = list(extra_keywords)
+
+        all_keywords = self.tent_keywords + self.color_keywords + self.extra_keywords
+        self.keyword_pattern = re.compile(r'\b(' + '|'.join(re.escape(k) for k in all_keywords) + r')\b', re.IGNORECASE)
+        self.tent_pattern = _substring_pattern(self.tent_keywords)
+        self.extra_pattern = _substring_pattern(self.extra_keywords)
+        extended_color_names = self.color_keywords + ["GRAY"]
+        self.color_name_pattern = re.compile('|'.join(re.escape(name) for name in extended_color_names), re.IGNORECASE)
+
+    def _document(self, html):
+        if self.use_lxml and FULL_DOCUMENT_RE.search(html):
+            try:
+                return _LxmlDocument(html)
+            except (ValueError, etree.LxmlError):
+                pass
+        return _SoupDocument(html)
+
+    def parse(self, body_html):
+        """Returns the order_details dict, or None when the email isn't a parseable order."""
+        order_details = {}
+        try:
+            # --- Universal Order ID and Date Extraction ---
+            order_id_match = ORDER_ID_RE.search(body_html)
+            if not order_id_match:
+                return None
+            order_details['id'] = order_id_match.group(1)
+            date_match = ORDER_DATE_RE.search(body_html)
+            order_details['date'] = parse_order_date(date_match.group(1)) if date_match else 'N/A'
+
+            doc = self._document(body_html)
+
+            # --- Full Customer Name and Address Parsing Logic ---
+            billing_node = total_node = None
+            for text, handle in doc.strings:
+                if billing_node is None and BILLING_LABEL_RE.search(text):
+                    billing_node = handle
+                if total_node is None and TOTAL_LABEL_RE.search(text):
+                    total_node = handle
+                if billing_node is not None and total_node is not None:
+                    break
+
+            customer_name, customer_address, total_price = 'N/A', 'N/A', 'N/A'
+            customer_phone, customer_email = 'N/A', 'N/A'
+            try:
+                if billing_node is not None:
+                    address_element = doc.next_element(doc.string_parent(billing_node))
+                    if address_element is not None:
+                        address_lines = doc.stripped_strings(address_element)
+                        if address_lines:
+                            customer_name = address_lines[0]
+                            physical_address_parts = [line for line in address_lines[1:] if '@' not in line and not PHONE_LINE_RE.match(line)]
+                            customer_address = "\n".join(physical_address_parts)
+                            # The phone and email lines identify the customer in order lookups.
+                            customer_phone = next((line for line in address_lines[1:] if PHONE_LINE_RE.match(line)), 'N/A')
+                            customer_email = next((line for line in address_lines[1:] if '@' in line), 'N/A')
+            except Exception:
+                pass
+            try:
+                if total_node is not None:
+                    total_price = doc.text(doc.next_element(doc.string_parent(total_node)))
+            except Exception:
+                pass
+            order_details.update({'customer': customer_name, 'address': customer_address, 'total_price': total_price,
+                                  'phone': customer_phone, 'email': customer_email})
+
+            # --- Product Parsing Logic ---
+            all_ordered_items = []
+            # Primary Method: Formal "Product" table
+            product_header = next((cell for cell in doc.header_cells
+                                   if PRODUCT_HEADER_RE.search(doc.only_string(cell) or "")), None)
+            if product_header is not None:
+                table_head = doc.ancestor(product_header, 'thead')
+                if table_head is None:
+                    return None
+                product_table_body = doc.next_element(table_head, 'tbody')
+                if product_table_body is not None:
+                    for row in doc.descendants(product_table_body, 'tr'):
+                        product_cell = doc.first_descendant(row, 'td')
+                        if product_cell is not None:
+                            all_ordered_items.extend(doc.stripped_strings(product_cell))
+
+            # Fallback: any text node with a product keyword, taking the whole line around it.
+            if not all_ordered_items:
+                all_ordered_items.extend(self._keyword_lines(doc))
+
+            self._categorize(all_ordered_items, order_details)
+            return order_details
+
+        except Exception:
+            traceback.print_exc()
+            return None
+
+    def _keyword_lines(self, doc):
+        cleaned_items = set()
+        line_texts = {}
+        for text, handle in doc.strings:
+            if not self.keyword_pattern.search(text):
+                continue
+            parent = doc.string_ancestor(handle, PRODUCT_LINE_TAGS)
+            if parent is None:
+                continue
+            # Several keyword strings usually share one line; only extract its text once.
+            full_text = line_texts.get(id(parent))
+            if full_text is None:
+                full_text = line_texts[id(parent)] = doc.text(parent).replace('\n', ' ')
+            # Heuristic to avoid grabbing long, non-product paragraphs, and summary lines
+            if len(full_text) < 150 and not SUMMARY_WORDS_RE.search(full_text):
+                cleaned_items.add(full_text)
+        return list(cleaned_items)
+
+    def _categorize(self, all_ordered_items, order_details):
+        tents, raw_colors, extras = [], [], []
+
+        for item in all_ordered_items:
+            item = item.strip().lstrip('•').strip()
+            if not item: continue
+            item_upper = item.upper()
+
+            if '$' in item or self.extra_pattern.search(item_upper):
+                extras.append(item)
+                continue
+
+            if self.tent_pattern.search(item_upper):
+                tents.append(item)
+                raw_colors.extend(self.color_name_pattern.findall(item))
+                continue
+
+            color_tag_match = COLOR_TAG_RE.match(item)
+            if color_tag_match:
+                color_name = color_tag_match.group(1).strip()
+                if color_name:
+                    raw_colors.append(color_name)
+                continue
+
+            if item_upper.startswith("SMZ") or self.color_name_pattern.fullmatch(item):
+                raw_colors.append(item)
+                continue
+
+            extras.append(item)
+
+        # --- Post-processing and Normalization ---
+        normalized_colors = []
+        for color in raw_colors:
+            if color.upper().startswith("SMZ"):
+                normalized_colors.append(WHITESPACE_RE.sub('', color).upper())
+            else:
+                normalized_colors.append(color.title())
+
+        final_tents = sorted(set(t for t in tents if t and t.strip() != ':'))
+        final_colors = sorted(set(c for c in normalized_colors if c and c.strip() != ':'))
+        final_extras = sorted(set(e for e in extras if e and e.strip() != ':'))
+
+        order_details['tents'] = final_tents
+        order_details['colors'] = final_colors
+        order_details['extras'] = final_extras
+
+        # Resolve the order lines to catalog product names (dict lookups, not a catalog scan).
+        catalog = get_catalog()
+        order_details['products'] = sorted({product.name for line in final_tents + final_extras
+                                            for product in catalog.find_in_text(line)})
+
+
+@functools.lru_cache(maxsize=8)
+def _parser_for(tent_keywords, color_keywords, extra_keywords):
+    return OrderParser(tent_keywords, color_keywords, extra_keywords)
+
+
+def parse_order_email(body_html, tent_keywords=TENT_KEYWORDS, color_keywords=COLOR_KEYWORDS, extra_keywords=EXTRA_KEYWORDS):
+    """Parses one order email with a parser compiled once per keyword set."""
+    return _parser_for(tuple(tent_keywords), tuple(color_keywords), tuple(extra_keywords)).parse(body_html)
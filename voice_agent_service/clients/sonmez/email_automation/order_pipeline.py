@@ -0,0 +1,184 @@
+import os
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from mail_fetcher import MailFetcher
+from order_parser import parse_order_email
+
+# Separate IMAP connections used to download message bodies in parallel.
+FETCH_CONNECTIONS = int(os.getenv("ORDER_FETCH_CONNECTIONS", "4"))
+# Parser processes. Below PARALLEL_PARSE_THRESHOLD messages the emails are parsed
+# in this process instead, since starting the pool would cost more than it saves.
+PARSE_WORKERS = int(os.getenv("ORDER_PARSE_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_PARSE_THRESHOLD = 200
+# Messages per fetch round trip and per parse job.
+CHUNK_SIZE = 50
+# Fetched chunks allowed to wait for a parser; this (with the in-flight parse jobs)
+# bounds how much mail is held in memory during a backfill.
+QUEUE_SIZE = 8
+
+_DONE = object()
+
+
+def is_order_email(subject, body):
+    return bool(body) and ("new order" in subject.lower() or "order summary" in body.lower())
+
+
+def parse_chunk(items):
+    """Parses [(uid, subject, body)] in a worker process and returns [(uid, subject, order_data)]."""
+    return [(uid, subject, parse_order_email(body)) for uid, subject, body in items]
+
+
+class OrderPipeline:
+    """
+    Fetch -> parse -> dedupe, with the stages running concurrently.
+
+    Fetch threads, each with its own IMAP connection, download the text parts of
+    chunks of messages into a bounded queue. The calling thread hands every chunk
+    to a process pool for parsing (with a cap on parse jobs in flight) and collects
+    the results. For each Order ID the email with the highest UID, i.e. the newest
+    one, wins, so the outcome doesn't depend on which chunk finished first.
+    """
+
+    def __init__(self, connect, fetch_connections=FETCH_CONNECTIONS, parse_workers=PARSE_WORKERS,
+                 chunk_size=CHUNK_SIZE, queue_size=QUEUE_SIZE):
+        self.connect = connect
+        self.fetch_connections = max(1, fetch_connections)
+        self.parse_workers = parse_workers
+        self.chunk_size = chunk_size
+        self.queue_size = queue_size
+
+        self.orders = {}  # order_id -> (uid, order_data)
+        self.order_email_count = 0
+        self.failed_uids = []
+        self.round_trips = 0
+        self.bytes_received = 0
+        self._stats_lock = threading.Lock()
+
+    def run(self, messages, mail=None):
+        """
+        Processes MessageHeaders from the header pass and returns {order_id: order_data}.
+        An already connected `mail` is used as one of the fetch connections.
+        """
+        chunks = queue.Queue()
+        for i in range(0, len(messages), self.chunk_size):
+            chunks.put(messages[i:i + self.chunk_size])
+        bodies = queue.Queue(maxsize=self.queue_size)
+
+        fetch_connections = min(self.fetch_connections, chunks.qsize()) or 1
+        threads = []
+        for worker in range(fetch_connections):
+            thread = threading.Thread(
+                target=self._fetch_worker, args=(chunks, bodies, mail if worker == 0 else None), daemon=True
+            )
+            thread.start()
+            threads.append(thread)
+
+        if self.parse_workers and len(messages) >= PARALLEL_PARSE_THRESHOLD:
+            with ProcessPoolExecutor(max_workers=self.parse_workers) as executor:
+                self._consume(bodies, len(threads), lambda items: executor.submit(parse_chunk, items),
+                              max_in_flight=self.parse_workers * 2)
+        else:
+            self._consume(bodies, len(threads), lambda items: _Immediate(parse_chunk(items)), max_in_flight=1)
+
+        for thread in threads:
+            thread.join()
+
+        # Chunks no fetch worker could take (e.g. every connection failed).
+        while not chunks.empty():
+            self.failed_uids.extend(message.uid for message in chunks.get_nowait())
+
+        # Oldest order first, so the rows come out in the same order on every run.
+        ordered = sorted(self.orders.items(), key=lambda item: item[1][0])
+        return {order_id: order_data for order_id, (_, order_data) in ordered}
+
+    def winning_uids(self):
+        """UIDs of the emails the logged orders came from."""
+        return sorted(uid for uid, _ in self.orders.values())
+
+    # --- Stage 1: fetch ---
+
+    def _fetch_worker(self, chunks, bodies, mail):
+        own_connection = mail is None
+        try:
+            if own_connection:
+                mail = self.connect()
+                if not mail:
+                    return
+            fetcher = MailFetcher(mail)
+            while True:
+                try:
+                    chunk = chunks.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    parts_by_uid = fetcher.fetch_text_parts([message.uid for message in chunk])
+                except Exception as e:
+                    print(f"❌ Error fetching {len(chunk)} emails: {e}")
+                    with self._stats_lock:
+                        self.failed_uids.extend(message.uid for message in chunk)
+                    continue
+
+                items = []
+                for message in chunk:
+                    parts = parts_by_uid.get(message.uid, {})
+                    body_html = parts.get("text/html") or parts.get("text/plain", "")
+                    subject = message.subject
+                    if is_order_email(subject, body_html):
+                        items.append((message.uid, subject, body_html))
+                if items:
+                    bodies.put(items)  # Blocks while the parsers are behind.
+
+            with self._stats_lock:
+                self.round_trips += fetcher.round_trips
+                self.bytes_received += fetcher.bytes_received
+        finally:
+            if own_connection and mail:
+                try:
+                    mail.logout()
+                except Exception:
+                    pass
+            bodies.put(_DONE)
+
+    # --- Stage 2 and 3: parse, then dedupe ---
+
+    def _consume(self, bodies, producers, submit, max_in_flight):
+        in_flight = deque()
+        while producers:
+            items = bodies.get()
+            if items is _DONE:
+                producers -= 1
+                continue
+            in_flight.append(submit(items))
+            while len(in_flight) >= max_in_flight:
+                self._collect(in_flight.popleft().result())
+        while in_flight:
+            self._collect(in_flight.popleft().result())
+
+    def _collect(self, results):
+        for uid, subject, order_data in results:
+            self.order_email_count += 1
+            if not order_data or not order_data.get('id') or order_data.get('id') == 'N/A':
+                print(f"⚠️ Failed to parse a valid Order ID from subject: {subject}")
+                continue
+
+            order_id = order_data['id']
+            current = self.orders.get(order_id)
+            if current is not None:
+                if current[0] > uid:
+                    print(f"⏭️ Skipping older email for already processed Order ID: {order_id}")
+                    continue
+                print(f"⏭️ Replacing older email for Order ID: {order_id}")
+            self.orders[order_id] = (uid, order_data)
+
+
+class _Immediate:
+    """Stands in for a Future when parsing runs in this process."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+# The email scripts run from this folder and import their neighbours as top-level
+# modules. Importing this module puts the repository root on the path as well, so
+# they can reach the shared voice_agent_service code (catalog, order store, LLM client).
+REPO_ROOT = str(Path(__file__).resolve().parents[4])
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
@@ -1,14 +1,19 @@
 import os
 import imaplib
-import email
 import json
-import time
-from email.header import decode_header
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from bs4 import BeautifulSoup
 from datetime import date, timedelta
 import openai
 import gspread
+from mail_fetcher import MailFetcher
+from extraction_store import ExtractionStore, body_hash
+from dealer_extractor import FIELDS, DealerExtractor, ExtractionStats
+
+import repo_root  # noqa: F401 (puts the repository root on sys.path)
+from voice_agent_service.clients.sonmez.llm_logic.rate_limiter import TokenBucket
+from voice_agent_service.clients.sonmez.llm_logic.llm_client import get_llm_client
 
 # --- Load Environment Variables ---
 load_dotenv()
@@ -16,6 +21,27 @@ YANDEX_EMAIL = os.getenv("YANDEX_EMAIL")
 YANDEX_PASSWORD = os.getenv("YANDEX_PASSWORD")
 GOOGLE_SHEET_ID = os.getenv("DEALERSHIP_SHEET_ID")
 CREDENTIALS_FILE = os.getenv("DEALERSHIP_CREDENTIALS_FILE") 
+# Extraction results and written flags per email, so reruns skip mail already handled.
+EXTRACTION_DB = os.getenv("DEALERSHIP_EXTRACTION_DB", "dealership_extractions.db")
+
+# --- Rate limits ---
+# OpenAI quotas (OPENAI_RPM, OPENAI_TPM) are paced by the shared LLM client. Sheets allows
+# 60 write requests per minute per user; the limiter only slows down when it would be hit.
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "4"))
+SHEETS_WRITES_PER_MINUTE = int(os.getenv("SHEETS_WRITES_PER_MINUTE", "60"))
+# Rows collected before one batched append.
+SHEET_BATCH_ROWS = int(os.getenv("SHEET_BATCH_ROWS", "50"))
+# Upper bound on the completion, counted against the token quota with the prompt.
+MAX_OUTPUT_TOKENS = 300
+# Application text beyond this is quoted replies and footers; the fields are near the top or in the signature.
+MAX_PROMPT_BODY_CHARS = 6000
+
+llm_client = get_llm_client()
+sheets_writes = TokenBucket.per_minute(SHEETS_WRITES_PER_MINUTE)
+
+# Our own addresses appear in quoted replies and footers; they are never the applicant's.
+dealer_extractor = DealerExtractor(exclude_domains=[(YANDEX_EMAIL or "").rpartition("@")[2]])
+extraction_stats = ExtractionStats()
 
 try:
     openai.api_key = os.getenv("OPENAI_API_KEY")
@@ -25,6 +51,12 @@ except Exception as e:
     print(f"❌ Error setting up OpenAI: {e}")
     exit()
 
+# Subject keywords that identify dealership applications.
+DEALERSHIP_KEYWORDS = ["dealership", "application", "partnership", "reselling", "interest", "dealer"]
+
+def is_dealership_email(subject):
+    return any(keyword in subject.lower() for keyword in DEALERSHIP_KEYWORDS)
+
 # --- Google Sheets Connection ---
 def connect_to_google_sheets():
     """Connects to Google Sheets using the service account credentials."""
@@ -41,50 +73,64 @@ def connect_to_google_sheets():
         return None
 
 # --- AI Information Extraction --- 
-def extract_info_with_ai(email_body):
-    """Uses OpenAI to extract structured data from an email body."""
-    if not email_body or len(email_body) < 20:
-        return None
-
-    # This prompt is the key to handling varied email formats
-    prompt = f"""
-    You are an expert data entry assistant. Your task is to analyze the following email text, which is a dealership or partnership application, and extract specific details.
-
-    The fields to extract are:
-    - CompanyName
-    - ContactName
-    - Position
-    - ContactEmail
-    - Experience
-    - ContactPhone
+def build_prompt(email_body, fields):
+    """The extraction prompt, asking only for the fields the rules could not find."""
+    field_list = "\n".join(f"    - {field}" for field in fields)
+    experience_rule = ""
+    if "Experience" in fields:
+        experience_rule = """
+    3.  For "Experience", extract numerical values like '2 years', '30', '1+' and standardize it (e.g., "2 years"). If not present, return 'N/A'."""
+    return f"""
+    Extract these fields from the dealership or partnership application below:
+{field_list}
 
     Instructions:
-    1.  Carefully read the entire email to find the information.
-    2.  If a field is not mentioned, use "N/A" as the value.
-    3.  For "Experience", extract numerical values like '2 years', '30', '1+' and standardize it (e.g., "2 years"). If not present, return 'N/A'.
-    4.  The output MUST be a valid JSON object only. Do not add any introductory text, explanations, or markdown formatting like ```json.
+    1.  If a field is not mentioned, use "N/A" as the value.
+    2.  Output a JSON object with exactly these keys and nothing else.{experience_rule}
 
     Email Text:
     ---
-    {email_body}
+    {email_body[:MAX_PROMPT_BODY_CHARS]}
     ---
     JSON Output:
     """
 
+def extract_info_with_ai(email_body):
+    """
+    Extracts the dealership fields from an email body. The rule-based extractor runs
+    first; OpenAI is only asked for the fields it left missing, and not at all when
+    it found everything.
+    """
+    if not email_body or len(email_body) < 20:
+        return None
+
+    found = dealer_extractor.extract(email_body)
+    missing = [field for field in FIELDS if field not in found]
+    if not missing:
+        extraction_stats.record(len(found), 0, called_llm=False)
+        print(f"⚡ All fields found without the AI for: {found['CompanyName']}")
+        return {field: found[field] for field in FIELDS}
+
+    prompt = build_prompt(email_body, missing)
+
     try:
-        print("🤖 Sending email content to AI for data extraction...")
-        client = openai.OpenAI()
-        response = client.chat.completions.create(
+        print(f"🤖 Asking AI for {', '.join(missing)} ({len(found)} fields found by rules)...")
+        content = llm_client.chat(
+            "sheet_importer.extract_info",
             model="gpt-4o", # Best model for complex extraction
             messages=[
                 {"role": "system", "content": "You are a data entry assistant that only outputs valid JSON."},
                 {"role": "user", "content": prompt}
             ],
             temperature=0.1,
+            max_tokens=MAX_OUTPUT_TOKENS,
             response_format={"type": "json_object"} # Enforces JSON output
         )
         # The response content is a JSON string, so we parse it
-        extracted_data = json.loads(response.choices[0].message.content)
+        ai_data = json.loads(content)
+        # Rule results win; the AI only fills the gaps.
+        extracted_data = {field: found.get(field) or ai_data.get(field, "N/A") for field in FIELDS}
+        extraction_stats.record(len(found), len(missing), called_llm=True)
         print(f"✅ AI analysis complete for: {extracted_data.get('CompanyName', 'N/A')}")
         return extracted_data
     except json.JSONDecodeError as e:
@@ -94,34 +140,36 @@ def extract_info_with_ai(email_body):
         print(f"❌ Error during OpenAI API call: {e}")
         return None
 
-# --- Email Parsing (Slightly modified from previous script) ---
-def get_email_body(msg):
-    """Extracts the plain text or cleaned HTML body from an email message."""
-    body = ""
-    if msg.is_multipart():
-        for part in msg.walk():
-            content_type = part.get_content_type()
-            content_disposition = str(part.get("Content-Disposition"))
-            if content_type == 'text/plain' and 'attachment' not in content_disposition:
-                try:
-                    body = part.get_payload(decode=True).decode(errors='ignore')
-                    break # Found plain text, use it
-                except:
-                    continue
-        if not body: # If no plain text found, fallback to HTML
-             for part in msg.walk():
-                if part.get_content_type() == 'text/html':
-                    soup = BeautifulSoup(part.get_payload(decode=True).decode(errors='ignore'), 'html.parser')
-                    body = soup.get_text(separator='\n', strip=True)
-                    break
-    else: # Not multipart
-        if 'text/plain' in msg.get_content_type():
-            body = msg.get_payload(decode=True).decode(errors='ignore')
-        elif 'text/html' in msg.get_content_type():
-            soup = BeautifulSoup(msg.get_payload(decode=True).decode(errors='ignore'), 'html.parser')
-            body = soup.get_text(separator='\n', strip=True)
-
-    return body
+# --- Google Sheets Writes ---
+def append_rows(worksheet, rows):
+    """Writes rows with one append request. Returns True on success."""
+    if not rows:
+        return True
+    try:
+        sheets_writes.acquire()
+        worksheet.append_rows(rows, value_input_option='USER_ENTERED')
+        print(f"✅ Successfully wrote {len(rows)} rows to Google Sheets.")
+        return True
+    except Exception as e:
+        print(f"❌ Failed to write {len(rows)} rows to Google Sheets: {e}")
+        return False
+
+def to_row(data):
+    """Puts the extracted fields in the sheet's column order."""
+    return [data.get(field, "N/A") for field in FIELDS]
+
+# --- Email Parsing ---
+def get_email_body(parts):
+    """
+    Picks the plain text body, or the cleaned HTML body as a fallback, from the
+    {content_type: text} parts returned by MailFetcher.fetch_text_parts.
+    """
+    if parts.get('text/plain'):
+        return parts['text/plain']
+    if parts.get('text/html'):
+        soup = BeautifulSoup(parts['text/html'], 'html.parser')
+        return soup.get_text(separator='\n', strip=True)
+    return ""
 
 # --- Main Application Logic ---
 def main():
@@ -143,58 +191,106 @@ def main():
     # 2. Search for emails from the last 2 days
     search_date = (date.today() - timedelta(days=2)).strftime("%d-%b-%Y")
     search_criteria = f'(SINCE "{search_date}")'
-    status, messages = mail.search(None, search_criteria)
+    fetcher = MailFetcher(mail)
+    email_uids = fetcher.search_uids(search_criteria)
 
-    if status != "OK" or not messages[0]:
+    if not email_uids:
         print('ℹ️ No emails found in the last 2 days.')
         mail.logout()
         return
 
-    email_ids = messages[0].split()
-    print(f"📨 Found {len(email_ids)} emails from the last 2 days. Analyzing...")
-
-    # Define keywords to identify relevant emails
-    keywords = ["dealership", "application", "partnership", "reselling", "interest", "dealer"]
-
-    for mail_id in email_ids:
-        status, msg_data = mail.fetch(mail_id, "(RFC822)")
-        if status != 'OK': continue
-            
-        msg = email.message_from_bytes(msg_data[0][1])
-        
-        # Decode subject and check for keywords
-        subject = str(decode_header(str(msg["Subject"]))[0][0])
-        if not any(keyword in subject.lower() for keyword in keywords):
-            # print(f"Skipping email with subject: '{subject}'")
-            continue # Skip if no keywords are in the subject
-
-        print(f"\nProcessing relevant email with subject: '{subject}'")
-        body = get_email_body(msg)
-        
-        # 3. Use AI to extract info
-        data = extract_info_with_ai(body)
-        
-        # 4. Write data to Google Sheets
-        if data:
-            try:
-                # Prepare row in the correct order for your sheet
-                row = [
-                    data.get("CompanyName", "N/A"),
-                    data.get("ContactName", "N/A"),
-                    data.get("Position", "N/A"),
-                    data.get("ContactEmail", "N/A"),
-                    data.get("Experience", "N/A"),
-                    data.get("ContactPhone", "N/A")
-                ]
-                worksheet.append_row(row, value_input_option='USER_ENTERED')
-                print(f"✅ Successfully wrote '{row[0]}' to Google Sheets.")
-            except Exception as e:
-                print(f"❌ Failed to write to Google Sheets: {e}")
-
-        # Pause to avoid hitting API rate limits
-        time.sleep(15)
+    print(f"📨 Found {len(email_uids)} emails from the last 2 days. Analyzing...")
+
+    store = ExtractionStore(EXTRACTION_DB)
+
+    # Headers first: the subject filter runs locally, so unrelated mail is never downloaded.
+    relevant = [message for message in fetcher.fetch_headers(email_uids)
+                if is_dealership_email(message.subject)]
+
+    # One entry per distinct application body, in the order the emails arrived. An entry
+    # collects every store key (Message-ID) that carries the same text.
+    entries, entries_by_hash = [], {}
+    already_written = 0
+
+    def add_entry(key, hash_value, subject, data=None, body=None):
+        entry = entries_by_hash.get(hash_value)
+        if entry is not None:
+            entry["keys"].append(key)
+            return
+        entry = {"keys": [key], "hash": hash_value, "subject": subject, "data": data, "body": body}
+        entries_by_hash[hash_value] = entry
+        entries.append(entry)
+
+    # 3. Seen Message-IDs are answered from the store without downloading the body.
+    to_fetch = []
+    for message in relevant:
+        record = store.get(message.message_id) if message.message_id else None
+        if record is None:
+            to_fetch.append(message)
+        elif record["written"]:
+            already_written += 1
+        else:
+            add_entry(message.message_id, record["body_hash"], message.subject, data=record["data"])
+
+    bodies = fetcher.fetch_text_parts([message.uid for message in to_fetch])
+    for message in to_fetch:
+        body = get_email_body(bodies.get(message.uid, {}))
+        hash_value = body_hash(body)
+        key = store.key_for(message.message_id, hash_value)
+        # The same application re-sent under another Message-ID reuses the first extraction.
+        record = store.get(key) or store.find_by_body(hash_value)
+        if record is not None and record["written"]:
+            store.save(key, hash_value, message.subject, record["data"], written=True)
+            already_written += 1
+            continue
+        add_entry(key, hash_value, message.subject, data=record["data"] if record else None, body=body)
+
+    needs_extraction = [entry for entry in entries if entry["data"] is None]
+    print(f"♻️ {already_written} emails already in the sheet, {len(entries) - len(needs_extraction)} answered "
+          f"from the extraction store, {len(needs_extraction)} to send to the AI.")
+
+    def process(entry):
+        print(f"\nProcessing relevant email with subject: '{entry['subject']}'")
+        # Use AI to extract info
+        return extract_info_with_ai(entry["body"])
+
+    batch, written, failed = [], 0, 0
+
+    def flush():
+        nonlocal batch, written, failed
+        if append_rows(worksheet, [to_row(entry["data"]) for entry in batch]):
+            store.mark_written([key for entry in batch for key in entry["keys"]])
+            written += len(batch)
+        else:
+            failed += len(batch)
+        batch = []
+
+    # 4. Extract in parallel (the LLM client keeps us inside the OpenAI quota) and
+    # write the rows to Google Sheets in batches, in the order the emails arrived.
+    with ThreadPoolExecutor(max_workers=OPENAI_CONCURRENCY) as executor:
+        results = executor.map(process, needs_extraction)
+        for entry in entries:
+            if entry["data"] is None:
+                entry["data"] = next(results)
+                if not entry["data"]:
+                    continue
+                for key in entry["keys"]:
+                    store.save(key, entry["hash"], entry["subject"], entry["data"])
+            batch.append(entry)
+            if len(batch) >= SHEET_BATCH_ROWS:
+                flush()
+    if batch:
+        flush()
+    store.close()
 
+    # Waits are summed over the worker threads.
+    print(f"\n📝 {written} rows written, {failed} failed. Rate limit waits: "
+          f"{llm_client.waited():.0f}s OpenAI, {sheets_writes.waited:.0f}s Sheets.")
+    if extraction_stats.emails:
+        print(f"⚡ Extraction: {extraction_stats.summary()}")
+    llm_client.log_summary()
     print("\n✅ All relevant emails processed.")
+    print(f"📡 IMAP: {fetcher.round_trips} round trips, {fetcher.bytes_received / 1024:.0f} KiB received.")
     mail.logout()
 
 
@@ -0,0 +1,146 @@
+import os
+import re
+import json
+import hashlib
+
+# Rows per append request, which keeps each request well under the API's payload limit.
+APPEND_BATCH_SIZE = 500
+
+
+def column_letter(number):
+    """1 -> "A", 27 -> "AA"."""
+    letters = ""
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _row_hash(row):
+    return hashlib.sha1(json.dumps([str(value) for value in row]).encode("utf-8")).hexdigest()
+
+
+class SheetSync:
+    """
+    Upserts rows keyed by the ID in column A, without ever clearing the sheet.
+
+    A local index file maps each ID to its row number and a hash of the row last
+    written there. Every sync reads column A once to confirm the index still
+    matches the sheet (someone may have sorted or edited it by hand); if it
+    doesn't, the index is rebuilt from one full read. New IDs are appended, rows
+    whose content changed are rewritten with a single batchUpdate, and unchanged
+    rows cost nothing.
+    """
+
+    def __init__(self, sheets_service, spreadsheet_id, header, sheet_name="Sheet1", index_file="sheet_index.json"):
+        self.values = sheets_service.spreadsheets().values()
+        self.spreadsheet_id = spreadsheet_id
+        self.header = list(header)
+        self.sheet_name = sheet_name
+        self.index_file = index_file
+        self.last_column = column_letter(len(self.header))
+
+    # --- Local index ---
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, "r") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+        if data.get("spreadsheet_id") != self.spreadsheet_id or data.get("sheet") != self.sheet_name:
+            return {}
+        return data.get("rows", {})
+
+    def _save_index(self, index):
+        data = {"spreadsheet_id": self.spreadsheet_id, "sheet": self.sheet_name, "rows": index}
+        tmp_path = self.index_file + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.index_file)
+
+    def _read_ids(self):
+        """Returns ({id: row_number}, number of rows in use) from column A."""
+        result = self.values.get(spreadsheetId=self.spreadsheet_id, range=f"{self.sheet_name}!A:A").execute()
+        column = result.get("values", [])
+        row_by_id = {}
+        for row_number, cells in enumerate(column[1:], start=2):
+            if cells and cells[0] != "":
+                row_by_id.setdefault(str(cells[0]), row_number)
+        return row_by_id, len(column)
+
+    def _rebuild_index(self):
+        result = self.values.get(
+            spreadsheetId=self.spreadsheet_id, range=f"{self.sheet_name}!A:{self.last_column}"
+        ).execute()
+        index = {}
+        for row_number, row in enumerate(result.get("values", [])[1:], start=2):
+            if row and row[0] != "" and str(row[0]) not in index:
+                padded = list(row) + [""] * (len(self.header) - len(row))
+                index[str(row[0])] = [row_number, _row_hash(padded)]
+        return index
+
+    # --- Sync ---
+
+    def sync(self, rows):
+        """
+        Writes rows (lists in header order, ID first) and returns {"appended": n, "updated": n, "unchanged": n}.
+        The index is only saved once every write has succeeded.
+        """
+        row_by_id, used_rows = self._read_ids()
+        index = self._load_index()
+        if {order_id: entry[0] for order_id, entry in index.items()} != row_by_id:
+            if index:
+                print("🔄 Sheet no longer matches the local index; rebuilding it from the sheet.")
+            index = self._rebuild_index() if row_by_id else {}
+
+        if used_rows == 0:
+            self.values.update(
+                spreadsheetId=self.spreadsheet_id, range=f"{self.sheet_name}!A1",
+                valueInputOption='USER_ENTERED', body={'values': [self.header]}
+            ).execute()
+            used_rows = 1
+
+        new_rows, changed, unchanged = [], [], 0
+        seen = set()
+        for row in rows:
+            order_id = str(row[0])
+            if order_id in seen:
+                continue
+            seen.add(order_id)
+            row_hash = _row_hash(row)
+            entry = index.get(order_id)
+            if entry is None:
+                new_rows.append(row)
+            elif entry[1] != row_hash:
+                changed.append((entry[0], row))
+                index[order_id] = [entry[0], row_hash]
+            else:
+                unchanged += 1
+
+        if changed:
+            data = [{"range": f"{self.sheet_name}!A{row_number}:{self.last_column}{row_number}", "values": [row]}
+                    for row_number, row in changed]
+            self.values.batchUpdate(
+                spreadsheetId=self.spreadsheet_id,
+                body={"valueInputOption": "USER_ENTERED", "data": data}
+            ).execute()
+
+        next_row = used_rows + 1
+        for i in range(0, len(new_rows), APPEND_BATCH_SIZE):
+            batch = new_rows[i:i + APPEND_BATCH_SIZE]
+            response = self.values.append(
+                spreadsheetId=self.spreadsheet_id, range=f"{self.sheet_name}!A1",
+                valueInputOption='USER_ENTERED', insertDataOption='INSERT_ROWS',
+                body={'values': batch}
+            ).execute()
+            # The API reports where the rows landed, e.g. "Sheet1!A952:H1001".
+            updated_range = (response or {}).get("updates", {}).get("updatedRange", "")
+            match = re.search(r'![A-Z]+(\d+)', updated_range)
+            first_row = int(match.group(1)) if match else next_row
+            for offset, row in enumerate(batch):
+                index[str(row[0])] = [first_row + offset, _row_hash(row)]
+            next_row = first_row + len(batch)
+
+        self._save_index(index)
+        return {"appended": len(new_rows), "updated": len(changed), "unchanged": unchanged}
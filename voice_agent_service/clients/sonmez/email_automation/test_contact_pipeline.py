@@ -0,0 +1,23 @@
+"""
+Header handling in contact_pipeline. Run from this folder:
+    python -m pytest test_contact_pipeline.py
+"""
+import pandas as pd
+import pytest
+
+from contact_pipeline import LEGACY_COLUMNS, normalize_columns
+
+
+def test_export_headers_are_renamed():
+    df = normalize_columns(pd.DataFrame(columns=["Company", "Contact Email", "Contact Phone"]))
+    assert df.columns.tolist() == ["Company", "Email", "Phone", "Country"]
+
+
+def test_headerless_six_column_file_maps_by_position():
+    df = normalize_columns(pd.DataFrame(columns=["Acme", "Jane", "Owner", "j@acme.com", "5", "+1 555"]))
+    assert df.columns.tolist() == LEGACY_COLUMNS + ["Country"]
+
+
+def test_unknown_headers_are_reported():
+    with pytest.raises(KeyError, match="Notes"):
+        normalize_columns(pd.DataFrame(columns=["Company", "Contact Email", "Notes"]))
@@ -0,0 +1,27 @@
+"""
+Rule-based country inference. Run from this folder:
+    python -m pytest test_country_inference.py
+"""
+import pandas as pd
+
+from country_inference import countries_from_domains, countries_from_phones
+
+
+def test_domains():
+    domains = pd.Series(["firma.com.tr", "proton.me", "startup.io", "gmail.com", "web.de", "shop.de", "brand.co"])
+    assert countries_from_domains(domains).fillna("").tolist() == [
+        "Turkey", "", "", "", "Germany", "Germany", "",
+    ]
+
+
+def test_free_mail_domain_on_a_cctld_is_not_a_country():
+    # proton.me is free mail and .me is a vanity TLD; either rule alone keeps it out.
+    assert countries_from_domains(pd.Series(["proton.me"])).isna().all()
+
+
+def test_phones_need_an_explicit_international_prefix():
+    phones = pd.Series(["+90 532 000 00 00", "0049 30 1234567", "+1 416 555 0100", "+1 212 555 0100",
+                        "13812345678", "11987654321", "38269190190", "0532 000 00 00"])
+    assert countries_from_phones(phones).fillna("").tolist() == [
+        "Turkey", "Germany", "Canada", "United States", "", "", "", "",
+    ]
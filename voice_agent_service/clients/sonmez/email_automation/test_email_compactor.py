@@ -0,0 +1,54 @@
+"""
+Regression cases for email_compactor. Run from this folder:
+    python -m pytest test_email_compactor.py
+"""
+from email_compactor import compact_body, strip_signature
+
+
+def test_signature_after_sign_off_is_cut_to_the_name():
+    body = ("Hi,\n\nPlease find the invoice attached.\n\n"
+            "Best regards,\nJohn Smith\nSales Manager\nExample Outdoor Ltd.\n+44 20 0000 0000")
+    assert compact_body(body) == "Hi,\n\nPlease find the invoice attached.\n\nJohn Smith"
+
+
+def test_opening_thanks_is_not_a_signature():
+    body = ("Thanks!\n\nThe order #123 arrived damaged.\nThe pole is broken near the top.\n"
+            "Please send a replacement")
+    assert strip_signature(body) == body
+
+
+def test_sign_off_followed_by_sentences_is_kept():
+    body = "Hi\nThanks!\nI forgot to mention: please send the invoice too."
+    assert strip_signature(body) == body
+
+
+def test_trailing_disclaimer_is_removed():
+    body = ("Hello,\n\nThe price list is confidential until Monday, please don't share it.\n\n"
+            "Thanks,\nAyse\n\n"
+            "This email and any attachments are confidential and intended solely for the addressee. "
+            "If you are not the intended recipient, delete it.")
+    assert compact_body(body) == ("Hello,\n\nThe price list is confidential until Monday, please don't share it."
+                                  "\n\nAyse")
+
+
+def test_disclaimer_words_in_correspondence_are_kept():
+    body = "Hello,\n\nThe shipment is late. This message was sent to confirm the delay and the new date."
+    assert compact_body(body) == body
+
+
+def test_footer_sentence_is_cut_from_the_last_paragraph():
+    body = "Hi, see below.\n\nThe tent ships Monday. You received this because you subscribed. Unsubscribe here."
+    assert compact_body(body) == "Hi, see below.\n\nThe tent ships Monday."
+
+
+def test_short_repeated_reply_is_kept():
+    seen = set()
+    assert compact_body("Hi,\n\nYes, please ship it.", seen) == "Hi,\n\nYes, please ship it."
+    assert compact_body("Hi,\n\nYes, please ship it.", seen) == "Hi,\n\nYes, please ship it."
+
+
+def test_long_paragraph_quoted_without_a_marker_is_sent_once():
+    seen = set()
+    request = "Could you send the price list for the London Discover range and the delivery times to Izmir?"
+    assert compact_body(f"Hello,\n\n{request}", seen) == f"Hello,\n\n{request}"
+    assert compact_body(f"Sure, attached.\n\n{request}", seen) == "Sure, attached."
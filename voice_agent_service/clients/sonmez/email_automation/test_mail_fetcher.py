@@ -0,0 +1,45 @@
+"""
+A FETCH the server refuses must surface as a failure, never as a message without a body.
+Run from this folder:
+    python -m pytest test_mail_fetcher.py
+"""
+from email.message import Message
+
+import pytest
+
+from mail_fetcher import FetchError, MailFetcher, MessageHeaders
+from order_pipeline import OrderPipeline
+
+
+class RefusingMailbox:
+    """Answers every UID FETCH with NO, like a server under load or a dropped mailbox lock."""
+
+    def uid(self, command, *args):
+        if command == "FETCH":
+            return "NO", [b"[UNAVAILABLE] try again later"]
+        return "OK", [b""]
+
+
+def headers(uid, subject):
+    message = Message()
+    message["Subject"] = subject
+    return MessageHeaders(uid, None, message)
+
+
+@pytest.mark.parametrize("call", [
+    lambda fetcher: fetcher.fetch_headers([7, 8]),
+    lambda fetcher: fetcher.fetch_structures([7, 8]),
+    lambda fetcher: fetcher.fetch_text_parts([7, 8]),
+])
+def test_refused_fetch_raises_with_its_uids(call):
+    with pytest.raises(FetchError) as raised:
+        call(MailFetcher(RefusingMailbox()))
+    assert raised.value.uids == [7, 8]
+
+
+def test_pipeline_reports_refused_fetches_as_failed():
+    pipeline = OrderPipeline(connect=lambda: RefusingMailbox(), fetch_connections=1, parse_workers=0)
+    orders = pipeline.run([headers(7, "[Shop] New order #1001"), headers(8, "[Shop] New order #1002")],
+                          mail=RefusingMailbox())
+    assert orders == {}
+    assert sorted(pipeline.failed_uids) == [7, 8]
@@ -0,0 +1,58 @@
+"""
+SheetSync against the in-memory values API in fake_sheets.py. Run from this folder:
+    python -m pytest test_sheet_sync.py
+"""
+from fake_sheets import FakeSheetsService
+from sheet_sync import SheetSync
+
+HEADER = ["Order ID", "Date", "Customer", "Total"]
+
+
+def make_sync(service, tmp_path):
+    return SheetSync(service, "local", HEADER, index_file=str(tmp_path / "sheet_index.json"))
+
+
+def methods(service):
+    return [method for method, _ in service.requests]
+
+
+def test_append_then_update_then_noop(tmp_path):
+    service = FakeSheetsService()
+    rows = [["101", "2025-07-01", "Ayşe Yılmaz", "₺58.150,00"],
+            ["102", "2025-07-02", "Alex Poe", "$3,725.00"]]
+
+    assert make_sync(service, tmp_path).sync(rows) == {"appended": 2, "updated": 0, "unchanged": 0}
+    assert service.rows("Sheet1") == [HEADER] + rows
+
+    # A newer email for 101 and a new order 103: one batchUpdate for 101, one append for 103.
+    service.requests.clear()
+    changed = ["101", "2025-07-01", "Ayşe Yılmaz", "₺60.000,00"]
+    new = ["103", "2025-07-03", "Mehmet Kaya", "₺23.550,00"]
+    assert make_sync(service, tmp_path).sync([changed, rows[1], new]) == {"appended": 1, "updated": 1, "unchanged": 1}
+    assert service.rows("Sheet1") == [HEADER, changed, rows[1], new]
+    assert methods(service) == ["get", "batchUpdate", "append"]
+    assert service.requests[1][1]["ranges"] == ["Sheet1!A2:D2"]
+
+    # Rerunning with the same rows reads column A once and writes nothing.
+    service.requests.clear()
+    assert make_sync(service, tmp_path).sync([changed, rows[1], new]) == {"appended": 0, "updated": 0, "unchanged": 3}
+    assert service.requests == [("get", {"range": "Sheet1!A:A"})]
+
+
+def test_index_is_rebuilt_when_column_a_changes(tmp_path):
+    service = FakeSheetsService()
+    rows = [["101", "2025-07-01", "A", "1"], ["102", "2025-07-02", "B", "2"], ["103", "2025-07-03", "C", "3"]]
+    make_sync(service, tmp_path).sync(rows)
+
+    # Someone sorts the sheet by hand, newest first.
+    service.sheets["Sheet1"] = [HEADER] + rows[::-1]
+    service.requests.clear()
+    updated = ["102", "2025-07-02", "B", "20"]
+    result = make_sync(service, tmp_path).sync([rows[0], updated, rows[2]])
+
+    assert result == {"appended": 0, "updated": 1, "unchanged": 2}
+    assert methods(service) == ["get", "get", "batchUpdate"]
+    assert service.requests[1][1]["range"] == "Sheet1!A:D"
+    # 102 is still in row 3 after the sort, and only that row is rewritten.
+    assert service.requests[2][1]["ranges"] == ["Sheet1!A3:D3"]
+    assert service.rows("Sheet1") == [HEADER, rows[2], updated, rows[0]]
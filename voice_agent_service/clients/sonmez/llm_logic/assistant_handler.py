@@ -1,16 +1,55 @@
 import os
 import json
-from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-from langchain_pinecone import PineconeVectorStore
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+import importlib
+import threading
+from voice_agent_service.clients.sonmez.data.catalog import TentProduct, get_catalog
+from voice_agent_service.clients.sonmez.llm_logic.llm_client import get_llm_client
+from voice_agent_service.clients.sonmez.llm_logic.order_lookup import answer_order_question
+from voice_agent_service.clients.sonmez.llm_logic.product_matcher import find_products
+
+ASSISTANT_MODEL = "gpt-4o-mini"
+
+# Developer's Note: LangChain, Pinecone and the OpenAI SDK take seconds to import, so they
+# are only imported when the first question needs the RAG chain (or by preload_sdks() in a
+# pre-fork server's master). Importing this module, and the webhooks with it, stays cheap.
+HEAVY_MODULES = ("langchain_core.embeddings", "langchain_pinecone", "langchain.prompts", "langchain_core.runnables", "openai")
+
+# The prompt is structured to guide the LLM in using the provided context effectively,
+# especially for questions that require counting, listing, or comparing items.
+RAG_TEMPLATE = """
+    You are a helpful and friendly product expert for Sönmez Outdoor.
+    Your task is to answer the user's question based *only* on the context provided.
+
+    - If the context contains details for multiple products, use that information to answer comparative or summary questions. For questions like "how many" or "list all", count or list all the items provided in the context.
+    - If the user is just starting, greet them and ask how you can help.
+    - Report data exactly as it is written. Do not make up information.
+    - If the context does not contain the answer, politely say you don't have that information.
+
+    Context:
+    {context}
+
+    Conversation History:
+    {history}
+
+    User Question: {question}
 
-def format_docs_for_llm(docs):
+    Answer:
+    """
+
+_rag_chain = None
+_rag_chain_pid = None
+_rag_chain_lock = threading.Lock()
+
+def format_docs_for_llm(docs, mentioned=()):
     """
     Formats a list of documents for the LLM by creating a unique, readable context string.
     It de-duplicates documents based on 'doc_id' and formats each category differently.
+    `mentioned` are catalog products named in the question; those retrieval missed are
+    added from the catalog.
     """
-    if not docs:
+    retrieved = {doc.metadata.get('name') for doc in docs}
+    missing = [product for product in mentioned if product.name not in retrieved]
+    if not docs and not missing:
         return "No relevant information was found."
 
     formatted_context = []
@@ -23,12 +62,21 @@ def format_docs_for_llm(docs):
         category = metadata.get('category')
 
         if category == 'product':
-            # Safely parse JSON string for capacity info
-            capacity_info = json.loads(metadata.get('capacity', '{}'))
+            # The catalog lookup is a dict hit on the normalized name; it gives us live
+            # colors and prices, and saves parsing the JSON-encoded metadata.
+            product = get_catalog().find_by_name(metadata.get('name'))
+            if product is not None:
+                capacity_info = product.capacity or {}
+            else:
+                # Safely parse JSON string for capacity info
+                capacity_info = json.loads(metadata.get('capacity', '{}'))
             details.append(f"--- Tent Product: {metadata.get('name')} ---")
             details.append(f"Capacity (Camping): {capacity_info.get('camping', 'N/A')} people")
             details.append(f"Capacity (Glamping): {capacity_info.get('glamping', 'N/A')} people")
             details.append(f"Weight: {metadata.get('weight', 'N/A')}")
+            if product is not None and product.colors:
+                colors = ", ".join(f"{v.color} (${v.price:,.0f})" for v in product.colors if v.price is not None)
+                details.append(f"Colors and Prices: {colors}")
         
         elif category == 'accessory':
             details.append(f"--- Accessory: {metadata.get('name')} ---")
@@ -40,67 +88,107 @@ def format_docs_for_llm(docs):
 
         if details:
             formatted_context.append("\n".join(details))
-            
-    return "\n\n".join(formatted_context)
-
-def run_rag_assistant(user_input, history):
-    """
-    Runs the RAG assistant by retrieving relevant documents, formatting them,
-    and passing them to the LLM with a structured prompt.
-    """
-    vectorstore = PineconeVectorStore.from_existing_index(
-        index_name="sonmez-products",
-        embedding=OpenAIEmbeddings(model="text-embedding-3-small")
-    )
-    # Increased top_k to 20 for better recall on list-based and summary questions.
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 20})
-
-    # The prompt is structured to guide the LLM in using the provided context effectively,
-    # especially for questions that require counting, listing, or comparing items.
-    template = """
-    You are a helpful and friendly product expert for Sönmez Outdoor.
-    Your task is to answer the user's question based *only* on the context provided.
 
-    - If the context contains details for multiple products, use that information to answer comparative or summary questions. For questions like "how many" or "list all", count or list all the items provided in the context.
-    - If the user is just starting, greet them and ask how you can help.
-    - Report data exactly as it is written. Do not make up information.
-    - If the context does not contain the answer, politely say you don't have that information.
-
-    Context:
-    {context}
+    for product in missing:
+        formatted_context.append(format_product_for_llm(product))
 
-    Conversation History:
-    {history}
+    return "\n\n".join(formatted_context)
 
-    User Question: {question}
 
-    Answer:
+def format_product_for_llm(product):
+    """The same details as format_docs_for_llm, straight from a catalog record."""
+    if not isinstance(product, TentProduct):
+        return f"--- Accessory: {product.name} ---\nPrice: ${product.price}"
+    capacity_info = product.capacity or {}
+    details = [
+        f"--- Tent Product: {product.name} ---",
+        f"Capacity (Camping): {capacity_info.get('camping', 'N/A')} people",
+        f"Capacity (Glamping): {capacity_info.get('glamping', 'N/A')} people",
+        f"Weight: {product.weight or 'N/A'}",
+    ]
+    colors = ", ".join(f"{v.color} (${v.price:,.0f})" for v in product.colors if v.price is not None)
+    if colors:
+        details.append(f"Colors and Prices: {colors}")
+    return "\n".join(details)
+
+def preload_sdks():
+    """Imports the heavy SDKs without connecting to anything, e.g. before a server forks its workers."""
+    for name in HEAVY_MODULES:
+        importlib.import_module(name)
+
+
+def get_rag_chain():
     """
-    prompt = PromptTemplate.from_template(template)
-
-    llm = ChatOpenAI(
-        model_name="gpt-4o-mini",
-        temperature=0.2,
-        max_tokens=256
-    )
-    
-    # The RAG chain links the retriever, document formatter, prompt, LLM, and output parser.
-    rag_chain = (
-        {
-            "context": lambda x: format_docs_for_llm(retriever.invoke(x["question"])),
-            "question": lambda x: x["question"],
-            "history": lambda x: x["history"],
-        }
-        | prompt
-        | llm
-        | StrOutputParser()
-    )
+    The RAG chain, built on first use and then reused by every turn of this process.
+    It is rebuilt after a fork so workers never share the Pinecone connection.
+    """
+    global _rag_chain, _rag_chain_pid
+    with _rag_chain_lock:
+        if _rag_chain is not None and _rag_chain_pid == os.getpid():
+            return _rag_chain
+
+        from langchain_pinecone import PineconeVectorStore
+        from langchain.prompts import PromptTemplate
+        from langchain_core.runnables import RunnableLambda
+
+        llm_client = get_llm_client()
+        # Developer's Note: The query embeddings go through the shared LLM client too, so they
+        # use its connection pool and rate limiter and show up in the metrics as "embeddings".
+        vectorstore = PineconeVectorStore.from_existing_index(
+            index_name="sonmez-products",
+            embedding=llm_client.langchain_embeddings("embeddings", model="text-embedding-3-small")
+        )
+        # Increased top_k to 20 for better recall on list-based and summary questions.
+        retriever = vectorstore.as_retriever(search_kwargs={"k": 20})
+        prompt = PromptTemplate.from_template(RAG_TEMPLATE)
+
+        # Developer's Note: The answer goes through the shared LLM client rather than ChatOpenAI,
+        # so assistant turns are pooled, rate limited and counted with every other OpenAI call.
+        llm = RunnableLambda(lambda prompt_value: llm_client.chat(
+            "assistant",
+            model=ASSISTANT_MODEL,
+            messages=[{"role": "user", "content": prompt_value.to_string()}],
+            temperature=0.2,
+            max_tokens=256
+        ))
+
+        # The RAG chain links the retriever, document formatter, prompt, and LLM.
+        # Developer's Note: Products the caller names, misheard ones ("bush craft") included, are
+        # matched against the catalog, so their details reach the prompt even when retrieval misses them.
+        _rag_chain = (
+            {
+                "context": lambda x: format_docs_for_llm(
+                    retriever.invoke(x["question"]),
+                    [mention.product for mention in find_products(x["question"])]
+                ),
+                "question": lambda x: x["question"],
+                "history": lambda x: x["history"],
+            }
+            | prompt
+            | llm
+        )
+        _rag_chain_pid = os.getpid()
+        return _rag_chain
+
+
+def run_rag_assistant(user_input, history, caller_phone=None):
+    """
+    Runs the RAG assistant by retrieving relevant documents, formatting them,
+    and passing them to the LLM with a structured prompt. Order-status questions
+    are answered from the local order store; `caller_phone` lets a caller ask
+    about "my order" without knowing the number.
+    """
+    order_answer = answer_order_question(user_input, history, caller_phone)
+    if order_answer is not None:
+        history.append({"role": "user", "content": user_input})
+        history.append({"role": "assistant", "content": order_answer})
+        return order_answer
 
     # Format the conversation history into a simple string for the prompt.
     formatted_history = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history])
 
     # Invoke the chain with the user's input and the formatted history.
-    answer = rag_chain.invoke({
+    answer = get_rag_chain().invoke({
         "question": user_input,
         "history": formatted_history
     })
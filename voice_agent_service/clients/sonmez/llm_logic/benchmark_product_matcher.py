@@ -0,0 +1,89 @@
+"""
+Benchmarks the compiled ProductMatcher against the old per-product substring scan
+at 1x, 10x and 100x the size of the real catalog.
+
+Run from the repository root:
+    python -m voice_agent_service.clients.sonmez.llm_logic.benchmark_product_matcher
+"""
+import time
+
+from voice_agent_service.clients.sonmez.data.catalog import get_catalog, Accessory
+from voice_agent_service.clients.sonmez.llm_logic.product_matcher import ProductMatcher
+
+# Queries that name a product exactly, which the legacy scan also finds.
+EXACT_QUERIES = [
+    "How much is the London 360 Discover M with a hand pump and a floor mat 310x280?",
+    "Can I order the Sönmez floating tent and 12 fixing stakes",
+]
+# Misheard names and no product at all: the legacy scan finds nothing, the matcher
+# runs its fuzzy pass.
+OTHER_QUERIES = [
+    "Hi, do you have the bush craft premium in desert camo?",
+    "I'm looking for something for my family, maybe the air capsul",
+    "what colors does the aquilla come in",
+    "hello, what are your opening hours?",
+]
+QUERIES = EXACT_QUERIES + OTHER_QUERIES
+
+
+def legacy_match_product(user_input, product_list):
+    """The original substring scan, kept here as the baseline."""
+    user_input_lower = user_input.lower()
+    for product in product_list:
+        product_name = product.get('name', '').lower()
+        if product_name and product_name in user_input_lower:
+            return product
+    return None
+
+
+def scaled_records(factor):
+    """Returns the real catalog plus (factor - 1) synthetic copies with distinct names."""
+    catalog = get_catalog()
+    records = list(catalog.tents + catalog.accessories)
+    for copy in range(1, factor):
+        for record in catalog.tents + catalog.accessories:
+            records.append(Accessory.from_dict({"name": f"{record.name} Series {copy}", "price": 1.0}))
+    return records
+
+
+def time_per_query(fn, repeat, queries=QUERIES, rounds=5):
+    """Microseconds per query, best of `rounds` so a busy machine doesn't skew the table."""
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for query in queries:
+                fn(query)
+        elapsed = (time.perf_counter() - start) / (repeat * len(queries)) * 1e6
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(repeat=100):
+    print(f"{'catalog':>8} {'products':>9} {'compile ms':>11} {'legacy exact':>13} {'match exact':>12} "
+          f"{'legacy other':>13} {'match other':>12} {'find_all':>9}   (us per query)")
+    for factor in (1, 10, 100):
+        records = scaled_records(factor)
+        product_list = [record.to_dict() for record in records]
+
+        start = time.perf_counter()
+        matcher = ProductMatcher(records)
+        compile_ms = (time.perf_counter() - start) * 1000
+
+        legacy = lambda q: legacy_match_product(q, product_list)
+        legacy_exact = time_per_query(legacy, repeat, EXACT_QUERIES)
+        match_exact = time_per_query(matcher.match, repeat, EXACT_QUERIES)
+        legacy_other = time_per_query(legacy, repeat, OTHER_QUERIES)
+        match_other = time_per_query(matcher.match, repeat, OTHER_QUERIES)
+        find_all_us = time_per_query(matcher.find_all, repeat)
+        print(f"{str(factor) + 'x':>8} {len(records):>9} {compile_ms:>11.1f} {legacy_exact:>13.1f} "
+              f"{match_exact:>12.1f} {legacy_other:>13.1f} {match_other:>12.1f} {find_all_us:>9.1f}")
+
+    print("\nNote: the legacy scan returns only the first exact substring hit, and stops early when that")
+    print("product is near the top of the list. match() returns the first mention and only runs the")
+    print("fuzzy pass when nothing matched exactly; find_all() returns every mention with its span.")
+    print("The \"other\" queries are misheard names the legacy scan misses, plus one with no product.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+import os
+import re
+import json
+import time
+import threading
+
+from voice_agent_service.clients.sonmez.llm_logic.rate_limiter import TokenBucket
+
+# Starting quotas for every model. They are replaced by the real limits as soon as
+# OpenAI reports them in the x-ratelimit-limit-* response headers.
+OPENAI_RPM = int(os.getenv("OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OPENAI_TPM", "30000"))
+# Requests in flight per model; OPENAI_MODEL_CONCURRENCY overrides it per model,
+# e.g. "gpt-4o-mini=16,gpt-4o=4".
+OPENAI_CONCURRENCY = int(os.getenv("OPENAI_CONCURRENCY", "4"))
+OPENAI_MODEL_CONCURRENCY = os.getenv("OPENAI_MODEL_CONCURRENCY", "")
+OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "60"))
+# Keep-alive connections held open to api.openai.com, shared by every caller.
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+RATE_LIMIT_RETRIES = 3
+# Texts per embeddings request from the LangChain adapter; the API takes up to 2048.
+EMBEDDING_BATCH_SIZE = 512
+# When set, log_summary() also writes the metrics snapshot to this JSON file.
+LLM_METRICS_FILE = os.getenv("LLM_METRICS_FILE")
+
+# USD per million tokens: (prompt, completion). Unknown models are counted at zero cost.
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "text-embedding-3-small": (0.02, 0.0),
+}
+
+DURATION_PART_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(value):
+    """Seconds in an OpenAI reset header such as "1s", "6m0s" or "20ms"; None if unreadable."""
+    if not value:
+        return None
+    parts = DURATION_PART_RE.findall(str(value))
+    if not parts:
+        return None
+    return sum(float(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def _header_int(headers, name):
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+def _model_concurrency():
+    limits = {}
+    for item in OPENAI_MODEL_CONCURRENCY.split(","):
+        model, _, count = item.partition("=")
+        if model.strip() and count.strip().isdigit():
+            limits[model.strip()] = int(count)
+    return limits
+
+
+def estimate_tokens(messages, max_tokens):
+    """Roughly 4 characters per token for the prompt, plus the longest answer we allow."""
+    return sum(len(message.get("content") or "") for message in messages) // 4 + (max_tokens or 0)
+
+
+class ModelLimiter:
+    """
+    Pacing for one model: a semaphore for requests in flight and token buckets for
+    requests and tokens per minute. The buckets follow the x-ratelimit-* headers of
+    each response, so the pace matches the account's real quota instead of a guess,
+    and a nearly spent quota is waited out before OpenAI answers 429.
+    """
+
+    def __init__(self, concurrency, rpm, tpm):
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.requests = TokenBucket.per_minute(rpm)
+        self.tokens = TokenBucket.per_minute(tpm)
+        self.limits = {"requests": rpm, "tokens": tpm}
+
+    def acquire(self, estimated_tokens):
+        """Waits for a request slot and enough quota. Returns the seconds spent waiting."""
+        return self.requests.acquire() + self.tokens.acquire(estimated_tokens)
+
+    def observe(self, headers, estimated_tokens):
+        for name, bucket in (("requests", self.requests), ("tokens", self.tokens)):
+            limit = _header_int(headers, f"x-ratelimit-limit-{name}")
+            if limit and limit != self.limits[name]:
+                self.limits[name] = limit
+                bucket.retune(limit / 60.0)
+            remaining = _header_int(headers, f"x-ratelimit-remaining-{name}")
+            reset = parse_duration(headers.get(f"x-ratelimit-reset-{name}"))
+            needed = 1 if name == "requests" else estimated_tokens
+            if remaining is not None and reset and remaining < needed:
+                # The window is spent; hold this model's callers until it resets.
+                bucket.penalize(reset)
+
+    def rate_limited(self, headers, attempt):
+        """After a 429: waits out Retry-After when given, else backs off linearly."""
+        delay = None
+        if headers is not None:
+            try:
+                delay = float(headers.get("retry-after"))
+            except (TypeError, ValueError):
+                delay = parse_duration(headers.get("x-ratelimit-reset-requests"))
+        self.requests.penalize(delay or 5 * (attempt + 1))
+
+
+class LLMMetrics:
+    """Per-caller counters: calls, errors, tokens, latency and cost."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._callers = {}
+
+    def record(self, caller, model, latency, waited, prompt_tokens=0, completion_tokens=0,
+               error=False, rate_limited=0):
+        prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+        cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+        with self._lock:
+            stats = self._callers.setdefault(caller, {
+                "calls": 0, "errors": 0, "rate_limited": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                "latency_seconds": 0.0, "max_latency_seconds": 0.0, "waited_seconds": 0.0, "cost_usd": 0.0,
+                "models": {},
+            })
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["rate_limited"] += rate_limited
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["latency_seconds"] += latency
+            stats["max_latency_seconds"] = max(stats["max_latency_seconds"], latency)
+            stats["waited_seconds"] += waited
+            stats["cost_usd"] += cost
+            stats["models"][model] = stats["models"].get(model, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            snapshot = {}
+            for caller, stats in self._callers.items():
+                snapshot[caller] = dict(
+                    stats,
+                    models=dict(stats["models"]),
+                    latency_seconds=round(stats["latency_seconds"], 3),
+                    max_latency_seconds=round(stats["max_latency_seconds"], 3),
+                    avg_latency_seconds=round(stats["latency_seconds"] / stats["calls"], 3),
+                    waited_seconds=round(stats["waited_seconds"], 3),
+                    cost_usd=round(stats["cost_usd"], 6),
+                )
+            return snapshot
+
+
+class LLMClient:
+    """
+    The one way this project talks to OpenAI. All callers share one HTTP connection
+    pool, each model gets its own concurrency limit and header-driven rate limiter,
+    and every call is counted under the caller's name in `metrics`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._client = None
+        self._http_client = None
+        self._limiters = {}
+        self._concurrency = _model_concurrency()
+        self.metrics = LLMMetrics()
+
+    @property
+    def client(self):
+        # Built on first use so importing this module never opens connections, and a
+        # pre-fork server doesn't share a pool between processes.
+        with self._lock:
+            if self._client is None:
+                # The SDK is imported on first use, so importing this module keeps app startup cheap.
+                import httpx
+                import openai
+                self._http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                                        max_keepalive_connections=OPENAI_MAX_CONNECTIONS),
+                    timeout=OPENAI_TIMEOUT_SECONDS,
+                )
+                # Retries are ours, so a 429 reaches the limiter instead of being slept away.
+                self._client = openai.OpenAI(http_client=self._http_client, max_retries=0)
+            return self._client
+
+    def limiter(self, model):
+        with self._lock:
+            if model not in self._limiters:
+                concurrency = self._concurrency.get(model, OPENAI_CONCURRENCY)
+                self._limiters[model] = ModelLimiter(concurrency, OPENAI_RPM, OPENAI_TPM)
+            return self._limiters[model]
+
+    def waited(self):
+        """Seconds callers spent waiting for quota, summed over threads."""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return sum(limiter.requests.waited + limiter.tokens.waited for limiter in limiters)
+
+    def chat(self, caller, messages, model, temperature=None, max_tokens=None, response_format=None):
+        """
+        One chat completion; returns the message content. Rate limits are retried,
+        everything else is raised to the caller after being counted as an error.
+        """
+        kwargs = {"model": model, "messages": messages}
+        if temperature is not None:
+            kwargs["temperature"] = temperature
+        if max_tokens is not None:
+            kwargs["max_tokens"] = max_tokens
+        if response_format is not None:
+            kwargs["response_format"] = response_format
+        response = self._request(caller, model, estimate_tokens(messages, max_tokens),
+                                 lambda: self.client.chat.completions.with_raw_response.create(**kwargs))
+        return response.choices[0].message.content
+
+    def embed(self, caller, texts, model):
+        """Embeddings for a list of texts, paced and counted like chat()."""
+        estimated_tokens = sum(len(text) for text in texts) // 4
+        response = self._request(caller, model, estimated_tokens,
+                                 lambda: self.client.embeddings.with_raw_response.create(model=model, input=texts))
+        return [item.embedding for item in response.data]
+
+    def langchain_embeddings(self, caller, model):
+        """A LangChain Embeddings object whose requests go through embed()."""
+        from langchain_core.embeddings import Embeddings
+        llm_client = self
+
+        class SharedClientEmbeddings(Embeddings):
+            def embed_documents(self, texts):
+                vectors = []
+                for i in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+                    vectors.extend(llm_client.embed(caller, texts[i:i + EMBEDDING_BATCH_SIZE], model))
+                return vectors
+
+            def embed_query(self, text):
+                return llm_client.embed(caller, [text], model)[0]
+
+        return SharedClientEmbeddings()
+
+    def _request(self, caller, model, estimated_tokens, create):
+        """Runs `create` (a with_raw_response call) under the model's limiter and records it."""
+        import openai
+        limiter = self.limiter(model)
+        waited, rate_limited = 0.0, 0
+        started = time.monotonic()
+        with limiter.semaphore:
+            for attempt in range(RATE_LIMIT_RETRIES + 1):
+                waited += limiter.acquire(estimated_tokens)
+                sent = time.monotonic()
+                try:
+                    raw = create()
+                    break
+                except openai.RateLimitError as e:
+                    rate_limited += 1
+                    if attempt == RATE_LIMIT_RETRIES:
+                        self._record_error(caller, model, started, waited, rate_limited)
+                        raise
+                    print(f"⏳ OpenAI rate limit hit for {model}, backing off...")
+                    limiter.rate_limited(getattr(e.response, "headers", None), attempt)
+                except Exception:
+                    self._record_error(caller, model, started, waited, rate_limited)
+                    raise
+        latency = time.monotonic() - sent
+        limiter.observe(raw.headers, estimated_tokens)
+        response = raw.parse()
+        usage = response.usage
+        self.metrics.record(
+            caller, model, latency, waited,
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            rate_limited=rate_limited,
+        )
+        return response
+
+    def _record_error(self, caller, model, started, waited, rate_limited):
+        self.metrics.record(caller, model, time.monotonic() - started, waited, error=True, rate_limited=rate_limited)
+
+    def log_summary(self):
+        """Prints one line per caller, and writes the snapshot to LLM_METRICS_FILE when set."""
+        snapshot = self.metrics.snapshot()
+        for caller, stats in sorted(snapshot.items()):
+            print(f"💸 {caller}: {stats['calls']} calls ({stats['errors']} failed), "
+                  f"{stats['prompt_tokens']} + {stats['completion_tokens']} tokens, "
+                  f"{stats['avg_latency_seconds']:.2f}s avg latency, ${stats['cost_usd']:.4f}")
+        if LLM_METRICS_FILE:
+            with open(LLM_METRICS_FILE, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f, indent=2)
+        return snapshot
+
+
+_llm_client = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """The process-wide LLMClient."""
+    global _llm_client
+    with _llm_client_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient()
+        return _llm_client
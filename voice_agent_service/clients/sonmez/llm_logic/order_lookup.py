@@ -0,0 +1,104 @@
+import re
+
+from voice_agent_service.clients.sonmez.data.order_store import get_order_store, phone_key
+
+# Developer's Note: Order-status questions are answered straight from the local order
+# store (one indexed SQLite lookup) instead of going through Pinecone and the LLM, which
+# know nothing about orders anyway. Everything else falls through to the RAG chain.
+
+# Phrasings that ask about the caller's own order, as opposed to "do you ship orders to Germany?".
+ORDER_STATUS_RE = re.compile(
+    r'\b(?:my|our)\s+(?:\w+\s+)?(?:order|purchase|package|delivery|shipment)\b'
+    r'|\border\s*(?:status|number|no\b|#)|\border\s+\d{3,8}\s+(?:status|tracking)\b'
+    r'|\bwhere\b.{0,30}\border\b|\bsipari[sş]im\w*',
+    re.IGNORECASE)
+# A number only counts as an order number after "#", "order number"/"order no" (or the
+# Turkish "sipariş no"/"sipariş numarası"), so "order 2 tents for 1500 euros" stays a sales question.
+ORDER_NUMBER_RE = re.compile(
+    r'(?:#|\border\s*(?:number|no\b\.?)|\bsipari[sş]\s*(?:no\b\.?|numaras\w*))\s*[:#]?\s*(\d{3,8})(?!\d)',
+    re.IGNORECASE)
+# In a status question, a number straight after "order" counts too ("where is my order 1234").
+STATUS_ORDER_NUMBER_RE = re.compile(r'\b(?:order|sipari[sş]\w*)\s*#?\s*(\d{3,8})(?!\d)', re.IGNORECASE)
+# A bare number, accepted only as the reply right after we asked for the order number.
+BARE_NUMBER_RE = re.compile(r'(?<![\d+])(\d{3,8})(?!\d)')
+PHONE_RE = re.compile(r'\+?\d[\d\s().-]{8,}\d')
+
+ASK_FOR_NUMBER = "I can check that for you. What is your order number? It's in your order confirmation email."
+
+
+def _order_numbers(text, asked_for_number):
+    numbers = ORDER_NUMBER_RE.findall(text)
+    if not numbers and ORDER_STATUS_RE.search(text):
+        numbers = STATUS_ORDER_NUMBER_RE.findall(text)
+    if not numbers and asked_for_number:
+        # Phone numbers are taken out first so their digit groups aren't read as order numbers.
+        numbers = BARE_NUMBER_RE.findall(PHONE_RE.sub(" ", text))
+    return numbers
+
+
+def _join(items):
+    items = [item for item in items if item]
+    if len(items) <= 1:
+        return "".join(items)
+    return ", ".join(items[:-1]) + " and " + items[-1]
+
+
+def describe_order(order):
+    """One spoken sentence or two about an order. The address, phone and email are never read out."""
+    parts = [f"I found order number {order['id']}"]
+    if order.get("date") not in (None, "", "N/A"):
+        parts.append(f", placed on {order['date']}")
+    items = list(order.get("tents") or [])
+    if order.get("colors"):
+        items = [f"{item} in {_join(order['colors'])}" for item in items] or [f"color {_join(order['colors'])}"]
+    items += list(order.get("extras") or [])
+    sentence = "".join(parts) + "."
+    if items:
+        sentence += f" It includes {_join(items)}."
+    if order.get("total_price") not in (None, "", "N/A"):
+        sentence += f" The total was {order['total_price']}."
+    return sentence
+
+
+def _describe_matches(orders):
+    answer = describe_order(orders[0])
+    if len(orders) > 1:
+        others = ", ".join(order["id"] for order in orders[1:])
+        answer += f" I also see earlier orders under your number: {others}."
+    return answer
+
+
+def _placed_by(order, caller_key):
+    return caller_key is not None and phone_key(order.get("phone")) == caller_key
+
+
+def answer_order_question(user_input, history, caller_phone=None):
+    """
+    Returns the answer to an order-status question, or None when `user_input` isn't one.
+    Orders are only described to the phone number they were placed with: an order number
+    in the message is checked against the caller's number, and without one the caller's
+    own orders are looked up. A bare number right after we asked for one counts too.
+    """
+    text = user_input or ""
+    asked_for_number = bool(history) and history[-1].get("content") == ASK_FOR_NUMBER
+    numbers = _order_numbers(text, asked_for_number)
+    if not (numbers or ORDER_STATUS_RE.search(text)):
+        return None
+
+    store = get_order_store()
+    caller_key = phone_key(caller_phone)
+    if numbers:
+        for number in numbers:
+            order = store.get(number)
+            if order is not None and _placed_by(order, caller_key):
+                return describe_order(order)
+        # Developer's Note: The same answer whether the order doesn't exist or belongs to
+        # another number, so order numbers can't be probed for someone else's details.
+        return (f"I couldn't find order number {_join(numbers)} under the number you're contacting us from. "
+                "Please check the number in your order confirmation email, or contact us from the phone "
+                "number you gave with the order.")
+
+    orders = store.find_by_phone(caller_phone)
+    if orders:
+        return _describe_matches(orders)
+    return ASK_FOR_NUMBER
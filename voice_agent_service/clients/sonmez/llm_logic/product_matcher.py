@@ -1,4 +1,431 @@
-def match_product(user_input, product_list):
+import re
+import threading
+import unicodedata
+from collections import deque
+
+from voice_agent_service.clients.sonmez.data.catalog import get_catalog, normalize_name
+
+# Extra spoken forms for products, keyed by catalog name. Names, shortened names and
+# SKUs are generated automatically; this list is for nicknames customers actually use.
+PRODUCT_ALIASES = {
+    "Air Bushcraft Premium": ["bushcraft"],
+    "SÖNMEZ FLOATING TENT": ["floating tent"],
+    "London Maxia 480": ["maxia"],
+}
+
+# Brand-style prefixes that customers usually drop ("the bushcraft premium").
+DROPPABLE_PREFIXES = ("air", "aero", "london", "sonmez")
+
+# Everyday words that must never match a product on their own.
+COMMON_WORDS = {"family", "cabin", "tent", "discover", "prestige", "premium", "floating", "pump", "bag", "mat"}
+
+# Fuzzy matching only applies to aliases at least this long (without spaces); shorter
+# words produce too many false hits.
+MIN_FUZZY_LENGTH = 5
+
+# Fuzzy matching looks at windows of up to this many words, which covers a three-word
+# alias that speech-to-text split into four ("bush craft premium").
+FUZZY_MAX_WORDS = 4
+
+# Windows that start or end with one of these can't be a product name.
+STOP_WORDS = {
+    "a", "an", "and", "are", "can", "do", "does", "for", "have", "how", "i", "in", "is", "it",
+    "me", "my", "of", "on", "or", "the", "to", "what", "with", "you", "your",
+}
+
+ASCII_WORD_RE = re.compile(r'[A-Za-z0-9]+')
+
+
+class ProductMention:
+    """One product found in a piece of text. start/end are offsets into the original text."""
+
+    __slots__ = ("product", "alias", "start", "end", "distance")
+
+    def __init__(self, product, alias, start, end, distance=0):
+        self.product = product
+        self.alias = alias
+        self.start = start
+        self.end = end
+        self.distance = distance
+
+    @property
+    def fuzzy(self):
+        return self.distance > 0
+
+    def __repr__(self):
+        return f"ProductMention({self.product.name!r}, {self.alias!r}, {self.start}, {self.end}, distance={self.distance})"
+
+
+class AhoCorasick:
+    """
+    Classic Aho-Corasick automaton: finds every occurrence of every pattern in one pass
+    over the text. Patterns and text are sequences of any hashable symbols; the matcher
+    uses words, so every match falls on word boundaries and a step covers a whole word.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            node = 0
+            for symbol in pattern:
+                nxt = self.goto[node].get(symbol)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[node][symbol] = nxt
+                node = nxt
+            self.out[node].append(pattern_id)
+
+        # Breadth-first pass to wire up the failure links.
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for symbol, child in self.goto[node].items():
+                queue.append(child)
+                state = self.fail[node]
+                while state and symbol not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(symbol, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def iter_matches(self, text):
+        """Yields (start, end, pattern_id) for every match, in order of end position."""
+        goto, fail, out, patterns = self.goto, self.fail, self.out, self.patterns
+        node = 0
+        for i, symbol in enumerate(text):
+            while node and symbol not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(symbol, 0)
+            for pattern_id in out[node]:
+                yield i + 1 - len(patterns[pattern_id]), i + 1, pattern_id
+
+
+def normalize_with_offsets(text):
+    """
+    Normalizes text the same way as catalog.normalize_name, and also returns, for each
+    character of the result, the index of the original character it came from.
+    """
+    if text.isascii():
+        # Nothing to decompose: the words are the alphanumeric runs, lowercased.
+        words, offsets = [], []
+        for match in ASCII_WORD_RE.finditer(text):
+            if words:
+                offsets.append(words_end)
+            words.append(match.group().lower())
+            offsets.extend(range(match.start(), match.end()))
+            words_end = match.end()
+        return " ".join(words), offsets
+
+    chars, offsets = [], []
+    for i, original in enumerate(text):
+        for ch in unicodedata.normalize("NFKD", original):
+            if unicodedata.combining(ch):
+                continue
+            ch = ch.lower()
+            if ch.isascii() and ch.isalnum():
+                chars.append(ch)
+                offsets.append(i)
+            elif chars and chars[-1] != " ":
+                chars.append(" ")
+                offsets.append(i)
+    if chars and chars[-1] == " ":
+        chars.pop()
+        offsets.pop()
+    return "".join(chars), offsets
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """Levenshtein distance between a and b, or max_distance + 1 as soon as it must exceed max_distance."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    # Only cells within max_distance of the diagonal can stay within the bound.
+    over = max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        low, high = max(1, i - max_distance), min(len(b), i + max_distance)
+        current = [over] * (len(b) + 1)
+        current[0] = min(i, over)
+        for j in range(low, high + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != b[j - 1]))
+        if min(current[low - 1:high + 1]) > max_distance:
+            return over
+        previous = current
+    return min(previous[-1], over)
+
+
+def _fuzzy_budget(length):
+    return 1 if length < 9 else 2
+
+
+def _embeds(alias, text, budget):
+    """
+    True when alias, or alias with one character deleted, is a subsequence of text that
+    leaves at most `budget` characters of text over, i.e. the two share a symmetric delete.
+    """
+    n, m = len(alias), len(text)
+    if not -1 <= m - n <= budget:
+        return False
+    # prefix[i]: text consumed by the earliest match of alias[:i]; suffix[i]: where the
+    # latest match of alias[i:] starts. Either is None once no match is possible.
+    prefix = [0] + [None] * n
+    for i, ch in enumerate(alias):
+        found = text.find(ch, prefix[i])
+        if found < 0:
+            break
+        prefix[i + 1] = found + 1
+    if prefix[n] is not None and m - n >= 0:
+        return True
+    if m - n + 1 > budget:
+        return False
+    suffix = [None] * n + [m]
+    for i in range(n - 1, -1, -1):
+        found = text.rfind(alias[i], 0, suffix[i + 1])
+        if found < 0:
+            break
+        suffix[i] = found
+    return any(prefix[j] is not None and suffix[j + 1] is not None and prefix[j] <= suffix[j + 1]
+               for j in range(n))
+
+
+class ProductMatcher:
+    """
+    Finds every product mentioned in a piece of text.
+
+    Names, shortened names, aliases and SKUs are compiled once into an Aho-Corasick
+    automaton, so a lookup is a single pass over the text no matter how large the
+    catalog is. Words the automaton doesn't explain are then compared against the
+    aliases with a bounded edit distance on their space-free form, which catches
+    speech-to-text variants such as "bush craft" or "bushcraf". A fuzzy candidate is an
+    alias that, with at most one character deleted, is what's left of the window after
+    deleting up to the edit budget (symmetric delete). Candidates are looked up by
+    length and by the characters that can start and end that common part, so that step
+    doesn't scan the catalog or generate every deletion of the window either.
+    """
+
+    def __init__(self, records, extra_aliases=None, max_edit_distance=2):
+        self.max_edit_distance = max_edit_distance
+        extra_aliases = PRODUCT_ALIASES if extra_aliases is None else extra_aliases
+
+        alias_owners = {}
+        for record in records:
+            for alias in self._aliases_for(record, extra_aliases.get(record.name, ())):
+                alias_owners.setdefault(alias, []).append(record)
+
+        # An alias shared by several products (e.g. a SKU reused across models) is ambiguous,
+        # unless it is one product's full name, in which case that product wins.
+        self.aliases = {}
+        for alias, owners in alias_owners.items():
+            exact = [record for record in owners if normalize_name(record.name) == alias]
+            if exact:
+                self.aliases[alias] = exact[0]
+            elif len({id(record) for record in owners}) == 1:
+                self.aliases[alias] = owners[0]
+
+        self.alias_list = list(self.aliases)
+        self.automaton = AhoCorasick([tuple(alias.split(" ")) for alias in self.alias_list])
+
+        # Fuzzy pass index: (space-free length, one of the first two characters, one of the
+        # last two) -> aliases. With one character deleted from the alias, the part it
+        # shares with the window starts and ends within those.
+        self.fuzzy_anchors = {}
+        # Alias -> its space-free form.
+        self.fuzzy_forms = {}
+        # Space-free lengths of the fuzzy aliases; windows too far from all of them are skipped.
+        self.fuzzy_lengths = set()
+        for alias in self.alias_list:
+            compact = alias.replace(" ", "")
+            if len(compact) < MIN_FUZZY_LENGTH or len(alias.split()) >= FUZZY_MAX_WORDS:
+                continue
+            self.fuzzy_lengths.add(len(compact))
+            self.fuzzy_forms[alias] = compact
+            for first in compact[:2]:
+                for last in compact[-2:]:
+                    self.fuzzy_anchors.setdefault((len(compact), first, last), set()).add(alias)
+        self.max_fuzzy_length = max(self.fuzzy_lengths, default=0) + self.max_edit_distance
+
+    @staticmethod
+    def _aliases_for(record, extra):
+        name = normalize_name(record.name)
+        aliases = {name}
+        words = name.split()
+        while len(words) > 1 and words[0] in DROPPABLE_PREFIXES:
+            words = words[1:]
+            short = " ".join(words)
+            if len(words) > 1 or (len(short) >= MIN_FUZZY_LENGTH and short not in COMMON_WORDS):
+                aliases.add(short)
+        for alias in extra:
+            aliases.add(normalize_name(alias))
+
+        skus = [variant.sku for variant in getattr(record, "colors", ()) or ()]
+        skus.append(getattr(record, "sku", None))
+        for sku in skus:
+            if sku:
+                aliases.add(normalize_name(sku))
+        aliases.discard("")
+        return aliases
+
+    @classmethod
+    def from_catalog(cls, catalog=None):
+        catalog = catalog or get_catalog()
+        return cls(catalog.tents + catalog.accessories)
+
+    def find_all(self, text):
+        """Returns every product mention in the text as ProductMention objects, in order of appearance."""
+        normalized, offsets = normalize_with_offsets(text)
+        if not normalized:
+            return []
+        mentions, taken = self._exact_mentions(normalized, offsets)
+        mentions.extend(self._fuzzy_mentions(normalized, offsets, taken))
+        return self._first_mentions(mentions)
+
+    def _exact_mentions(self, normalized, offsets):
+        # Exact pass over the words: keep the longest matches first, without overlaps.
+        words = normalized.split(" ")
+        word_starts, position = [], 0
+        for word in words:
+            word_starts.append(position)
+            position += len(word) + 1
+        candidates = []
+        for first, last, pattern_id in self.automaton.iter_matches(words):
+            start = word_starts[first]
+            candidates.append((start, word_starts[last - 1] + len(words[last - 1]), self.alias_list[pattern_id]))
+        candidates.sort(key=lambda c: (-(c[1] - c[0]), c[0]))
+
+        taken = []
+        mentions = []
+        for start, end, alias in candidates:
+            if any(start < t_end and t_start < end for t_start, t_end in taken):
+                continue
+            taken.append((start, end))
+            mentions.append(ProductMention(self.aliases[alias], alias, offsets[start], offsets[end - 1] + 1))
+        return mentions, taken
+
+    @staticmethod
+    def _first_mentions(mentions):
+        mentions.sort(key=lambda m: m.start)
+        # The same product can be mentioned twice; report its first mention only.
+        seen, unique = set(), []
+        for mention in mentions:
+            if id(mention.product) not in seen:
+                seen.add(id(mention.product))
+                unique.append(mention)
+        return unique
+
+    def _fuzzy_mentions(self, normalized, offsets, taken):
+        # Word spans that the exact pass didn't cover.
+        words, position = [], 0
+        for word in normalized.split(" "):
+            start, end = position, position + len(word)
+            position = end + 1
+            if not any(start < t_end and t_start < end for t_start, t_end in taken):
+                words.append((start, end, word))
+
+        mentions = []
+        used = set()
+        for i in range(len(words)):
+            if i in used or words[i][2] in STOP_WORDS:
+                continue
+            best = None
+            for length in range(1, FUZZY_MAX_WORDS + 1):
+                window = words[i:i + length]
+                if len(window) < length:
+                    break
+                # Only join words that are adjacent in the text.
+                if length > 1 and window[-1][0] != window[-2][1] + 1:
+                    break
+                if window[-1][2] in STOP_WORDS:
+                    continue
+                compact = "".join(word for _, _, word in window)
+                if len(compact) < MIN_FUZZY_LENGTH:
+                    continue
+                if len(compact) > self.max_fuzzy_length:
+                    break  # Longer windows only get longer.
+
+                budget = min(self.max_edit_distance, _fuzzy_budget(len(compact)))
+                lengths = [n for n in range(len(compact) - budget, len(compact) + 2) if n in self.fuzzy_lengths]
+                if not lengths:
+                    continue
+                candidates = self._fuzzy_candidates(compact, budget, lengths)
+
+                for alias in candidates:
+                    distance = bounded_edit_distance(compact, alias.replace(" ", ""), budget)
+                    # Prefer the closest alias, then the one covering more words; ties go to
+                    # the alias that sorts first, so the result doesn't depend on set order.
+                    key = (distance, -length, alias)
+                    if distance <= budget and (best is None or key < (best[0], -best[2], best[1])):
+                        best = (distance, alias, length, window)
+            if best is not None:
+                distance, alias, length, window = best
+                used.update(range(i, i + length))
+                mentions.append(ProductMention(
+                    self.aliases[alias], alias, offsets[window[0][0]], offsets[window[-1][1] - 1] + 1, distance
+                ))
+        return mentions
+
+    def _fuzzy_candidates(self, compact, budget, lengths):
+        """Aliases that, less at most one character, are `compact` less at most `budget` characters."""
+        firsts, lasts = set(compact[:budget + 1]), set(compact[-budget - 1:])
+        candidates = set()
+        for length in lengths:
+            for first in firsts:
+                for last in lasts:
+                    for alias in self.fuzzy_anchors.get((length, first, last), ()):
+                        if alias not in candidates and _embeds(self.fuzzy_forms[alias], compact, budget):
+                            candidates.add(alias)
+        return candidates
+
+    def match(self, text):
+        """
+        Returns the first product mentioned in the text, or None. An exact mention wins
+        outright, so the fuzzy pass (most of find_all's cost) only runs when there is none.
+        """
+        normalized, offsets = normalize_with_offsets(text)
+        if not normalized:
+            return None
+        mentions, taken = self._exact_mentions(normalized, offsets)
+        if not mentions:
+            mentions = self._fuzzy_mentions(normalized, offsets, taken)
+        mentions = self._first_mentions(mentions)
+        return mentions[0].product if mentions else None
+
+
+_matcher = None
+_matcher_index = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    """Returns a ProductMatcher for the shared catalog, recompiled when the catalog reloads."""
+    global _matcher, _matcher_index
+    index = get_catalog().index()
+    if _matcher is None or _matcher_index is not index:
+        with _matcher_lock:
+            if _matcher is None or _matcher_index is not index:
+                _matcher = ProductMatcher(index.tents + index.accessories)
+                _matcher_index = index
+    return _matcher
+
+
+def find_products(user_input):
+    """Returns every product mentioned in user_input (see ProductMatcher.find_all)."""
+    return get_matcher().find_all(user_input)
+
+
+def match_product(user_input, product_list=None):
+    """
+    Returns the first product mentioned in user_input as a product dict, or None.
+    Without a product_list the compiled matcher for the shared catalog is used.
+    """
+    if product_list is None:
+        product = get_matcher().match(user_input)
+        return product.to_dict() if product is not None else None
+
     user_input_lower = user_input.lower()
     for product in product_list:
         product_name = product.get('name', '').lower()
@@ -0,0 +1,60 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens refill continuously at `rate` per second up to
+    `capacity`; acquire() blocks only as long as it takes for enough tokens to
+    accumulate, so calls under the quota run at full speed and bursts are smoothed
+    out instead of being answered with a fixed sleep.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, amount, burst_seconds=10):
+        """A bucket for an "N per minute" quota that allows bursts of burst_seconds worth of quota."""
+        rate = amount / 60.0
+        return cls(rate, capacity=max(1.0, rate * burst_seconds))
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens=1):
+        """Takes `tokens` from the bucket, waiting if needed. Returns the seconds spent waiting."""
+        # A request bigger than the bucket could never be served; let it through once the bucket is full.
+        tokens = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    self.waited += waited
+                    return waited
+                delay = (tokens - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def retune(self, rate, burst_seconds=10):
+        """Changes the refill rate (per second), e.g. once the real quota is known."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = float(rate)
+            self.capacity = max(1.0, self.rate * burst_seconds)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def penalize(self, seconds):
+        """Empties the bucket and holds it for `seconds`, e.g. after the API answered 429."""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = -seconds * self.rate
@@ -0,0 +1,70 @@
+"""
+answer_order_question against a throwaway order store. Run from the repository root:
+    python -m pytest voice_agent_service/clients/sonmez/llm_logic/test_order_lookup.py
+"""
+import pytest
+
+from voice_agent_service.clients.sonmez.data.order_store import OrderStore
+from voice_agent_service.clients.sonmez.llm_logic import order_lookup
+from voice_agent_service.clients.sonmez.llm_logic.order_lookup import ASK_FOR_NUMBER, answer_order_question
+
+CALLER = "+90 532 000 00 00"
+OTHER_CALLER = "+90 555 111 22 33"
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    store = OrderStore(str(tmp_path / "orders.db"))
+    store.upsert([
+        {"id": "1234", "customer": "Ayşe Yılmaz", "phone": CALLER, "date": "2025-07-14", "tents": ["London Discover L"]},
+        {"id": "5678", "customer": "Ayşe Yılmaz", "phone": CALLER, "date": "2025-08-01", "extras": ["Hand Pump"]},
+    ])
+    monkeypatch.setattr(order_lookup, "get_order_store", lambda: store)
+    return store
+
+
+@pytest.mark.parametrize("question", [
+    "where is my order 1234",
+    "order 1234 status",
+    "What's the status of order #1234?",
+    "order number 1234 please",
+    "siparişim 1234 nerede",
+])
+def test_order_number_in_status_question(question):
+    assert answer_order_question(question, [], CALLER).startswith("I found order number 1234")
+
+
+def test_unknown_number_is_not_answered_with_another_order():
+    answer = answer_order_question("where is my order 9999", [], CALLER)
+    assert "couldn't find order number 9999" in answer
+    assert "5678" not in answer
+
+
+def test_number_said_without_caller_id_is_not_asked_for_again():
+    answer = answer_order_question("where is my order 1234", [], None)
+    assert answer != ASK_FOR_NUMBER
+    assert "couldn't find order number 1234" in answer
+
+
+def test_other_callers_orders_are_not_read_back():
+    answer = answer_order_question("where is my order 1234", [], OTHER_CALLER)
+    assert "couldn't find order number 1234" in answer
+
+
+def test_status_question_without_number_uses_caller_number():
+    assert answer_order_question("where is my order?", [], CALLER).startswith("I found order number 5678")
+    assert answer_order_question("where is my order?", [], OTHER_CALLER) == ASK_FOR_NUMBER
+
+
+def test_bare_number_after_we_asked():
+    history = [{"role": "assistant", "content": ASK_FOR_NUMBER}]
+    assert answer_order_question("1234", history, CALLER).startswith("I found order number 1234")
+
+
+@pytest.mark.parametrize("question", [
+    "I want to order 2 Air Capsule tents for 1500 euros",
+    "Can I order the tent with the 300 cm awning?",
+    "Do you ship orders to Germany?",
+])
+def test_sales_questions_fall_through(question):
+    assert answer_order_question(question, [], CALLER) is None
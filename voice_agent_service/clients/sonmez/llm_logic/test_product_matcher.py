@@ -0,0 +1,54 @@
+"""
+ProductMatcher against the shipped catalog. Run from the repository root:
+    python -m pytest voice_agent_service/clients/sonmez/llm_logic/test_product_matcher.py
+"""
+import pytest
+
+from voice_agent_service.clients.sonmez.llm_logic.product_matcher import bounded_edit_distance, find_products, get_matcher
+
+
+@pytest.mark.parametrize("text, name", [
+    ("How much is the London 360 Discover M with a hand pump?", "London 360 Discover M"),
+    ("Can I order the Sönmez floating tent and 12 fixing stakes", "SÖNMEZ FLOATING TENT"),
+    ("Hi, do you have the bush craft premium in desert camo?", "Air Bushcraft Premium"),
+    ("what colors does the aquilla come in", "Air Aquila"),
+    ("maybe the air capsul", "Air Capsule"),
+])
+def test_match(text, name):
+    assert get_matcher().match(text).name == name
+
+
+def test_no_product():
+    assert get_matcher().match("hello, what are your opening hours?") is None
+    assert find_products("I need a tent for my family") == []
+
+
+def test_find_all_reports_spans_in_the_original_text():
+    text = "Can I order the Sönmez floating tent and 12 fixing stakes"
+    mentions = find_products(text)
+    assert [text[m.start:m.end] for m in mentions] == ["Sönmez floating tent", "12 fixing stakes"]
+    assert not any(m.fuzzy for m in mentions)
+
+
+def test_exact_mention_is_not_split_into_shorter_aliases():
+    [mention] = find_products("is the london maxia 480 in stock")
+    assert mention.product.name == "London Maxia 480"
+    assert mention.alias == "london maxia 480"
+
+
+def test_equally_close_aliases_resolve_by_name_not_set_order():
+    # "8 fixing stakes" and "18 fixing stakes" are both two edits away; the one that sorts first wins.
+    [mention] = find_products("hi you b8 Fvixing Stakes a please")
+    assert mention.distance == 2
+    assert mention.alias == "18 fixing stakes"
+
+
+@pytest.mark.parametrize("a, b, limit, expected", [
+    ("aquila", "aquilla", 2, 1),
+    ("bushcraft", "bushcraft", 2, 0),
+    ("capsule", "capsul", 1, 1),
+    ("abcdef", "fedcba", 2, 3),
+    ("air", "airaquila", 2, 3),
+])
+def test_bounded_edit_distance(a, b, limit, expected):
+    assert bounded_edit_distance(a, b, limit) == expected
@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Developer's Note: Conversation state used to live in module-level dicts that grew with
+# every CallSid and phone number and were private to one worker process. These stores
+# bound that state with a TTL, and the SQLite backend lets every gunicorn worker on the
+# host see the same sessions.
+
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_SESSIONS = 10000
+
+
+class MemorySessionStore:
+    """
+    In-process LRU + TTL store. Entries expire ttl_seconds after their last write, and
+    the least recently used entry is evicted once max_sessions is reached, so memory
+    stays flat no matter how many callers we see. Only safe with a single worker.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.time() + self.ttl_seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_sessions:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SQLiteSessionStore:
+    """
+    Shared store backed by a SQLite file in WAL mode, so several worker processes on the
+    same host can read and write sessions concurrently. Values are stored as JSON and
+    expired rows are purged every purge_every writes.
+    """
+
+    def __init__(self, path, namespace, ttl_seconds=DEFAULT_TTL_SECONDS, purge_every=200):
+        self.path = path
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.purge_every = purge_every
+        self._writes = 0
+        # set() runs on several request threads; the write counter is shared between them.
+        self._writes_lock = threading.Lock()
+        # Developer's Note: sqlite3 connections can't be shared between threads, and must
+        # not be inherited across a fork, so each thread opens its own on first use.
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            "SELECT value FROM sessions WHERE namespace = ? AND key = ? AND expires_at > ?",
+            (self.namespace, key, time.time()),
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def set(self, key, value):
+        conn = self._conn()
+        conn.execute(
+            """
+            INSERT INTO sessions (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at
+            """,
+            (self.namespace, key, json.dumps(value), time.time() + self.ttl_seconds),
+        )
+        with self._writes_lock:
+            self._writes += 1
+            purge = self._writes % self.purge_every == 0
+        if purge:
+            self.purge_expired()
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM sessions WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def purge_expired(self):
+        self._conn().execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+    def __len__(self):
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE namespace = ? AND expires_at > ?", (self.namespace, time.time())
+        ).fetchone()
+        return row[0]
+
+
+def create_session_store(namespace):
+    """
+    Builds the session store configured by the environment:
+    SESSION_STORE_BACKEND ("memory" or "sqlite"), SESSION_DB_PATH, SESSION_TTL_SECONDS
+    and SESSION_MAX_ENTRIES. Use "sqlite" whenever the app runs with more than one worker.
+    """
+    backend = os.getenv("SESSION_STORE_BACKEND", "memory").lower()
+    ttl_seconds = int(os.getenv("SESSION_TTL_SECONDS", str(DEFAULT_TTL_SECONDS)))
+
+    if backend == "sqlite":
+        path = os.getenv("SESSION_DB_PATH", os.path.join(tempfile.gettempdir(), "sonmez_sessions.db"))
+        return SQLiteSessionStore(path, namespace, ttl_seconds=ttl_seconds)
+    if backend == "memory":
+        max_sessions = int(os.getenv("SESSION_MAX_ENTRIES", str(DEFAULT_MAX_SESSIONS)))
+        return MemorySessionStore(ttl_seconds=ttl_seconds, max_sessions=max_sessions)
+    raise ValueError(f"Unknown SESSION_STORE_BACKEND: {backend}")
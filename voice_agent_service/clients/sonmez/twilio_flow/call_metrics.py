@@ -0,0 +1,65 @@
+import threading
+import time
+
+
+class CallMetrics:
+    """
+    In-process counters for voice calls: how long calls last, how many caller
+    questions were answered, and how often the caller barged in on playback.
+    The headline number is the average call duration per resolved question.
+    """
+
+    def __init__(self, max_active_calls=10000):
+        self.max_active_calls = max_active_calls
+        self._lock = threading.Lock()
+        self._active = {}
+        self.calls_completed = 0
+        self.total_call_seconds = 0.0
+        self.resolved_questions = 0
+        self.interruptions = 0
+
+    def _call(self, call_sid):
+        # Developer's Note: The first turn we see marks the start of the call, which
+        # gives us a duration even if Twilio never sends a status callback. Calls we never
+        # hear the end of are dropped oldest-first so this dict can't grow without bound.
+        if call_sid not in self._active and len(self._active) >= self.max_active_calls:
+            del self._active[next(iter(self._active))]
+        return self._active.setdefault(call_sid, {"started": time.time(), "resolved": 0, "interruptions": 0})
+
+    def record_turn(self, call_sid):
+        """Marks a caller turn, so calls that never get a resolved answer still count their time."""
+        with self._lock:
+            self._call(call_sid)
+
+    def record_resolved(self, call_sid):
+        with self._lock:
+            self._call(call_sid)["resolved"] += 1
+
+    def record_interruption(self, call_sid):
+        with self._lock:
+            self._call(call_sid)["interruptions"] += 1
+
+    def end_call(self, call_sid, duration_seconds=None):
+        """Folds a finished call into the totals. Twilio's CallDuration wins when provided."""
+        with self._lock:
+            call = self._active.pop(call_sid, None)
+            if call is None:
+                return
+            if duration_seconds is None:
+                duration_seconds = time.time() - call["started"]
+            self.calls_completed += 1
+            self.total_call_seconds += duration_seconds
+            self.resolved_questions += call["resolved"]
+            self.interruptions += call["interruptions"]
+
+    def snapshot(self):
+        with self._lock:
+            per_question = self.total_call_seconds / self.resolved_questions if self.resolved_questions else None
+            return {
+                "active_calls": len(self._active),
+                "calls_completed": self.calls_completed,
+                "total_call_seconds": round(self.total_call_seconds, 1),
+                "resolved_questions": self.resolved_questions,
+                "interruptions": self.interruptions,
+                "avg_call_seconds_per_resolved_question": round(per_question, 1) if per_question is not None else None,
+            }
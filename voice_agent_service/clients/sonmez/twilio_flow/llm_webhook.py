@@ -1,8 +1,11 @@
 import os
 from dotenv import load_dotenv
-from flask import Flask, request, send_file, Response
+from flask import Flask, request, send_file, Response, jsonify
 from datetime import datetime
 import tempfile
+import threading
+import time
+import uuid
 from pathlib import Path
 
 # Developer's Note: The imports are now streamlined. We only bring in what's necessary
@@ -10,6 +13,10 @@ from pathlib import Path
 from voice_agent_service.clients.sonmez.llm_logic.assistant_handler import run_rag_assistant
 from voice_agent_service.clients.sonmez.voice.elevenlabs_tts import generate_audio
 from voice_agent_service.clients.sonmez.whatsapp_flow.whatsapp_webhook import whatsapp_bp
+from voice_agent_service.clients.sonmez.twilio_flow.turn_worker import TurnWorker
+from voice_agent_service.clients.sonmez.twilio_flow.call_metrics import CallMetrics
+from voice_agent_service.clients.sonmez.llm_logic.llm_client import get_llm_client
+from voice_agent_service.clients.sonmez.sessions.session_store import create_session_store
 
 # Developer's Note: Standard Flask app initialization.
 app = Flask(__name__)
@@ -27,61 +34,265 @@ ELEVENLABS_VOICE_ID = os.getenv("ELEVENLABS_VOICE_ID")
 NGROK_BASE_URL = os.getenv("NGROK_BASE_URL")
 assert ELEVENLABS_API_KEY and ELEVENLABS_VOICE_ID and NGROK_BASE_URL, "Missing ENV variables"
 
-# Developer's Note: This dictionary will store the conversation history for each unique
+# Developer's Note: This session store keeps the conversation history for each unique
 # phone call. Using CallSid as the key is the correct way to handle multiple
-# concurrent calls, ensuring conversations don't get mixed up.
-chat_history = {}
+# concurrent calls, ensuring conversations don't get mixed up. Sessions expire after
+# a TTL and are ended explicitly by the /voice-status callback when the call is over.
+chat_history = create_session_store("voice_history")
 
-@app.route("/voice-webhook", methods=["POST"])
-def voice_webhook():
-    """Handles incoming voice calls from Twilio."""
-    # Developer's Note: We extract the unique CallSid to manage this call's specific history.
-    call_sid = request.form.get("CallSid")
-    # SpeechResult contains the text transcribed from the user's speech.
-    user_input = request.form.get("SpeechResult", "")
+# Developer's Note: In async turn mode the webhook answers Twilio straight away with a
+# short filler clip and a <Redirect> to the polling endpoint, while the TurnWorker
+# produces the real answer in the background. It is opt-in so the classic
+# request/response flow stays the default.
+VOICE_ASYNC_TURNS = os.getenv("VOICE_ASYNC_TURNS", "false").lower() in ("1", "true", "yes")
+VOICE_FILLER_TEXT = os.getenv("VOICE_FILLER_TEXT", "One moment while I check that for you.")
+VOICE_FILLER_AUDIO_URL = os.getenv("VOICE_FILLER_AUDIO_URL")
+VOICE_MAX_POLL_ATTEMPTS = int(os.getenv("VOICE_MAX_POLL_ATTEMPTS", "20"))
+turn_worker = TurnWorker(
+    max_workers=int(os.getenv("VOICE_TURN_WORKERS", "4")),
+    results=create_session_store("voice_turns"),
+)
+
+# Developer's Note: In barge-in mode the answer is played *inside* the <Gather>, so the
+# caller can interrupt it. Twilio doesn't tell us how much of the clip was played, so we
+# remember when playback started and estimate it from the timing of the next SpeechResult.
+VOICE_BARGE_IN = os.getenv("VOICE_BARGE_IN", "false").lower() in ("1", "true", "yes")
+playback_state = create_session_store("voice_playback")
+call_metrics = CallMetrics()
+
+# ElevenLabs returns 128 kbps MP3 by default, which lets us derive clip length from its size.
+TTS_MP3_BITRATE_KBPS = 128
+SPEECH_WORDS_PER_SECOND = 2.5
+SPEECH_END_SILENCE_SECONDS = 1.0
+
+FILLER_FILENAME = "tts_filler.mp3"
+_filler_lock = threading.Lock()
+_filler_rendering = False
+
+FALLBACK_ANSWER = "I'm sorry, I didn't quite understand. Could you please say that again?"
+ERROR_TWIML = "<Response><Say>I'm having trouble responding right now.</Say></Response>"
 
+
+def answer_turn(call_sid, user_input, caller_phone=None):
+    """Runs one assistant turn for a call and keeps its history up to date."""
     # Retrieve this call's history, or start a new empty list if it's the first turn.
     history = chat_history.get(call_sid, [])
 
     # Developer's Note: This is the core logic. All the complexity is now handled by our
     # RAG assistant. We just pass the user's input and the conversation history.
-    answer = run_rag_assistant(user_input, history)
+    answer = run_rag_assistant(user_input, history, caller_phone=caller_phone)
 
-    # Save the updated history back to our main dictionary for the next turn.
-    chat_history[call_sid] = history
+    # Save the updated history back to the session store for the next turn.
+    chat_history.set(call_sid, history)
 
     # Developer's Note: A simple fallback for cases where the AI might return an empty response.
     if not answer.strip():
-        answer = "I'm sorry, I didn't quite understand. Could you please say that again?"
+        answer = FALLBACK_ANSWER
+    return answer
+
+
+def note_barge_in(call_sid, user_input):
+    """
+    Checks whether the caller spoke before the previous answer finished playing. If so,
+    the assistant's last message in the history is cut down to roughly what was heard,
+    so the next prompt doesn't assume the caller heard the whole answer.
+    """
+    playback = playback_state.get(call_sid)
+    playback_state.delete(call_sid)
+    if not playback or not playback["seconds"]:
+        return
+
+    # Developer's Note: The next webhook arrives after the caller finished talking and
+    # Twilio detected the end of speech, so we take that time off the elapsed playback.
+    speaking_seconds = len(user_input.split()) / SPEECH_WORDS_PER_SECOND + SPEECH_END_SILENCE_SECONDS
+    heard_seconds = time.time() - playback["started"] - speaking_seconds
+    if heard_seconds >= playback["seconds"]:
+        return
+
+    call_metrics.record_interruption(call_sid)
+    history = chat_history.get(call_sid, [])
+    if not history or history[-1]["role"] != "assistant":
+        return
+
+    words = history[-1]["content"].split()
+    heard_words = words[:int(len(words) * max(heard_seconds, 0) / playback["seconds"])]
+    history[-1]["content"] = " ".join(heard_words) + " ... [caller interrupted here]"
+    chat_history.set(call_sid, history)
+
 
-    # Convert the AI's text answer into speech.
-    tts_audio = generate_audio(answer)
+def publish_audio(text, filename=None):
+    """
+    Converts text to speech and stores the MP3 where the /audio route can serve it.
+    Returns a (public URL, length in seconds) tuple, or (None, 0) if TTS failed.
+    """
+    tts_audio = generate_audio(text)
     if tts_audio is None:
-        # If TTS fails, provide a graceful audio error to the user.
-        twiml = "<Response><Say>I'm having trouble responding right now.</Say></Response>"
-        return Response(twiml, mimetype="text/xml")
+        return None, 0
 
     # Developer's Note: To play custom audio in a Twilio call, we must host the audio file
     # at a publicly accessible URL. Here, we save the generated MP3 to a temporary
-    # directory and use our NGROK URL to create the public link.
-    temp_dir = tempfile.gettempdir()
-    filename = f"tts_{datetime.now().timestamp():.0f}.mp3"
-    file_path = os.path.join(temp_dir, filename)
+    # directory and use our NGROK URL to create the public link. The random suffix keeps
+    # concurrent calls from overwriting each other's clips within the same second.
+    if filename is None:
+        filename = f"tts_{datetime.now().timestamp():.0f}_{uuid.uuid4().hex[:8]}.mp3"
+    file_path = os.path.join(tempfile.gettempdir(), filename)
     with open(file_path, "wb") as f:
         f.write(tts_audio)
 
-    play_url = f"{NGROK_BASE_URL}/audio/{filename}"
-    
+    audio_seconds = len(tts_audio) * 8 / (TTS_MP3_BITRATE_KBPS * 1000)
+    return f"{NGROK_BASE_URL}/audio/{filename}", audio_seconds
+
+
+def run_turn(call_sid, user_input, caller_phone=None):
+    """Produces the answer for one turn and returns it with the URL and length of its audio."""
+    call_metrics.record_turn(call_sid)
+    answer = answer_turn(call_sid, user_input, caller_phone)
+    play_url, audio_seconds = publish_audio(answer)
+    # Only an answer the caller gets to hear counts as resolved; the "please say that
+    # again" fallback and turns whose audio failed don't. A failed assistant call raises
+    # before this point and isn't counted either.
+    if play_url is not None and answer != FALLBACK_ANSWER and user_input.strip():
+        call_metrics.record_resolved(call_sid)
+    return {"answer": answer, "play_url": play_url, "audio_seconds": audio_seconds}
+
+
+def answer_twiml(call_sid, turn):
+    """Builds the TwiML that plays an answer and listens for the caller's next question."""
+    if not turn or turn["play_url"] is None:
+        # If TTS fails, provide a graceful audio error to the user.
+        return ERROR_TWIML
+    play_url = turn["play_url"]
+
+    if VOICE_BARGE_IN:
+        playback_state.set(call_sid, {"started": time.time(), "seconds": turn["audio_seconds"]})
+        return f"""
+    <Response>
+        <Gather input="speech" action="/voice-webhook" speechTimeout="auto">
+            <Play>{play_url}</Play>
+        </Gather>
+    </Response>
+    """
+
     # Developer's Note: This TwiML response tells Twilio to play our generated audio file
     # and then immediately listen for the user's next response, continuing the conversation.
-    twiml = f"""
+    return f"""
     <Response>
         <Play>{play_url}</Play>
         <Gather input="speech" action="/voice-webhook" speechTimeout="auto" />
     </Response>
     """
+
+
+def _render_filler():
+    global _filler_rendering
+    try:
+        publish_audio(VOICE_FILLER_TEXT, filename=FILLER_FILENAME)
+    finally:
+        _filler_rendering = False
+
+
+def filler_twiml():
+    """
+    Returns the TwiML element for the acknowledgment clip. The clip is rendered once in
+    the background; until it exists we fall back to Twilio's built-in <Say> so the
+    webhook never waits on ElevenLabs.
+    """
+    global _filler_rendering
+    if VOICE_FILLER_AUDIO_URL:
+        return f"<Play>{VOICE_FILLER_AUDIO_URL}</Play>"
+
+    if os.path.exists(os.path.join(tempfile.gettempdir(), FILLER_FILENAME)):
+        return f"<Play>{NGROK_BASE_URL}/audio/{FILLER_FILENAME}</Play>"
+
+    with _filler_lock:
+        if not _filler_rendering:
+            _filler_rendering = True
+            threading.Thread(target=_render_filler, daemon=True).start()
+    return f"<Say>{VOICE_FILLER_TEXT}</Say>"
+
+
+@app.route("/voice-webhook", methods=["POST"])
+def voice_webhook():
+    """Handles incoming voice calls from Twilio."""
+    # Developer's Note: We extract the unique CallSid to manage this call's specific history.
+    call_sid = request.form.get("CallSid")
+    # SpeechResult contains the text transcribed from the user's speech.
+    user_input = request.form.get("SpeechResult", "")
+    # The caller's number lets them ask about "my order" without reading out the order number.
+    caller_phone = request.form.get("From")
+
+    if VOICE_BARGE_IN and user_input:
+        note_barge_in(call_sid, user_input)
+
+    if VOICE_ASYNC_TURNS:
+        # Developer's Note: Hand the slow work to the background worker and answer Twilio
+        # right away. The caller hears the filler clip while we poll for the result.
+        turn_worker.submit(call_sid, run_turn, call_sid, user_input, caller_phone)
+        twiml = f"""
+    <Response>
+        {filler_twiml()}
+        <Redirect method="POST">/voice-webhook/poll?attempt=1</Redirect>
+    </Response>
+    """
+        return Response(twiml, mimetype="text/xml")
+
+    return Response(answer_twiml(call_sid, run_turn(call_sid, user_input, caller_phone)), mimetype="text/xml")
+
+
+@app.route("/voice-webhook/poll", methods=["POST"])
+def voice_poll():
+    """Twilio is redirected here until the background turn for this call is ready."""
+    call_sid = request.form.get("CallSid")
+    attempt = request.args.get("attempt", 1, type=int)
+
+    done, turn = turn_worker.poll(call_sid)
+    if done:
+        return Response(answer_twiml(call_sid, turn), mimetype="text/xml")
+
+    if attempt >= VOICE_MAX_POLL_ATTEMPTS:
+        # Developer's Note: Don't keep the caller waiting forever on a stuck turn.
+        turn_worker.discard(call_sid)
+        return Response(ERROR_TWIML, mimetype="text/xml")
+
+    # Developer's Note: A one-second <Pause> before redirecting keeps the polling rate low.
+    twiml = f"""
+    <Response>
+        <Pause length="1"/>
+        <Redirect method="POST">/voice-webhook/poll?attempt={attempt + 1}</Redirect>
+    </Response>
+    """
     return Response(twiml, mimetype="text/xml")
 
+@app.route("/voice-status", methods=["POST"])
+def voice_status():
+    """
+    Twilio's call status callback (configure it as the number's statusCallback URL).
+    When a call is over its session is ended and the call is folded into the metrics.
+    """
+    call_sid = request.form.get("CallSid")
+    call_status = request.form.get("CallStatus", "")
+
+    if call_status in ("completed", "busy", "failed", "no-answer", "canceled"):
+        duration = request.form.get("CallDuration", type=float)
+        call_metrics.end_call(call_sid, duration)
+        chat_history.delete(call_sid)
+        playback_state.delete(call_sid)
+        turn_worker.discard(call_sid)
+    return ("", 204)
+
+
+@app.route("/voice-metrics")
+def voice_metrics():
+    """Exposes the call metrics, including average call duration per resolved question."""
+    return jsonify(call_metrics.snapshot())
+
+
+@app.route("/llm-metrics")
+def llm_metrics():
+    """Exposes OpenAI usage per caller: calls, tokens, latency and cost."""
+    return jsonify(get_llm_client().metrics.snapshot())
+
+
 @app.route("/audio/<filename>")
 def audio(filename):
     """A simple endpoint to serve the temporary audio files."""
@@ -93,4 +304,5 @@ def audio(filename):
 app.register_blueprint(whatsapp_bp)
 
 # The get_order_status_from_woocommerce function has been removed to avoid redundancy.
-# It will be built out as a separate tool for the RAG agent.
\ No newline at end of file
+# Order-status questions are now answered by llm_logic/order_lookup.py from the local
+# order store that fetch_orders.py fills.
\ No newline at end of file
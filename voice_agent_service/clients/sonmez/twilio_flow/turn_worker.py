@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from voice_agent_service.clients.sonmez.sessions.session_store import MemorySessionStore
+
+
+class TurnWorker:
+    """
+    Runs slow assistant turns (RAG + TTS) in a background thread pool and
+    hands the result back by CallSid, so the voice webhook can answer Twilio
+    immediately instead of leaving the caller in dead air.
+    """
+
+    def __init__(self, max_workers=4, results=None):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        # Developer's Note: Results are handed off through a session store rather than
+        # in-process futures, so with a shared (SQLite) store the poll request can land
+        # on a different worker than the one that ran the turn.
+        self.results = results if results is not None else MemorySessionStore()
+
+    def _get_executor(self):
+        # Developer's Note: The pool is created on first use rather than at import time,
+        # so a pre-fork server never forks a process that already owns worker threads.
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="voice-turn")
+            return self._executor
+
+    def submit(self, call_sid, fn, *args):
+        """Starts fn(*args) in the background as the pending turn for this call."""
+        self.results.set(call_sid, {"status": "pending"})
+        self._get_executor().submit(self._run, call_sid, fn, *args)
+
+    def _run(self, call_sid, fn, *args):
+        try:
+            result = fn(*args)
+        except Exception as e:
+            print(f"[TURN ERROR] {e}")
+            result = None
+        self.results.set(call_sid, {"status": "done", "result": result})
+
+    def poll(self, call_sid):
+        """
+        Returns a (done, result) tuple for the call's pending turn.
+        A finished turn is removed, so each result is handed out exactly once.
+        A call with no pending turn is reported as done with a None result.
+        """
+        entry = self.results.get(call_sid)
+        if entry is None:
+            return True, None
+        if entry["status"] != "done":
+            return False, None
+        self.results.delete(call_sid)
+        return True, entry["result"]
+
+    def discard(self, call_sid):
+        """Forgets the pending turn for a call (e.g. the caller hung up or we gave up polling)."""
+        self.results.delete(call_sid)
@@ -0,0 +1,67 @@
+import time
+import threading
+
+
+class MessageDebouncer:
+    """
+    Collects bursts of messages from the same sender into one combined turn.
+
+    Every new message restarts the sender's window; once window_seconds pass with no new
+    message, on_flush(sender, texts, meta) is called with all collected texts in arrival
+    order and the meta of the latest message. max_wait_seconds caps how long a sender who
+    keeps typing can delay their turn.
+    """
+
+    def __init__(self, window_seconds, on_flush, max_wait_seconds=None):
+        self.window_seconds = window_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.on_flush = on_flush
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Simple counters so we can see how many assistant turns the debounce saves.
+        self.messages_received = 0
+        self.turns_flushed = 0
+
+    def add(self, sender, text, meta=None):
+        with self._lock:
+            self.messages_received += 1
+            now = time.monotonic()
+            entry = self._pending.get(sender)
+            if entry is None:
+                entry = {"texts": [], "first_at": now, "generation": 0, "timer": None}
+                self._pending[sender] = entry
+            else:
+                entry["timer"].cancel()
+
+            entry["texts"].append(text)
+            entry["meta"] = meta
+            entry["generation"] += 1
+
+            delay = self.window_seconds
+            if self.max_wait_seconds is not None:
+                delay = max(0, min(delay, entry["first_at"] + self.max_wait_seconds - now))
+
+            # Developer's Note: The generation number lets a timer that already fired (but
+            # lost the race for the lock to a newer message) recognise that it is stale.
+            timer = threading.Timer(delay, self._flush, args=(sender, entry["generation"]))
+            timer.daemon = True
+            entry["timer"] = timer
+            timer.start()
+
+    def _flush(self, sender, generation):
+        with self._lock:
+            entry = self._pending.get(sender)
+            if entry is None or entry["generation"] != generation:
+                return
+            del self._pending[sender]
+            self.turns_flushed += 1
+
+        self.on_flush(sender, entry["texts"], entry["meta"])
+
+    def stats(self):
+        with self._lock:
+            return {
+                "messages_received": self.messages_received,
+                "turns_flushed": self.turns_flushed,
+                "senders_waiting": len(self._pending),
+            }
@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+class TwilioMessageSender:
+    """Sends messages through Twilio's Messaging REST API."""
+
+    def __init__(self, account_sid, auth_token, timeout=10):
+        self.url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.auth = (account_sid, auth_token)
+        self.timeout = timeout
+        # Developer's Note: One session per sender keeps the HTTPS connection to Twilio alive
+        # between replies instead of doing a new TLS handshake for every message.
+        self.session = requests.Session()
+
+    def send(self, to, from_, body):
+        max_retries = 3
+        base_delay = 1
+
+        for attempt in range(max_retries):
+            try:
+                response = self.session.post(
+                    self.url, data={"To": to, "From": from_, "Body": body}, auth=self.auth, timeout=self.timeout
+                )
+                if response.status_code in (200, 201):
+                    return True
+
+                # If we hit a rate limit, wait and try again
+                if response.status_code == 429:
+                    print(f"[WHATSAPP WARNING] Rate limit exceeded. Waiting for {base_delay} seconds before retrying...")
+                    time.sleep(base_delay)
+                    base_delay *= 2
+                    continue
+
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                print(f"[WHATSAPP ERROR] {e}")
+                break
+
+        print(f"[WHATSAPP ERROR] Could not deliver reply to {to}.")
+        return False
+
+
+class StubMessageSender:
+    """Local stand-in for the Messaging API. Records every message instead of sending it."""
+
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, to, from_, body):
+        with self._lock:
+            self.sent.append({"to": to, "from": from_, "body": body})
+        print(f"[WHATSAPP STUB] {from_} -> {to}: {body}")
+        return True
+
+
+def create_message_sender():
+    """
+    Builds the sender selected by WHATSAPP_SENDER ("twilio" or "stub").
+    The Twilio sender needs TWILIO_ACCOUNT_SID and TWILIO_AUTH_TOKEN.
+    """
+    sender = os.getenv("WHATSAPP_SENDER", "twilio").lower()
+    if sender == "stub":
+        return StubMessageSender()
+
+    account_sid = os.getenv("TWILIO_ACCOUNT_SID")
+    auth_token = os.getenv("TWILIO_AUTH_TOKEN")
+    if not account_sid or not auth_token:
+        raise ValueError("Missing Twilio API credentials")
+    return TwilioMessageSender(account_sid, auth_token)
+
+
+class PerUserQueue:
+    """
+    Work queue that keeps each user's messages in arrival order while different users are
+    handled in parallel by a thread pool. Each user has their own FIFO; at most one pool
+    thread drains a given user's FIFO at a time, so handler(user, item) calls for the same
+    user never overlap. Ordering is per process, so route a user to one worker if the
+    app runs several.
+    """
+
+    def __init__(self, handler, max_workers=4):
+        self.handler = handler
+        self.max_workers = max_workers
+        self._executor = None
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Developer's Note: Created lazily so a pre-fork server doesn't fork worker threads.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="whatsapp-reply")
+        return self._executor
+
+    def enqueue(self, user, item):
+        with self._lock:
+            queue = self._queues.get(user)
+            if queue is not None:
+                # A drain for this user is already running and will pick the item up.
+                queue.append(item)
+                return
+            self._queues[user] = deque([item])
+            self._get_executor().submit(self._drain, user)
+
+    def _drain(self, user):
+        while True:
+            with self._lock:
+                queue = self._queues[user]
+                if not queue:
+                    # Developer's Note: Removing the empty FIFO under the lock is what lets
+                    # the next enqueue start a fresh drain, and keeps idle users out of memory.
+                    del self._queues[user]
+                    return
+                item = queue.popleft()
+
+            try:
+                self.handler(user, item)
+            except Exception as e:
+                print(f"[WHATSAPP ERROR] Failed to handle message from {user}: {e}")
+
+    def pending(self):
+        """Number of queued messages that haven't been picked up yet."""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
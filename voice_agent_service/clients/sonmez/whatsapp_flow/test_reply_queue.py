@@ -0,0 +1,106 @@
+"""
+PerUserQueue ordering and the Twilio sender's 429 backoff, without touching the network.
+Run from the repository root:
+    python -m pytest voice_agent_service/clients/sonmez/whatsapp_flow/test_reply_queue.py
+"""
+import random
+import threading
+import time
+
+from voice_agent_service.clients.sonmez.whatsapp_flow import reply_queue
+from voice_agent_service.clients.sonmez.whatsapp_flow.reply_queue import (
+    PerUserQueue, StubMessageSender, TwilioMessageSender,
+)
+
+USERS = [f"whatsapp:+9053200000{i:02d}" for i in range(6)]
+
+
+def drain(queue):
+    # Every enqueue has been made, so no new drain can start; waiting for the pool is enough.
+    queue._executor.shutdown(wait=True)
+
+
+def test_each_users_messages_are_sent_in_order():
+    sender = StubMessageSender()
+    active = set()
+    overlaps = []
+    lock = threading.Lock()
+
+    def handler(user, body):
+        with lock:
+            if user in active:
+                overlaps.append(user)
+            active.add(user)
+        time.sleep(random.random() / 500)  # Lets the users' drains interleave.
+        sender.send(user, "whatsapp:+14155238886", body)
+        with lock:
+            active.discard(user)
+
+    queue = PerUserQueue(handler, max_workers=4)
+    for n in range(20):
+        for user in USERS:
+            queue.enqueue(user, f"{user} #{n}")
+    drain(queue)
+
+    assert overlaps == []
+    assert len(sender.sent) == 20 * len(USERS)
+    for user in USERS:
+        assert [m["body"] for m in sender.sent if m["to"] == user] == [f"{user} #{n}" for n in range(20)]
+    assert queue.pending() == 0
+    assert queue._queues == {}
+
+
+def test_failed_message_does_not_stop_the_users_queue():
+    sender = StubMessageSender()
+
+    def handler(user, body):
+        if body == "boom":
+            raise RuntimeError("LLM timeout")
+        sender.send(user, "whatsapp:+14155238886", body)
+
+    queue = PerUserQueue(handler, max_workers=2)
+    for body in ("first", "boom", "third"):
+        queue.enqueue(USERS[0], body)
+    drain(queue)
+
+    assert [m["body"] for m in sender.sent] == ["first", "third"]
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.posts = 0
+
+    def post(self, url, data, auth, timeout):
+        self.posts += 1
+        return FakeResponse(self.statuses.pop(0))
+
+
+def twilio_sender(monkeypatch, statuses):
+    sleeps = []
+    monkeypatch.setattr(reply_queue.time, "sleep", sleeps.append)
+    sender = TwilioMessageSender("AC123", "token")
+    sender.session = FakeSession(statuses)
+    return sender, sleeps
+
+
+def test_rate_limited_send_backs_off_and_retries(monkeypatch):
+    sender, sleeps = twilio_sender(monkeypatch, [429, 429, 201])
+    assert sender.send("whatsapp:+905320000000", "whatsapp:+14155238886", "hi") is True
+    assert sleeps == [1, 2]
+    assert sender.session.posts == 3
+
+
+def test_send_gives_up_after_three_rate_limits(monkeypatch):
+    sender, sleeps = twilio_sender(monkeypatch, [429, 429, 429])
+    assert sender.send("whatsapp:+905320000000", "whatsapp:+14155238886", "hi") is False
+    assert sleeps == [1, 2, 4]
+    assert sender.session.posts == 3
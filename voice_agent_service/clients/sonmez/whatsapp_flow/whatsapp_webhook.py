@@ -1,31 +1,89 @@
+import os
 from flask import Blueprint, request, Response
 
 # === UPDATED IMPORT ===
 # Import the new RAG assistant function.
 from voice_agent_service.clients.sonmez.llm_logic.assistant_handler import run_rag_assistant
+from voice_agent_service.clients.sonmez.sessions.session_store import create_session_store
+from voice_agent_service.clients.sonmez.whatsapp_flow.reply_queue import PerUserQueue, create_message_sender
+from voice_agent_service.clients.sonmez.whatsapp_flow.debouncer import MessageDebouncer
 
 # Define the blueprint
 whatsapp_bp = Blueprint('whatsapp', __name__)
 
-# In-memory history for WhatsApp users (for demo purposes)
-whatsapp_history = {}
+# Conversation history for WhatsApp users, expired after a period of inactivity
+whatsapp_history = create_session_store("whatsapp_history")
 
-@whatsapp_bp.route("/whatsapp-webhook", methods=["POST"])
-def whatsapp_webhook():
-    # --- Get data from incoming message ---
-    msg_body = request.form.get("Body", "")
-    from_number = request.form.get("From", "") # Use this to track user history
+# In async mode the webhook only acknowledges the message; the reply is generated by a
+# worker pool and delivered through the Messaging REST API.
+WHATSAPP_ASYNC_REPLIES = os.getenv("WHATSAPP_ASYNC_REPLIES", "false").lower() in ("1", "true", "yes")
+# Messages from one sender that arrive within this many seconds of each other are merged
+# into a single assistant turn (async mode only). Set to 0 to disable.
+WHATSAPP_DEBOUNCE_SECONDS = float(os.getenv("WHATSAPP_DEBOUNCE_SECONDS", "2.0"))
+WHATSAPP_DEBOUNCE_MAX_SECONDS = float(os.getenv("WHATSAPP_DEBOUNCE_MAX_SECONDS", "8.0"))
+_message_sender = None
+
+
+def get_message_sender():
+    # Created on first use so the sync mode never needs Twilio REST credentials.
+    global _message_sender
+    if _message_sender is None:
+        _message_sender = create_message_sender()
+    return _message_sender
 
+
+def answer_message(from_number, msg_body):
+    """Runs one assistant turn for a WhatsApp user and keeps their history up to date."""
     # Get or initialize conversation history for this specific user
     history = whatsapp_history.get(from_number, [])
 
     # --- SIMPLIFIED RAG LOGIC ---
     # Call the new RAG assistant directly.
-    reply_text = run_rag_assistant(msg_body, history)
-    
+    # The sender's number doubles as the phone for order lookups ("whatsapp:+90...").
+    reply_text = run_rag_assistant(msg_body, history, caller_phone=from_number)
+
     # Save the updated history for this user
-    whatsapp_history[from_number] = history
+    whatsapp_history.set(from_number, history)
+    return reply_text
+
+
+def send_reply(from_number, message):
+    """Worker handler: answers a queued message and sends the reply back to the user."""
+    reply_text = answer_message(from_number, message["body"])
+    # Reply from the number the user wrote to.
+    get_message_sender().send(to=from_number, from_=message["to"], body=reply_text)
+
+
+reply_queue = PerUserQueue(send_reply, max_workers=int(os.getenv("WHATSAPP_REPLY_WORKERS", "4")))
+
+
+def enqueue_burst(from_number, texts, meta):
+    """Debouncer callback: hands a sender's collected messages to the queue as one turn."""
+    reply_queue.enqueue(from_number, {"body": "\n".join(texts), "to": meta["to"]})
+
+
+debouncer = MessageDebouncer(
+    WHATSAPP_DEBOUNCE_SECONDS, enqueue_burst, max_wait_seconds=WHATSAPP_DEBOUNCE_MAX_SECONDS
+)
+
+
+@whatsapp_bp.route("/whatsapp-webhook", methods=["POST"])
+def whatsapp_webhook():
+    # --- Get data from incoming message ---
+    msg_body = request.form.get("Body", "")
+    from_number = request.form.get("From", "") # Use this to track user history
+    to_number = request.form.get("To", "")
+
+    if WHATSAPP_ASYNC_REPLIES:
+        # Acknowledge immediately; the reply arrives as a separate outbound message.
+        if WHATSAPP_DEBOUNCE_SECONDS > 0:
+            debouncer.add(from_number, msg_body, {"to": to_number})
+        else:
+            reply_queue.enqueue(from_number, {"body": msg_body, "to": to_number})
+        return Response("<Response></Response>", mimetype="text/xml")
+
+    reply_text = answer_message(from_number, msg_body)
 
     # --- Formulate and send the TwiML response ---
     twiml = f"<Response><Message>{reply_text}</Message></Response>"
-    return Response(twiml, mimetype="text/xml")
\ No newline at end of file
+    return Response(twiml, mimetype="text/xml")
@@ -1,7 +1,17 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, send_from_directory
 import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import ThreadedConnectionPool
+import os
+import gzip
+import atexit
 import hashlib
+import mimetypes
+import threading
+from contextlib import contextmanager
 from datetime import datetime
+from werkzeug.security import safe_join
+from build_static import STATIC_DIR, DIST_DIRNAME, load_manifest
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'  # Required for flash messages
@@ -12,13 +22,165 @@ DB_NAME = "deneme_v1"  # Update this to your actual database name
 DB_USER = "postgres"  # Update this to your actual username
 DB_PASS = "test"  # Update this to your actual password
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASS
-    )
+# Connections kept open and shared by all requests of this process. Requests beyond
+# DB_POOL_MAX wait up to DB_POOL_TIMEOUT seconds for a free connection.
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+
+# Server-side prepared statements, created once per pooled connection.
+PREPARED_STATEMENTS = {
+    "login_user": """
+        PREPARE login_user (text, text) AS
+        SELECT id, full_name, business_name FROM demo WHERE email = $1 AND password_hash = $2
+    """,
+    # One round trip for a signup: a duplicate email inserts nothing and returns no row.
+    "insert_demo": """
+        PREPARE insert_demo (text, text, text, text, text, text) AS
+        INSERT INTO demo (full_name, business_name, business_type, phone_number, email, password_hash)
+        VALUES ($1, $2, $3, $4, $5, $6)
+        ON CONFLICT (email) DO NOTHING
+        RETURNING id
+    """,
+}
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """A connection that remembers which statements were already prepared on it."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+
+_pool = None
+_pool_pid = None
+_pool_slots = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The connection pool of this process, created on first use (so a forked worker gets its own)."""
+    global _pool, _pool_pid, _pool_slots
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ThreadedConnectionPool(
+                DB_POOL_MIN, DB_POOL_MAX,
+                host=DB_HOST,
+                database=DB_NAME,
+                user=DB_USER,
+                password=DB_PASS,
+                connection_factory=PooledConnection,
+            )
+            _pool_pid = os.getpid()
+            # ThreadedConnectionPool raises instead of waiting when it is exhausted.
+            _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+        return _pool, _pool_slots
+
+
+@contextmanager
+def db_cursor():
+    """A cursor on a pooled autocommit connection; each statement is its own round trip."""
+    pool, slots = get_pool()
+    if not slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise RuntimeError("The database is busy. Please try again in a moment.")
+    conn = None
+    try:
+        conn = pool.getconn()
+        # Autocommit skips the BEGIN/COMMIT round trips around single statements.
+        if not conn.autocommit:
+            conn.autocommit = True
+        with conn.cursor() as cur:
+            yield cur
+    finally:
+        if conn is not None:
+            # A connection the server dropped is discarded rather than handed out again.
+            pool.putconn(conn, close=bool(conn.closed))
+        slots.release()
+
+
+def execute_prepared(cur, name, params):
+    if name not in cur.connection.prepared:
+        cur.execute(PREPARED_STATEMENTS[name])
+        cur.connection.prepared.add(name)
+    placeholders = ", ".join(["%s"] * len(params))
+    cur.execute(f"EXECUTE {name} ({placeholders})", params)
+
+
+@atexit.register
+def close_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.closeall()
+
+# --- Static assets and pages ---
+
+# Original asset name -> fingerprinted copy, e.g. style.css -> dist/style.3f2a1b9c.css.
+STATIC_MANIFEST = load_manifest()
+# Fingerprinted files never change under the same name, so browsers may keep them for a year.
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Pages with nothing per-request in them (login and join only on GET), rendered once at
+# startup and served from memory.
+STATIC_PAGES = {
+    'home': 'home.html',
+    'login': 'login.html',
+    'join': 'join.html',
+    'success': 'success.html',
+    'forgot_password': 'forgot_password.html',
+}
+_rendered_pages = {}
+
+
+@app.url_defaults
+def fingerprint_static_urls(endpoint, values):
+    """Points url_for('static', filename=...) at the fingerprinted copy, so the templates stay as they are."""
+    if endpoint == 'static' and values.get('filename') in STATIC_MANIFEST:
+        values['filename'] = STATIC_MANIFEST[values['filename']]
+
+
+@app.route('/static/dist/<path:filename>')
+def fingerprinted_static(filename):
+    """Serves a built asset, as its precompressed copy when the browser accepts one."""
+    dist_dir = os.path.join(STATIC_DIR, DIST_DIRNAME)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    served, encoding = filename, None
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        path = safe_join(dist_dir, filename + suffix)
+        if request.accept_encodings[candidate] and path and os.path.isfile(path):
+            served, encoding = filename + suffix, candidate
+            break
+    response = send_from_directory(dist_dir, served, mimetype=mimetype, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def prerender_pages():
+    with app.test_request_context():
+        for endpoint, template in STATIC_PAGES.items():
+            html = render_template(template).encode('utf-8')
+            _rendered_pages[endpoint] = (html, gzip.compress(html, compresslevel=9, mtime=0),
+                                         hashlib.sha256(html).hexdigest()[:16])
+
+
+def static_page(endpoint):
+    """A pre-rendered page, gzipped when accepted. Browsers revalidate it with its ETag."""
+    if app.debug or endpoint not in _rendered_pages:
+        # In debug mode templates are edited live, so they are rendered on every hit.
+        return render_template(STATIC_PAGES[endpoint])
+    html, compressed, etag = _rendered_pages[endpoint]
+    if request.accept_encodings['gzip']:
+        response = Response(compressed, mimetype='text/html')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(etag + '-gz')
+    else:
+        response = Response(html, mimetype='text/html')
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
 
 def hash_password(password):
     """Hash a password using SHA-256"""
@@ -26,29 +188,23 @@ def hash_password(password):
 
 def create_demo_table():
     """Create the demo table if it doesn't exist"""
-    conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS demo (
-            id SERIAL PRIMARY KEY,
-            full_name VARCHAR(100) NOT NULL,
-            business_name VARCHAR(150) NOT NULL,
-            business_type VARCHAR(100) NOT NULL CHECK (business_type IN ('Retail Store', 'Restaurant/Cafe', 'Service Business', 'Healthcare', 'Real Estate', 'Other')),
-            phone_number VARCHAR(20),
-            email VARCHAR(100) UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    conn.commit()
-    cur.close()
-    conn.close()
+    with db_cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS demo (
+                id SERIAL PRIMARY KEY,
+                full_name VARCHAR(100) NOT NULL,
+                business_name VARCHAR(150) NOT NULL,
+                business_type VARCHAR(100) NOT NULL CHECK (business_type IN ('Retail Store', 'Restaurant/Cafe', 'Service Business', 'Healthcare', 'Real Estate', 'Other')),
+                phone_number VARCHAR(20),
+                email VARCHAR(100) UNIQUE NOT NULL,
+                password_hash TEXT NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
 
 @app.route('/')
 def home():
-    return render_template('home.html')
+    return static_page('home')
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -64,17 +220,11 @@ def login():
             # Hash the password for comparison
             password_hash = hash_password(password)
             
-            # Connect to database and check credentials
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            # Check if user exists with the provided email and password
-            cur.execute("SELECT id, full_name, business_name FROM demo WHERE email = %s AND password_hash = %s", 
-                       (email, password_hash))
-            user = cur.fetchone()
-            
-            cur.close()
-            conn.close()
+            # Check if user exists with the provided email and password: one indexed
+            # lookup (email is UNIQUE) on a pooled connection
+            with db_cursor() as cur:
+                execute_prepared(cur, "login_user", (email, password_hash))
+                user = cur.fetchone()
             
             if user:
                 # User found - redirect to success page
@@ -86,11 +236,11 @@ def login():
         except Exception as e:
             return render_template('login.html', error_message=f"An error occurred: {str(e)}")
     
-    return render_template('login.html')
+    return static_page('login')
 
 @app.route('/success')
 def success():
-    return render_template('success.html')
+    return static_page('success')
 
 @app.route('/join', methods=['GET', 'POST'])
 def join():
@@ -111,38 +261,30 @@ def join():
             # Hash the password
             password_hash = hash_password(password)
             
-            # Connect to database and insert data
-            conn = get_db_connection()
-            cur = conn.cursor()
-            
-            # Check if email already exists
-            cur.execute("SELECT id FROM demo WHERE email = %s", (email,))
-            if cur.fetchone():
-                cur.close()
-                conn.close()
+            # Insert new demo request; ON CONFLICT (email) makes the duplicate check part
+            # of the same statement, so two concurrent signups can't both get through
+            with db_cursor() as cur:
+                execute_prepared(cur, "insert_demo",
+                                 (full_name, business_name, business_type, phone_number, email, password_hash))
+                inserted = cur.fetchone()
+
+            if inserted is None:
                 return render_template('join.html', error_message="Email address already registered.")
-            
-            # Insert new demo request
-            cur.execute("""
-                INSERT INTO demo (full_name, business_name, business_type, phone_number, email, password_hash)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (full_name, business_name, business_type, phone_number, email, password_hash))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
-            
+
             # Redirect to login page after successful submission
             return redirect(url_for('login'))
             
         except Exception as e:
             return render_template('join.html', error_message=f"An error occurred: {str(e)}")
     
-    return render_template('join.html')
+    return static_page('join')
 
 @app.route('/forgot_password')
 def forgot_password():
-    return render_template('forgot_password.html')
+    return static_page('forgot_password')
+
+# Every route is registered by now, so url_for works while rendering.
+prerender_pages()
 
 if __name__ == '__main__':
     # Create the demo table when the app starts
@@ -0,0 +1,106 @@
+"""
+Build step for the static assets: every file in static/ is copied to static/dist/
+under a content-hashed name (style.css -> style.3f2a1b9c.css), next to a gzip and,
+when the brotli package is installed, a brotli copy. static/dist/manifest.json maps
+the original names to the fingerprinted ones; app.py uses it to rewrite
+url_for('static', ...) and serves the files with immutable cache headers.
+
+    python build_static.py
+
+app.py also runs the build at startup when the manifest is missing or older than
+one of the source files.
+"""
+import os
+import json
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # Only gzip copies are written without brotli.
+    brotli = None
+
+# Absolute path of the directory this script is in.
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+STATIC_DIR = os.path.join(script_dir, "static")
+DIST_DIRNAME = "dist"
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".html", ".json", ".txt", ".xml"}
+# Compressed copies that don't save at least this share are not worth the extra file.
+MIN_SAVING = 0.05
+
+
+def fingerprinted_name(filename, content):
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{hashlib.sha256(content).hexdigest()[:8]}{ext}"
+
+
+def source_files(static_dir=STATIC_DIR):
+    """Relative paths of the source assets, skipping the build output."""
+    for root, dirs, files in os.walk(static_dir):
+        if root == static_dir and DIST_DIRNAME in dirs:
+            dirs.remove(DIST_DIRNAME)
+        for name in sorted(files):
+            yield os.path.relpath(os.path.join(root, name), static_dir).replace(os.sep, "/")
+
+
+def _write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+def build(static_dir=STATIC_DIR):
+    """Writes the fingerprinted and compressed assets and the manifest. Returns the manifest."""
+    dist_dir = os.path.join(static_dir, DIST_DIRNAME)
+    manifest = {}
+    for filename in source_files(static_dir):
+        with open(os.path.join(static_dir, filename), "rb") as f:
+            content = f.read()
+        built_name = fingerprinted_name(filename, content)
+        built_path = os.path.join(dist_dir, built_name)
+        manifest[filename] = f"{DIST_DIRNAME}/{built_name}"
+        if os.path.exists(built_path):
+            continue  # Same name, same content.
+
+        _write(built_path, content)
+        if os.path.splitext(filename)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+            continue
+        # mtime=0 keeps the gzip bytes identical between builds of the same file.
+        variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(content, quality=11)
+        for suffix, compressed in variants.items():
+            if len(compressed) <= len(content) * (1 - MIN_SAVING):
+                _write(built_path + suffix, compressed)
+
+    _write(os.path.join(dist_dir, MANIFEST_NAME), json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+    return manifest
+
+
+def load_manifest(static_dir=STATIC_DIR):
+    """The manifest, rebuilt first when it is missing or a source file changed after it was written."""
+    manifest_path = os.path.join(static_dir, DIST_DIRNAME, MANIFEST_NAME)
+    try:
+        built_at = os.path.getmtime(manifest_path)
+        stale = any(os.path.getmtime(os.path.join(static_dir, name)) > built_at for name in source_files(static_dir))
+    except OSError:
+        stale = True
+    if stale:
+        return build(static_dir)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    manifest = build()
+    for filename, built in manifest.items():
+        path = os.path.join(STATIC_DIR, built)
+        sizes = [f"{os.path.getsize(path)} B"]
+        for suffix in (".gz", ".br"):
+            if os.path.exists(path + suffix):
+                sizes.append(f"{suffix[1:]} {os.path.getsize(path + suffix)} B")
+        print(f"{filename} -> {built} ({', '.join(sizes)})")
+    if brotli is None:
+        print("brotli is not installed; only gzip copies were written.")
@@ -0,0 +1,111 @@
+"""
+Load test for the login and join routes of app.py.
+
+Run the app against a local PostgreSQL first (python app.py, or
+gunicorn -w 4 --threads 8 app:app for production-like numbers), then:
+
+    python load_test.py --concurrency 1,8,32 --requests 2000 --route login
+
+Each level sends --requests POSTs from --concurrency threads, each with its own
+keep-alive HTTP session, and reports throughput and latency percentiles. Successful
+logins and signups answer with a redirect; anything else is counted as a failure.
+
+The join test creates one row per request (loadtest+<id>@example.com). Remove them with:
+    DELETE FROM demo WHERE email LIKE 'loadtest+%@example.com';
+"""
+import time
+import uuid
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+LOGIN_EMAIL = "loadtest@example.com"
+LOGIN_PASSWORD = "load-test-password"
+
+_local = threading.local()
+
+
+def session():
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def signup_form(email):
+    return {
+        "full_name": "Load Test", "business_name": "Load Test Ltd", "business_type": "Other",
+        "phone_number": "", "email": email, "password": LOGIN_PASSWORD,
+    }
+
+
+def login(base_url):
+    return session().post(f"{base_url}/login", data={"email": LOGIN_EMAIL, "password": LOGIN_PASSWORD},
+                          allow_redirects=False)
+
+
+def join(base_url):
+    return session().post(f"{base_url}/join", data=signup_form(f"loadtest+{uuid.uuid4().hex}@example.com"),
+                          allow_redirects=False)
+
+
+def timed(route, base_url):
+    started = time.perf_counter()
+    try:
+        ok = route(base_url).status_code in (302, 303)
+    except requests.RequestException:
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def percentile(sorted_values, share):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * share))]
+
+
+def run_level(route, base_url, concurrency, total):
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        # Warm up one keep-alive session per thread so connection setup isn't measured.
+        list(executor.map(lambda _: session().get(f"{base_url}/login"), range(concurrency)))
+        started = time.perf_counter()
+        results = list(executor.map(lambda _: timed(route, base_url), range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    failures = sum(1 for _, ok in results if not ok)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "failures": failures,
+        "throughput": total / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the login and join routes.")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="base URL of the running app")
+    parser.add_argument("--route", choices=("login", "join"), default="login")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated thread counts to test")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per concurrency level")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip("/")
+    # The login account is created once; "already registered" on later runs is fine.
+    requests.post(f"{base_url}/join", data=signup_form(LOGIN_EMAIL), allow_redirects=False)
+
+    route = login if args.route == "login" else join
+    print(f"POST /{args.route}, {args.requests} requests per level against {base_url}")
+    print(f"{'threads':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'failed':>7}")
+    for concurrency in [int(level) for level in args.concurrency.split(",") if level.strip()]:
+        result = run_level(route, base_url, concurrency, args.requests)
+        print(f"{result['concurrency']:>8} {result['throughput']:>9.1f} {result['p50_ms']:>8.1f} "
+              f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['failures']:>7}")
+
+
+if __name__ == "__main__":
+    main()